@@ -0,0 +1,102 @@
+# adaptive_convergence.py
+
+import argparse
+import itertools
+import json
+import logging
+import sys
+import tempfile
+import time
+
+from bench.corpus import generate_corpus
+from bench.mock_api import MockSoundFragmentApi
+from util.adaptive_upload import AdaptiveUploader, AimdController
+from util.slow_proxy import SlowProxy
+
+
+def run_link(api, paths, link_kbps, connection_kbps, args):
+    """Upload the corpus round and round through SlowProxy on one simulated link for args.seconds."""
+    proxy = None
+    base_url = api.base_url
+    if link_kbps or connection_kbps:
+        proxy = SlowProxy('127.0.0.1', api.server.server_address[1], proxy_port=0, bandwidth_kbps=connection_kbps,
+                          global_bandwidth_kbps=link_kbps or None, verbose=False).start()
+        base_url = f"http://127.0.0.1:{proxy.proxy_port}"
+
+    controller = AimdController(initial_concurrency=args.initial_concurrency, max_concurrency=args.max_concurrency,
+                                initial_chunk_size=args.initial_chunk_kb * 1024, window_seconds=args.window_seconds)
+    uploader = AdaptiveUploader(base_url, 'bench-token', controller=controller, backoff_seconds=0.2)
+    deadline = time.monotonic() + args.seconds
+    rejected_before = api.uploads_rejected
+    try:
+        # The corpus is larger than max_concurrency, so a file is never uploaded twice at once.
+        for _ in uploader.upload_all(itertools.cycle(paths)):
+            if time.monotonic() > deadline:
+                break
+    finally:
+        uploader.session.close()
+        if proxy:
+            proxy.stop()
+
+    summary = uploader.summary()
+    converged = summary['converged']
+    # Steady state: the windows after the controller first reached its final setting.
+    steady = [w for w in summary['windows'][len(summary['windows']) // 2:] if not w['congestion']]
+    return {
+        'linkKbps': link_kbps,
+        'connectionKbps': connection_kbps,
+        'convergedConcurrency': converged[0] if converged else None,
+        'convergedChunkKb': converged[1] // 1024 if converged else None,
+        'steadyMbPerSecond': sum(w['mbPerSecond'] for w in steady) / len(steady) if steady else None,
+        'linkMbPerSecond': link_kbps / 1024 if link_kbps else None,
+        'rejected': api.uploads_rejected - rejected_before,
+        'filesOk': summary['files_ok'],
+        'filesFailed': summary['files_failed'],
+        'windows': summary['windows'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check where the AIMD upload controller settles on simulated links.")
+    parser.add_argument('--links', default="1024,4096,16384",
+                        help="comma-separated shared link rates in KB/s (0 = unshaped)")
+    parser.add_argument('--connection-kbps', type=int, default=0,
+                        help="per-connection cap, as a long RTT imposes on a single TCP stream")
+    parser.add_argument('--latency-ms', type=float, default=80, help="service latency per request")
+    parser.add_argument('--max-uploads', type=int, help="mock API answers more concurrent PUTs with 429")
+    parser.add_argument('--seconds', type=float, default=40, help="time budget per link")
+    parser.add_argument('--files', type=int, default=48)
+    parser.add_argument('--size-kb', type=int, default=4096)
+    parser.add_argument('--initial-concurrency', type=int, default=2)
+    parser.add_argument('--max-concurrency', type=int, default=16)
+    parser.add_argument('--initial-chunk-kb', type=int, default=1024)
+    parser.add_argument('--window-seconds', type=float, default=3.0)
+    parser.add_argument('--output', help="JSON results path (default: print to stdout)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    api = MockSoundFragmentApi(upload_seconds=0, latency_ms=args.latency_ms,
+                               max_concurrent_uploads=args.max_uploads).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="lv426-adaptive-") as corpus_dir:
+            paths = generate_corpus(corpus_dir, args.files, args.size_kb * 1024, wav_fraction=0.0)
+            for link in (int(value) for value in args.links.split(',')):
+                result = run_link(api, paths, link, args.connection_kbps, args)
+                results.append(result)
+                print(f"link {link or 'unshaped':>8} KB/s: {result['convergedConcurrency']} stream(s) x "
+                      f"{result['convergedChunkKb']} KiB, steady {result['steadyMbPerSecond'] or 0:.2f} MB/s, "
+                      f"{result['rejected']} rejected", file=sys.stderr)
+    finally:
+        api.stop()
+
+    report = json.dumps({'config': vars(args), 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# cli_startup.py
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LV426 = os.path.join(ROOT, 'lv426.py')
+# What `lv426 --help` must not pay for; each of these costs 10-100 ms to import.
+HEAVY_MODULES = ('requests', 'urllib3', 'mutagen', 'dotenv', 'sqlite3', 'concurrent.futures')
+
+
+def time_process(argv, runs):
+    """Median and best wall-clock ms of running argv to completion, runs times."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(argv, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'medianMs': statistics.median(samples), 'minMs': min(samples)}
+
+
+def time_command(args, runs):
+    return time_process([sys.executable, LV426, *args], runs)
+
+
+def heavy_imports(args):
+    """HEAVY_MODULES that `python -X importtime lv426.py args` imported."""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', LV426, *args], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    imported = {line.rsplit('|', 1)[-1].strip() for line in completed.stderr.splitlines() if '|' in line}
+    return sorted(imported.intersection(HEAVY_MODULES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure lv426 CLI startup against a time budget.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=100,
+                        help="median budget for `lv426 --help`, interpreter start included")
+    parser.add_argument('--command-budget-ms', type=float, default=350,
+                        help="median budget for `lv426 <command> --help`")
+    parser.add_argument('--commands', help="comma-separated commands to time (default: all)")
+    parser.add_argument('--output', help="JSON results path (default: print to stdout)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from lv426 import COMMANDS
+
+    # The floor no CLI can go under: a bare interpreter with site imported.
+    interpreter = time_process([sys.executable, '-c', 'pass'], args.runs)
+    top_level = time_command(['--help'], args.runs)
+    top_level.update(budgetMs=args.budget_ms, heavyImports=heavy_imports(['--help']))
+    failures = []
+    if top_level['medianMs'] > args.budget_ms:
+        failures.append(f"lv426 --help: {top_level['medianMs']:.1f} ms > {args.budget_ms:.0f} ms")
+    if top_level['heavyImports']:
+        failures.append(f"lv426 --help imports {', '.join(top_level['heavyImports'])}")
+
+    commands = {}
+    for name in (args.commands.split(',') if args.commands else COMMANDS):
+        result = time_command([name, '--help'], args.runs)
+        commands[name] = result
+        if result['medianMs'] > args.command_budget_ms:
+            failures.append(f"lv426 {name} --help: {result['medianMs']:.1f} ms > {args.command_budget_ms:.0f} ms")
+        print(f"{name:>9}: {result['medianMs']:6.1f} ms", file=sys.stderr)
+
+    report = json.dumps({'config': vars(args), 'interpreter': interpreter, 'topLevel': top_level,
+                         'commands': commands, 'failures': failures}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+    for failure in failures:
+        print(f"over budget: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
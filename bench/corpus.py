@@ -0,0 +1,119 @@
+# corpus.py
+
+import argparse
+import io
+import math
+import os
+import random
+import struct
+import wave
+
+from mutagen.id3 import ID3, TALB, TCON, TIT2, TPE1
+
+ARTISTS = ["Luliu", "Nuno", "Fractured Signals", "Deep Orbit", "Kaleido", "The Night Shift", "Unknown Artist"]
+ALBUMS = ["Sleeping Cycle", "Night Drive", "Static Bloom", "Tidal", "Untitled"]
+RAW_GENRES = ["Funk", "hip hop", "Hip-Hop", "(7)", "Electronic", "electronica", "Jazz", "rock", "(17)", "Ambient"]
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, joint stereo: 417-byte frames, 1152 samples each.
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_SIZE = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+
+def _tags(rng, index):
+    return {
+        "artist": rng.choice(ARTISTS),
+        "title": f"Track {index:05d}",
+        "album": rng.choice(ALBUMS),
+        "genre": rng.choice(RAW_GENRES),
+    }
+
+
+def _id3_bytes(tags):
+    id3 = ID3()
+    id3.add(TPE1(encoding=3, text=[tags["artist"]]))
+    id3.add(TIT2(encoding=3, text=[tags["title"]]))
+    id3.add(TALB(encoding=3, text=[tags["album"]]))
+    id3.add(TCON(encoding=3, text=[tags["genre"]]))
+    buffer = io.BytesIO()
+    id3.save(buffer)
+    return buffer.getvalue()
+
+
+def write_mp3(path, tags, size_bytes):
+    """Write silent MPEG frames behind an ID3v2 tag; parsers see a valid 128 kbit/s stream."""
+    frame = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    frame_count = max(2, size_bytes // MP3_FRAME_SIZE)
+    with open(path, 'wb') as f:
+        f.write(_id3_bytes(tags))
+        for _ in range(frame_count):
+            f.write(frame)
+
+
+def _riff_info(tags):
+    body = b"INFO"
+    for chunk_id, key in ((b"IART", "artist"), (b"INAM", "title"), (b"IPRD", "album"), (b"IGNR", "genre")):
+        value = tags[key].encode('utf-8') + b"\x00"
+        body += chunk_id + struct.pack("<I", len(value)) + value + (b"\x00" if len(value) & 1 else b"")
+    return b"LIST" + struct.pack("<I", len(body)) + body
+
+
+def write_wav(path, tags, size_bytes, sample_rate=44100, rng=None):
+    """Write a 16-bit stereo sine WAV of roughly size_bytes with a LIST/INFO tag chunk."""
+    frame_count = max(1, size_bytes // 4)
+    frequency = (rng or random).uniform(110, 880)
+    period = max(1, int(sample_rate / frequency))
+    cycle = b"".join(
+        struct.pack("<hh", sample, sample)
+        for sample in (int(12000 * math.sin(2 * math.pi * i / period)) for i in range(period))
+    )
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        full_cycles, remainder = divmod(frame_count, period)
+        for _ in range(full_cycles):
+            w.writeframesraw(cycle)
+        w.writeframesraw(cycle[:remainder * 4])
+
+    info = _riff_info(tags)
+    with open(path, 'r+b') as f:
+        f.seek(0, 2)
+        f.write(info)
+        riff_size = f.tell() - 8
+        f.seek(4)
+        f.write(struct.pack("<I", riff_size))
+
+
+def generate_corpus(directory, count=100, size_bytes=512 * 1024, wav_fraction=0.5, seed=426):
+    """Create count tagged files (a mix of MP3 and WAV) in directory and return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        tags = _tags(rng, index)
+        if rng.random() < wav_fraction:
+            path = os.path.join(directory, f"track_{index:05d}.wav")
+            write_wav(path, tags, size_bytes, rng=rng)
+        else:
+            path = os.path.join(directory, f"track_{index:05d}.mp3")
+            write_mp3(path, tags, size_bytes)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic tagged MP3/WAV corpus.")
+    parser.add_argument('directory')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--size-kb', type=int, default=512)
+    parser.add_argument('--wav-fraction', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=426)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.directory, args.count, args.size_kb * 1024, args.wav_fraction, args.seed)
+    print(f"Wrote {len(paths)} files to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# mock_api.py
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from util.progress_stub_server import PROGRESS_PATH, ProgressStubHandler, ProgressStubServer
+
+FILES_PATH = re.compile(r"^/api/soundfragments/files/([^/?]+)/?(?:\?.*)?$")
+FILE_PATH = re.compile(r"^/api/soundfragments/files/([^/?]+)/([^/?]+)/?(?:\?.*)?$")
+UPSERT_PATH = re.compile(r"^/api/soundfragments/?(?:\?.*)?$")
+GENRES_PATH = re.compile(r"^/api/genres/?(?:\?.*)?$")
+CONTENT_RANGE = re.compile(r"bytes (?:(\d+)-(\d+)|\*)/(\d+)")
+RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+FILENAME = re.compile(rb'filename="([^"]*)"')
+
+DEFAULT_GENRES = ["Ambient", "Blues", "Classical", "Electronic", "Funk", "Hip-Hop", "Jazz", "Pop", "Rock",
+                  "Soul"]
+
+
+class MockApiHandler(ProgressStubHandler):
+    def handle_one_request(self):
+        # Every request pays the configured service latency, like a real backend would.
+        if self.server.stub.latency_ms:
+            time.sleep(self.server.stub.latency_ms / 1000)
+        try:
+            super().handle_one_request()
+        except (ConnectionResetError, BrokenPipeError):
+            self.close_connection = True
+
+    def read_body(self):
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return b''.join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        api = self.server.stub
+        if FILES_PATH.match(self.path):
+            name, content = self.parse_multipart(self.read_body())
+            file_id = api.store_file(name, content)
+            self.send_json(200, {"id": api.create_session(file_id), "name": name, "size": len(content)})
+        elif UPSERT_PATH.match(self.path):
+            try:
+                payload = json.loads(self.read_body() or b'{}')
+            except ValueError:
+                self.send_json(400, {"error": "invalid JSON"})
+                return
+            self.send_json(200, api.upsert(payload))
+        else:
+            self.read_body()
+            self.send_json(404, {"error": "not found"})
+
+    def do_PUT(self):
+        api = self.server.stub
+        if not api.begin_upload():
+            self.read_body()
+            self.send_busy()
+            return
+        try:
+            body = self.read_body()
+        finally:
+            api.end_upload()
+        match = CONTENT_RANGE.match(self.headers.get('Content-Range', ''))
+        if not FILES_PATH.match(self.path) or not match:
+            self.send_json(400, {"error": "expected Content-Range upload"})
+            return
+
+        name = self.headers.get('X-File-Name', 'upload.bin')
+        start, _, total = match.groups()
+        total = int(total)
+        received = api.append_partial(name, total, int(start) if start is not None else None, body)
+        if received >= total:
+            file_id = api.finish_partial(name, total)
+            self.send_json(200, {"id": api.create_session(file_id), "name": name, "size": received})
+            return
+        self.send_response(308)
+        if received:
+            self.send_header('Range', f"bytes=0-{received - 1}")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_busy(self):
+        body = b'{"error": "too many concurrent uploads"}'
+        self.send_response(429)
+        self.send_header('Retry-After', '1')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.serve_file(head_only=True)
+
+    def do_GET(self):
+        if PROGRESS_PATH.match(self.path):
+            super().do_GET()
+        elif GENRES_PATH.match(self.path):
+            self.serve_genres()
+        elif FILE_PATH.match(self.path):
+            self.serve_file()
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def serve_genres(self):
+        api = self.server.stub
+        body = json.dumps([{"name": genre} for genre in api.genres]).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_file(self, head_only=False):
+        match = FILE_PATH.match(self.path)
+        stored = self.server.stub.files.get(match.group(2)) if match else None
+        if stored is None:
+            self.send_json(404, {"error": "file not found"})
+            return
+
+        size = stored['size']
+        start, end, status = 0, size - 1, 200
+        range_match = RANGE.match(self.headers.get('Range', ''))
+        if range_match and size:
+            first, last = range_match.groups()
+            if first:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+            elif last:
+                start, end = max(0, size - int(last)), size - 1
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(max(0, end - start + 1)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('X-Content-SHA256', stored['sha256'])
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head_only:
+            return
+        with open(stored['path'], 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(65536, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def parse_multipart(self, body):
+        boundary = self.headers.get('Content-Type', '').partition('boundary=')[2].strip('"')
+        if not boundary:
+            return 'upload.bin', body
+        delimiter = b'--' + boundary.encode()
+        for part in body.split(delimiter)[1:]:
+            headers, _, content = part.partition(b'\r\n\r\n')
+            name = FILENAME.search(headers)
+            if name:
+                return name.group(1).decode('utf-8', 'replace'), content[:-2] if content.endswith(b'\r\n') else content
+        return 'upload.bin', b''
+
+
+class MockSoundFragmentApi(ProgressStubServer):
+    """In-process stand-in for the SoundFragment API used by the benchmarks.
+
+    Covers multipart and resumable (Content-Range PUT) uploads, file download with Range and
+    HEAD, fragment upsert, upload progress (poll and SSE) and /api/genres with ETag support.
+    Uploaded bytes are written under storage_dir (a temporary directory, removed by stop(),
+    unless one is given); latency_ms is added to every request.
+    max_concurrent_uploads answers chunk PUTs beyond that many in flight with 429.
+    """
+
+    handler_class = MockApiHandler
+
+    def __init__(self, port=0, upload_seconds=1.0, sse=True, latency_ms=0, storage_dir=None, genres=None,
+                 max_concurrent_uploads=None):
+        super().__init__(port, upload_seconds, sse)
+        self.latency_ms = latency_ms
+        self.max_concurrent_uploads = max_concurrent_uploads
+        self.uploads_in_flight = 0
+        self.uploads_rejected = 0
+        self._temp_dir = None if storage_dir else tempfile.TemporaryDirectory(prefix="lv426-mock-")
+        self.storage_dir = storage_dir or self._temp_dir.name
+        self.genres = list(genres or DEFAULT_GENRES)
+        self.files = {}
+        self.fragments = {}
+        self.files_by_name = {}
+        self.partial = {}
+        self.upsert_count = 0
+
+    def stop(self):
+        super().stop()
+        if self._temp_dir:
+            self._temp_dir.cleanup()
+            self._temp_dir = None
+
+    def begin_upload(self):
+        with self._lock:
+            if self.max_concurrent_uploads and self.uploads_in_flight >= self.max_concurrent_uploads:
+                self.uploads_rejected += 1
+                return False
+            self.uploads_in_flight += 1
+            return True
+
+    def end_upload(self):
+        with self._lock:
+            self.uploads_in_flight -= 1
+
+    def store_file(self, name, content):
+        file_id = str(uuid.uuid4())
+        path = os.path.join(self.storage_dir, file_id)
+        with open(path, 'wb') as f:
+            f.write(content)
+        self._register(file_id, name, path, len(content), hashlib.sha256(content).hexdigest())
+        return file_id
+
+    def append_partial(self, name, total, start, body):
+        # Keyed by name and total size, so concurrent uploads of same-named files of different sizes
+        # do not append into one another.
+        with self._lock:
+            path = self.partial.get((name, total))
+            if path is None:
+                path = self.partial[(name, total)] = os.path.join(self.storage_dir, f"partial-{uuid.uuid4()}")
+                open(path, 'wb').close()
+            size = os.path.getsize(path)
+            if start is not None and start == size and body:
+                with open(path, 'ab') as f:
+                    f.write(body)
+                size += len(body)
+            return size
+
+    def finish_partial(self, name, total):
+        with self._lock:
+            path = self.partial.pop((name, total))
+        file_id = str(uuid.uuid4())
+        final_path = os.path.join(self.storage_dir, file_id)
+        os.replace(path, final_path)
+        digest = hashlib.sha256()
+        with open(final_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        self._register(file_id, name, final_path, os.path.getsize(final_path), digest.hexdigest())
+        return file_id
+
+    def _register(self, file_id, name, path, size, sha256):
+        with self._lock:
+            self.files[file_id] = {"id": file_id, "name": name, "path": path, "size": size, "sha256": sha256}
+            self.files_by_name[name] = file_id
+
+    def upsert(self, payload):
+        with self._lock:
+            self.upsert_count += 1
+            fragment_id = payload.get('id') or str(uuid.uuid4())
+            fragment = dict(self.fragments.get(fragment_id, {}), **payload)
+            fragment['id'] = fragment_id
+            uploaded = list(fragment.get('uploadedFiles', []))
+            for name in fragment.pop('newlyUploaded', None) or []:
+                file_id = self.files_by_name.get(name)
+                if file_id:
+                    uploaded.append({"id": file_id, "name": name})
+            fragment['uploadedFiles'] = uploaded
+            self.fragments[fragment_id] = fragment
+            return fragment
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the mock SoundFragment API.")
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--upload-seconds', type=float, default=1.0)
+    parser.add_argument('--max-concurrent-uploads', type=int, help="answer chunk PUTs beyond this with 429")
+    args = parser.parse_args()
+
+    api = MockSoundFragmentApi(args.port, args.upload_seconds, latency_ms=args.latency_ms,
+                               max_concurrent_uploads=args.max_concurrent_uploads).start()
+    print(f"Mock API listening on {api.base_url} (storage: {api.storage_dir})")
+    try:
+        api.server_thread.join()
+    except KeyboardInterrupt:
+        api.stop()
+
+
+if __name__ == "__main__":
+    main()
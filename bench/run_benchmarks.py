@@ -0,0 +1,155 @@
+# run_benchmarks.py
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from bench.corpus import generate_corpus
+from bench.mock_api import MockSoundFragmentApi
+from soundfragment_crud_test.upsert import upsert_soundfragment
+from util.api_client import SoundFragmentClient
+from util.audio_metadata_parser import AudioMetadataParser
+from util.batch_upsert import BatchUpserter
+from util.bulk_upload import BulkUploader, latency_summary
+from util.http_session import create_session
+from util.progress_watcher import ProgressWatcher
+from util.slow_proxy import SlowProxy
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_parse(paths, workers):
+    parser = AudioMetadataParser(logging.getLogger("bench.parse"))
+    results = {}
+    for label, worker_count in (('single_process', 1), ('process_pool', workers)):
+        started = time.perf_counter()
+        parsed = sum(1 for _ in parser.parse_many(paths, workers=worker_count))
+        elapsed = time.perf_counter() - started
+        results[label] = {'workers': worker_count, 'files': parsed, 'seconds': elapsed,
+                          'files_per_second': parsed / elapsed}
+    return results
+
+
+def bench_upload(paths, base_url, workers):
+    uploader = BulkUploader(base_url, 'bench-token', workers=workers, backoff_seconds=0.1)
+    failed = sum(1 for result in uploader.upload_all(paths) if result['error'])
+    summary = uploader.stats.summary()
+    summary['failed'] = failed
+    uploader.session.close()
+    return summary
+
+
+def bench_upsert(base_url, count):
+    samples = []
+    with SoundFragmentClient(base_url, 'bench-token', pool_size=1) as client:
+        for index in range(count):
+            payload = {"title": f"bench {index}", "artist": "bench", "genre": "Funk", "type": "SONG",
+                       "newlyUploaded": []}
+            started = time.perf_counter()
+            upsert_soundfragment(client, payload, results_file=None)
+            samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def bench_batch_upsert(base_url, count, workers):
+    payloads = ({"title": f"batch {index}", "artist": "bench", "genre": "Funk", "type": "SONG",
+                 "newlyUploaded": []} for index in range(count))
+    upserter = BatchUpserter(base_url, 'bench-token', workers=workers, backoff_seconds=0.1)
+    for _ in upserter.upsert_all(payloads):
+        pass
+    upserter.session.close()
+    return upserter.stats.summary()
+
+
+def bench_progress(api, uploads):
+    results = {}
+    session = create_session('bench-token', pool_size=2)
+    for mode in ('poll', 'auto'):
+        requests_made = 0
+        detection_lag = []
+        for _ in range(uploads):
+            upload_id = api.create_session()
+            watcher = ProgressWatcher(session, api.base_url, mode=mode)
+            watcher.watch(upload_id)
+            # How long after the server reached 100% the client noticed it.
+            detection_lag.append(time.monotonic() - api.sessions[upload_id] - api.upload_seconds)
+            requests_made += watcher.requests_made
+        results[mode] = {'uploads': uploads, 'requests_per_upload': requests_made / uploads,
+                         'detection_lag': latency_summary(detection_lag)}
+    session.close()
+    return results
+
+
+def run(args):
+    logging.disable(logging.WARNING)
+    api = MockSoundFragmentApi(upload_seconds=args.progress_seconds, latency_ms=args.latency_ms).start()
+    proxy = None
+    base_url = api.base_url
+    if args.bandwidth_kbps:
+        proxy = SlowProxy('127.0.0.1', api.server.server_address[1], proxy_port=0,
+                          bandwidth_kbps=args.bandwidth_kbps, verbose=False).start()
+        base_url = f"http://127.0.0.1:{proxy.proxy_port}"
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="lv426-corpus-") as corpus_dir:
+            paths = generate_corpus(corpus_dir, args.files, args.size_kb * 1024, seed=args.seed)
+            results = {
+                'parse': bench_parse(paths, args.workers),
+                'upload': bench_upload(paths, base_url, args.workers),
+                'upsert': bench_upsert(base_url, args.upserts),
+                'batch_upsert': bench_batch_upsert(base_url, args.upserts, args.workers),
+                'progress': bench_progress(api, args.progress_uploads),
+            }
+    finally:
+        if proxy:
+            proxy.stop()
+        api.stop()
+
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a local mock SoundFragment API.")
+    parser.add_argument('--files', type=int, default=200, help="synthetic corpus size")
+    parser.add_argument('--size-kb', type=int, default=256, help="approximate size of each file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--upserts', type=int, default=200)
+    parser.add_argument('--progress-uploads', type=int, default=5)
+    parser.add_argument('--progress-seconds', type=float, default=1.0)
+    parser.add_argument('--latency-ms', type=float, default=0, help="service latency added by the mock API")
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help="route uploads through SlowProxy")
+    parser.add_argument('--seed', type=int, default=426)
+    parser.add_argument('--output', help="JSON results path (default: print to stdout)")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+        print(f"Benchmark results written to {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
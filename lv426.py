@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""lv426 command line: one entry point for the parse, upload, verify and test tools.
+
+Usage: lv426 [--env-file PATH] [--timing] <command> [args...]
+
+Each command is the main() of an existing script, imported only when that command runs, so
+`lv426 genres` never loads mutagen and `lv426 --help` loads neither requests nor dotenv.
+bench/cli_startup.py holds the startup budget these commands are measured against.
+The scripts under soundfragment_crud_test/ import util from the repo root, so run them through
+lv426 or as `python -m soundfragment_crud_test.<script>` from the repo root, not by file path.
+"""
+
+import sys
+import time
+
+# name: (module, help). Modules are imported by name on dispatch, never up front.
+COMMANDS = {
+    'parse': ('util.metadata_catalog', "parse a directory into a metadata catalog; query or diff catalogs"),
+    'upload': ('soundfragment_crud_test.orchestrator', "parse, upload, upsert and verify files as one pipeline"),
+    'sync': ('soundfragment_crud_test.sync', "upload only what changed in a music directory (cron or --watch)"),
+    'upsert': ('util.batch_upsert', "upsert SoundFragments in bulk from payloads or a directory"),
+    'verify': ('soundfragment_crud_test.check_file_access', "check that uploaded files are readable from the API"),
+    'genres': ('fetch_genres', "refresh genres.json from the API"),
+    'bench': ('bench.run_benchmarks', "run the parse/upload/upsert/progress benchmarks against the mock API"),
+    'proxy': ('util.slow_proxy', "run the bandwidth-limited, fault-injecting proxy"),
+    'mock-api': ('bench.mock_api', "serve the mock SoundFragment API"),
+    'loadtest': ('upload_progress_test', "upload, progress and load tests against a live API"),
+}
+# Commands that never read API settings; the rest get .env loaded once, up front.
+NO_CONFIG_COMMANDS = {'parse', 'bench', 'proxy', 'mock-api'}
+
+
+def usage():
+    width = max(len(name) for name in COMMANDS)
+    lines = ["usage: lv426 [--env-file PATH] [--timing] <command> [args...]", "", "commands:"]
+    lines.extend(f"  {name:<{width}}  {help_text}" for name, (_, help_text) in COMMANDS.items())
+    lines.append("")
+    lines.append("Run `lv426 <command> --help` for the options of one command.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    env_file = None
+    timing = False
+    while argv and argv[0].startswith('-'):
+        option = argv.pop(0)
+        if option in ('-h', '--help'):
+            print(usage())
+            return 0
+        if option == '--timing':
+            timing = True
+        elif option == '--env-file' and argv:
+            env_file = argv.pop(0)
+        elif option.startswith('--env-file='):
+            env_file = option.partition('=')[2]
+        else:
+            print(f"lv426: unknown option {option}\n\n{usage()}", file=sys.stderr)
+            return 2
+    if not argv:
+        print(usage(), file=sys.stderr)
+        return 2
+
+    name, args = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"lv426: unknown command {name!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    wants_help = '-h' in args or '--help' in args
+    if name not in NO_CONFIG_COMMANDS and not wants_help:
+        from util.config import load_config
+        load_config(env_file)
+
+    import_started = time.perf_counter()
+    module = __import__(COMMANDS[name][0], fromlist=['main'])
+    if timing:
+        print(f"lv426: '{name}' imported in {(time.perf_counter() - import_started) * 1000:.1f} ms", file=sys.stderr)
+
+    # The scripts parse sys.argv themselves; make it look as if they were run directly.
+    sys.argv = [f"lv426 {name}", *args]
+    return module.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,82 @@
+import argparse
+import asyncio
 import json
-import os
-import requests
+import sys
 
-with open('soundfragment_data.json', 'r') as f:
-    data = json.load(f)
+from util.batch_upsert import JsonLinesWriter
+from util.config import load_config
+from util.library_sync import LibrarySnapshot
+from util.remote_verify import (VERIFY_MODES, RemoteVerifier, targets_from_fragment, targets_from_results,
+                                targets_from_snapshot)
 
-api_host = os.environ["API_HOST"]
-api_key = os.environ["API_TOKEN"]
 
-for file_info in data['uploadedFiles']:
-    print(f"\nChecking access to {file_info['name']} (ID: {file_info['id']})...")
-    url = f"{api_host}/api/soundfragments/files/{data['id']}/{file_info['id']}"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    
+def iter_targets(args):
+    if args.results:
+        yield from targets_from_results(args.results)
+    if args.snapshot_db:
+        with LibrarySnapshot(args.snapshot_db) as snapshot:
+            yield from targets_from_snapshot(snapshot)
+    if args.data or not (args.results or args.snapshot_db):
+        with open(args.data or 'soundfragment_data.json', 'r') as f:
+            yield from targets_from_fragment(json.load(f), args.local_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that uploaded files are readable from the API.")
+    parser.add_argument('--data', help="upsert response JSON (default: soundfragment_data.json)")
+    parser.add_argument('--results', help="orchestrator JSON-lines results file")
+    parser.add_argument('--snapshot-db', help="library sync snapshot database")
+    parser.add_argument('--local-dir', help="directory holding the files named in --data, for size/hash checks")
+    parser.add_argument('--mode', choices=VERIFY_MODES, default='range',
+                        help="head/range check size without downloading; hash streams and compares SHA-256")
+    parser.add_argument('--workers', type=int, default=16, help="checks in flight")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="run the checks as asyncio tasks on one thread (needs aiohttp); --workers can be hundreds")
+    parser.add_argument('--buffer-kb', type=int, default=256, help="read buffer for --mode hash")
+    parser.add_argument('--output', help="JSON-lines file with one result per file")
+    parser.add_argument('--report', default='verify_report.json')
+    args = parser.parse_args()
+
+    config = load_config()
     try:
-        response = requests.get(url, headers=headers, stream=True)
-        response.raise_for_status()
-        print(f"Status: {response.status_code}")
-        print(f"Content-Type: {response.headers.get('content-type')}")
-        print(f"Content-Length: {response.headers.get('content-length')} bytes")
-    except Exception as e:
-        print(f"Error: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Status code: {e.response.status_code}")
-            print(f"Response: {e.response.text}")
-        raise
+        verifier = RemoteVerifier(config["API_HOST"], config["API_TOKEN"], workers=args.workers,
+                                  mode=args.mode, buffer_size=args.buffer_kb * 1024)
+    except KeyError as e:
+        print(f"Missing setting: {e}", file=sys.stderr)
+        return 1
+
+    writer = JsonLinesWriter(args.output) if args.output else None
+
+    def handle(result):
+        if writer:
+            writer.write(result)
+        if result['outcome'] != 'ok':
+            print(f"{result['name']} ({result['fragment_id']}/{result['file_id']}): {result['outcome']}"
+                  f"{' - ' + result['error'] if result['error'] else ''}")
+
+    async def verify_async():
+        async for result in verifier.averify_all(iter_targets(args)):
+            handle(result)
+
+    try:
+        if args.use_async:
+            asyncio.run(verify_async())
+        else:
+            for result in verifier.verify_all(iter_targets(args)):
+                handle(result)
+    finally:
+        if writer:
+            writer.close()
+
+    report = verifier.write_report(args.report)
+    latency = report['latency']
+    print(f"Checked {report['checked']} file(s) in {report['elapsed_seconds']:.1f}s "
+          f"({report['files_per_second']:.0f}/s): {report['outcomes']}")
+    if latency['count']:
+        print(f"Latency p50 {latency['p50'] * 1000:.0f} ms, p95 {latency['p95'] * 1000:.0f} ms; "
+              f"report written to {args.report}")
+    return 0 if report['ok'] == report['checked'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import requests
+
+from util.api_client import SoundFragmentClient
+from util.audio_metadata_parser import AUDIO_EXTENSIONS, AudioMetadataParser, iter_audio_files
+from util.batch_upsert import BatchUpserter, JsonLinesWriter, payload_from_metadata
+from util.bulk_upload import BulkUploader
+from util.config import load_config
+from util.dedupe_index import DedupeIndex
+from util.pipeline import Pipeline, Stage
+from util.progress_watcher import ProgressWatcher
+from util.remote_verify import RemoteVerifier
+
+LOG_FILE = "soundfragment_flow.log"
+
+logger = logging.getLogger(__name__)
+
+
+class FlowError(Exception):
+    pass
+
+
+class SoundFragmentFlow:
+    """Parse -> upload -> upsert -> verify for many files at once, one pipeline stage per step.
+
+    Tag parsing runs on a process pool (parse_workers processes, fed by as many threads);
+    the network stages run on their own thread counts over one pooled session, so uploads
+    of some files overlap parsing of others. wait_for_processing makes the upload stage
+    follow upload-progress until the server has finished with the file before it is upserted.
+
+    With a DedupeIndex, files whose content already reached a fragment skip upload and
+    upsert (skipped=True) and go straight to verification; verify_remote confirms with a HEAD
+    first. New uploads are recorded with their hash and, after upsert, their fragment/file IDs.
+    """
+
+    def __init__(self, api_host, api_token, parse_workers=None, upload_workers=4, upsert_workers=4,
+                 verify_workers=4, queue_size=32, entity_id="temp", verify=True, wait_for_processing=False,
+                 parser=None, fragment_type="SONG", dedupe_index=None, verify_remote=False):
+        self.api_host = api_host.rstrip('/')
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self.verify = verify
+        self.wait_for_processing = wait_for_processing
+        self.fragment_type = fragment_type
+        self.parser = parser or AudioMetadataParser(logging.getLogger("orchestrator.parse"))
+        self.client = SoundFragmentClient(self.api_host, api_token,
+                                          pool_size=upload_workers + upsert_workers + verify_workers)
+        self.session = self.client.session
+        self.dedupe_index = dedupe_index
+        self.uploader = BulkUploader(self.api_host, api_token, entity_id=entity_id, session=self.session,
+                                     dedupe_index=dedupe_index, dedupe_requires_fragment=True,
+                                     verify_remote=verify_remote)
+        self.upserter = BatchUpserter(self.api_host, api_token, session=self.session)
+        self.verifier = RemoteVerifier(self.api_host, api_token, workers=verify_workers, session=self.session,
+                                       timeout=(10, 30))
+
+        stages = [
+            Stage("parse", self.parse, self.parse_workers),
+            Stage("upload", self.upload, upload_workers),
+            Stage("upsert", self.upsert, upsert_workers),
+        ]
+        if verify:
+            stages.append(Stage("verify", self.verify_access, verify_workers))
+        self.pipeline = Pipeline(stages, queue_size=queue_size)
+        self._executor = None
+
+    def run(self, file_paths):
+        return self.run_jobs({'file_path': str(path)} for path in file_paths)
+
+    def run_jobs(self, jobs):
+        """Like run() for prepared job dicts; existingFragmentId makes the upsert update that fragment."""
+        jobs = (dict(job, index=index) for index, job in enumerate(jobs))
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            self._executor = executor
+            yield from self.pipeline.run(jobs)
+
+    def parse(self, job):
+        job['metadata'] = self.parser.parse_on(self._executor, job['file_path'])
+        return job
+
+    def upload(self, job):
+        result = self.uploader.upload_one(job['file_path'])
+        job['size'] = result['size']
+        job['contentHash'] = result['content_hash']
+        if result['skipped']:
+            job.update(skipped=True, fragmentId=result['known']['fragment_id'], fileId=result['known']['file_id'])
+            return job
+        if result['error']:
+            raise FlowError(f"upload failed after {result['attempts']} attempt(s): {result['error']}")
+        job['uploadId'] = result['upload_id']
+
+        if self.wait_for_processing and job['uploadId']:
+            data = ProgressWatcher(self.session, self.api_host).watch(job['uploadId'])
+            if data.get('status') != 'finished':
+                raise FlowError(f"server processing ended with status {data.get('status')}")
+        return job
+
+    def upsert(self, job):
+        if job.get('skipped'):
+            return job
+        payload = payload_from_metadata(job['file_path'], job['metadata'], self.fragment_type)
+        if job.get('existingFragmentId'):
+            payload['id'] = job['existingFragmentId']
+        result = self.upserter.upsert_one(job['index'], payload)
+        if result['error']:
+            raise FlowError(f"upsert failed: {result['error']}")
+        job['fragmentId'] = result['id']
+        name = Path(job['file_path']).name
+        files = [f for f in result['response'].get('uploadedFiles', []) if f.get('name') == name]
+        job['fileId'] = files[-1]['id'] if files else None
+        if self.dedupe_index is not None and job['contentHash'] and job['fileId']:
+            self.dedupe_index.record_content(job['contentHash'], job['size'], fragment_id=job['fragmentId'],
+                                             file_id=job['fileId'])
+        return job
+
+    def verify_access(self, job):
+        if not job.get('fileId'):
+            raise FlowError("upserted fragment does not list the uploaded file")
+        # One byte is enough to prove the file is readable; Content-Range carries the full size.
+        result = self.verifier.verify_one({'fragment_id': job['fragmentId'], 'file_id': job['fileId'],
+                                           'size': job.get('size'), 'sha256': job.get('contentHash')})
+        if result['outcome'] == 'size_mismatch':
+            raise FlowError(f"server has {result['remote_size']} bytes, local file has {job['size']}")
+        if result['outcome'] != 'ok':
+            raise FlowError(f"file access failed ({result['outcome']}): {result['error'] or result['status']}")
+        job['verified'] = True
+        return job
+
+    def metrics(self):
+        return self.pipeline.metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse, upload, upsert and verify audio files as one pipeline.")
+    parser.add_argument('paths', nargs='+', help="audio files or directories")
+    parser.add_argument('--parse-workers', type=int)
+    parser.add_argument('--upload-workers', type=int, default=4)
+    parser.add_argument('--upsert-workers', type=int, default=4)
+    parser.add_argument('--verify-workers', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=32)
+    parser.add_argument('--no-verify', action='store_true')
+    parser.add_argument('--wait-processing', action='store_true', help="wait for server processing before upsert")
+    parser.add_argument('--results', default='flow_results.jsonl', help="JSON-lines file, one line per file")
+    parser.add_argument('--dedupe-db', help="SQLite dedupe index; files already ingested are skipped")
+    parser.add_argument('--verify-remote', action='store_true', help="confirm indexed files still exist remotely")
+    args = parser.parse_args()
+
+    config = load_config()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+                        handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()])
+
+    def iter_inputs():
+        for path in args.paths:
+            if os.path.isdir(path):
+                yield from iter_audio_files(path, AUDIO_EXTENSIONS)
+            else:
+                yield path
+
+    try:
+        flow = SoundFragmentFlow(config['API_HOST'], config['API_TOKEN'], parse_workers=args.parse_workers,
+                                 upload_workers=args.upload_workers, upsert_workers=args.upsert_workers,
+                                 verify_workers=args.verify_workers, queue_size=args.queue_size,
+                                 verify=not args.no_verify, wait_for_processing=args.wait_processing,
+                                 dedupe_index=DedupeIndex(args.dedupe_db) if args.dedupe_db else None,
+                                 verify_remote=args.verify_remote)
+        failed = 0
+        with JsonLinesWriter(args.results) as writer:
+            for job in flow.run(iter_inputs()):
+                writer.write(job)
+                if job.get('error'):
+                    failed += 1
+                    logger.error(f"{job['file_path']}: {job['failedStage']} failed: {job['error']}")
+                else:
+                    logger.info(f"{job['file_path']}: fragment {job.get('fragmentId')}"
+                                f"{' (already ingested)' if job.get('skipped') else ''}")
+        logger.info(f"Flow metrics: {json.dumps(flow.metrics(), indent=2)}")
+        return 1 if failed else 0
+    except (KeyError, requests.RequestException) as e:
+        logger.critical(f"Flow failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import argparse
+import logging
+import os
+import sys
+import time
+
+from soundfragment_crud_test.orchestrator import LOG_FILE, SoundFragmentFlow
+from util.config import load_config
+from util.dedupe_index import DedupeIndex
+from util.library_sync import (InotifyWatcher, LibrarySnapshot, SyncJournal, diff_library, rescan_paths,
+                               scan_library)
+
+logger = logging.getLogger(__name__)
+
+
+class LibrarySync:
+    """Keep the server in step with a music directory by ingesting only what changed.
+
+    sync_once() diffs an os.scandir walk against the snapshot; watch() does the same for the
+    paths inotify reports (or rescans every interval seconds where inotify is unavailable).
+    Added and changed files go through the flow (changed ones update their existing
+    fragment); removed files leave the snapshot. Every file is journalled as it completes, so
+    a run that dies part-way resumes with the rest of its plan.
+    """
+
+    def __init__(self, root, flow, snapshot, journal):
+        self.root = os.path.abspath(root)
+        self.flow = flow
+        self.snapshot = snapshot
+        self.journal = journal
+
+    def sync_once(self):
+        return self._apply(scan_library(self.root), self.snapshot.stat_map(self.root))
+
+    def sync_paths(self, paths):
+        current, previous = rescan_paths(paths, self.snapshot)
+        return self._apply(current, previous)
+
+    def plan(self, current, previous):
+        delta = diff_library(current, previous)
+        plan = {}
+        # Leftovers of an interrupted run come first; a fresh diff entry for the same path wins.
+        for entry in self.journal.pending():
+            plan[entry['path']] = self._restat(entry)
+        for action in ('added', 'changed'):
+            for path in delta[action]:
+                size, mtime_ns = current[path]
+                plan[path] = {'path': path, 'action': action, 'size': size, 'mtime_ns': mtime_ns}
+        for path in delta['removed']:
+            plan[path] = {'path': path, 'action': 'removed'}
+        return list(plan.values())
+
+    def _restat(self, entry):
+        try:
+            st = os.stat(entry['path'])
+        except OSError:
+            return {'path': entry['path'], 'action': 'removed'}
+        action = entry['action']
+        if action == 'removed':
+            action = 'changed' if self.snapshot.get(entry['path']) else 'added'
+        return {'path': entry['path'], 'action': action, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    def _apply(self, current, previous):
+        plan = self.plan(current, previous)
+        summary = {'added': 0, 'changed': 0, 'removed': 0, 'failed': 0}
+        if not plan:
+            return summary
+
+        logger.info(f"Syncing {len(plan)} change(s) under {self.root}")
+        self.journal.begin(plan)
+        ingest = []
+        for entry in plan:
+            if entry['action'] == 'removed':
+                self.snapshot.remove(entry['path'])
+                self.journal.done(entry['path'], action='removed')
+                summary['removed'] += 1
+                continue
+            known = self.snapshot.get(entry['path'])
+            ingest.append({'file_path': entry['path'], 'action': entry['action'], 'stat': entry,
+                           'existingFragmentId': known['fragment_id'] if known else None})
+
+        for job in self.flow.run_jobs(ingest):
+            if job.get('error'):
+                summary['failed'] += 1
+                self.journal.failed(job['file_path'], f"{job['failedStage']}: {job['error']}")
+                logger.error(f"{job['file_path']}: {job['failedStage']} failed: {job['error']}")
+                continue
+            stat = job['stat']
+            self.snapshot.record(job['file_path'], stat['size'], stat['mtime_ns'], job.get('contentHash'),
+                                 job.get('fragmentId'), job.get('fileId'))
+            self.journal.done(job['file_path'], action=job['action'], fragmentId=job.get('fragmentId'))
+            summary[job['action']] += 1
+        self.journal.end()
+        logger.info(f"Sync finished: {summary}")
+        return summary
+
+    def watch(self, interval=60.0, settle_seconds=2.0):
+        self.sync_once()
+        if not InotifyWatcher.available():
+            logger.info(f"inotify unavailable; rescanning {self.root} every {interval:.0f}s")
+            while True:
+                time.sleep(interval)
+                self.sync_once()
+
+        watcher = InotifyWatcher(self.root, settle_seconds)
+        logger.info(f"Watching {self.root} for changes")
+        try:
+            while True:
+                changed = watcher.changed_paths(timeout=interval)
+                if changed:
+                    self.sync_paths(changed)
+        finally:
+            watcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync a music directory to the SoundFragment API.")
+    parser.add_argument('root', nargs='?', help="library root (default: MUSIC_DIR)")
+    parser.add_argument('--watch', action='store_true', help="keep running and sync changes as they happen")
+    parser.add_argument('--interval', type=float, default=60.0, help="rescan period without inotify")
+    parser.add_argument('--snapshot-db', default='library_snapshot.sqlite3')
+    parser.add_argument('--dedupe-db', default='dedupe_index.sqlite3')
+    parser.add_argument('--journal', default='library_sync.journal')
+    parser.add_argument('--upload-workers', type=int, default=4)
+    args = parser.parse_args()
+
+    config = load_config()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+                        handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()])
+
+    try:
+        root = args.root or config['MUSIC_DIR']
+        flow = SoundFragmentFlow(config['API_HOST'], config['API_TOKEN'],
+                                 upload_workers=args.upload_workers, dedupe_index=DedupeIndex(args.dedupe_db))
+    except KeyError as e:
+        logger.critical(f"Missing setting: {e}")
+        return 1
+
+    sync = LibrarySync(root, flow, LibrarySnapshot(args.snapshot_db), SyncJournal(args.journal))
+    try:
+        if args.watch:
+            sync.watch(args.interval)
+        summary = sync.sync_once()
+    except KeyboardInterrupt:
+        return 130
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,18 @@
 import os
 import sys
-import requests
 from pathlib import Path
 from dotenv import load_dotenv
 
+from util.api_client import SoundFragmentClient
+
 #FILENAME = "lala.mp3"
 FILENAME = "Sleeping_cycle.wav"
 
-def upload_file(file_path, api_url, api_token):
+def upload_file(client, file_path, entity_id="temp", timeout=(30, 600)):
     try:
         with open(file_path, 'rb') as f:
-            files = {'file': (Path(file_path).name, f)}
-            headers = {'Authorization': f'Bearer {api_token}'}
             print(f"Uploading {file_path}...")
-            response = requests.post(api_url, files=files, headers=headers)
+            response = client.upload_file(f, Path(file_path).name, entity_id=entity_id, timeout=timeout)
             response.raise_for_status()
             return response.json().get('id')
     except Exception as e:
@@ -28,8 +27,8 @@ def main():
     file_path = os.path.join(os.environ['MUSIC_DIR'], FILENAME)
     uploaded_file_path = os.path.join(os.environ['UPLOADS_DIR'], 'nuno', 'temp', FILENAME)
     
-    api_url = f"{api_host}/api/soundfragments/files/temp"
-    upload_id = upload_file(file_path, api_url, api_token)
+    with SoundFragmentClient(api_host, api_token, pool_size=1) as client:
+        upload_id = upload_file(client, file_path)
     
     if upload_id:
         print(f"Upload successful! ID: {upload_id}")
@@ -1,14 +1,15 @@
 import os
 import sys
 import json
-import requests
 from dotenv import load_dotenv
 
+from util.api_client import SoundFragmentClient
+
 def save_response_data(data, filename='soundfragment_data.json'):
     with open(filename, 'w') as f:
         json.dump(data, f, indent=2)
 
-def upsert_soundfragment(api_host, api_key, payload=None):
+def upsert_soundfragment(client, payload=None, results_file='soundfragment_data.json', timeout=(10, 60)):
     if payload is None:
         payload = {
             "title": "sleeping cycle",
@@ -18,20 +19,12 @@ def upsert_soundfragment(api_host, api_key, payload=None):
             "newlyUploaded": ["Sleeping_cycle.wav"]
         }
     
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    response = requests.post(
-        f"{api_host}/api/soundfragments/",
-        json=payload,
-        headers=headers
-    )
+    response = client.upsert(payload, timeout=timeout)
     
     if response.status_code in (200, 201):
         data = response.json()
-        save_response_data(data)
+        if results_file:
+            save_response_data(data, results_file)
         return data
     
     raise Exception(f"Upsert failed with status {response.status_code}: {response.text}")
@@ -43,7 +36,8 @@ def main():
         api_host = os.environ["API_HOST"]
         api_key = os.environ["API_TOKEN"]
         
-        data = upsert_soundfragment(api_host, api_key)
+        with SoundFragmentClient(api_host, api_key, pool_size=1) as client:
+            data = upsert_soundfragment(client)
         
         print(f"Status: {200 if data else 500}")
         print(f"Response: {json.dumps(data, indent=2)}")
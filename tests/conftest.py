@@ -0,0 +1,10 @@
+import pytest
+
+from bench.mock_api import MockSoundFragmentApi
+
+
+@pytest.fixture
+def mock_api():
+    api = MockSoundFragmentApi(upload_seconds=0).start()
+    yield api
+    api.stop()
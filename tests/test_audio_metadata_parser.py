@@ -0,0 +1,41 @@
+import logging
+
+from mutagen.id3 import ID3, TCON, TIT2
+
+from util.audio_metadata_parser import AudioMetadataParser
+from util.metadata_cache import MetadataCache
+
+MPEG_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+
+
+def write_mp3(path, title, genre):
+    path.write_bytes(MPEG_FRAME)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=title))
+    tags.add(TCON(encoding=3, text=genre))
+    tags.save(str(path))
+    return str(path)
+
+
+def test_parse_many_reads_tags_on_the_pool_and_caches_them(tmp_path):
+    paths = [write_mp3(tmp_path / f"{index}.mp3", f"Track {index}", "(7)") for index in range(5)]
+    with MetadataCache(str(tmp_path / "cache.sqlite3")) as cache:
+        parser = AudioMetadataParser(logging.getLogger("test"), cache=cache)
+        results = dict(parser.parse_many(paths, workers=2, chunk_size=2))
+        assert results[paths[3]] == {"artist": None, "title": "Track 3", "album": None, "genre": "Hip-Hop"}
+        assert all(cache.get(path, parser.cache_version) for path in paths)
+
+
+def test_failed_worker_chunk_yields_empty_metadata_without_caching_it(tmp_path):
+    paths = [write_mp3(tmp_path / f"{index}.mp3", f"Track {index}", "Rock") for index in range(3)]
+    with MetadataCache(str(tmp_path / "cache.sqlite3")) as cache:
+        parser = AudioMetadataParser(logging.getLogger("test"), cache=cache)
+        # A lambda cannot be pickled, so every chunk fails on its way to the pool.
+        parser._worker_options = lambda: {"technical": lambda: None}
+        results = dict(parser.parse_many(paths, workers=2, chunk_size=2))
+        assert results == {path: {"artist": None, "title": None, "album": None, "genre": None} for path in paths}
+        assert not any(cache.get(path, parser.cache_version) for path in paths)
+
+        del parser._worker_options
+        results = dict(parser.parse_many(paths, workers=2, chunk_size=2))
+        assert results[paths[0]]["title"] == "Track 0"
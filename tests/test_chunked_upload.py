@@ -0,0 +1,108 @@
+import hashlib
+import os
+
+import pytest
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+from util.chunked_upload import ChunkedUploader, ChunkedUploadError
+
+CHUNK_SIZE = 64 * 1024
+
+
+class FlakyClient:
+    """Passes put_chunk through to client, except that the PUTs numbered in fail_on drop the connection."""
+
+    def __init__(self, client, fail_on):
+        self.client = client
+        self.fail_on = set(fail_on)
+        self.calls = []
+
+    def put_chunk(self, body, content_range, file_name, entity_id="temp", timeout=None):
+        self.calls.append(content_range)
+        if len(self.calls) in self.fail_on:
+            raise requests.ConnectionError("connection dropped")
+        return self.client.put_chunk(body, content_range, file_name, entity_id, timeout=timeout)
+
+
+@pytest.fixture
+def client(mock_api):
+    client = SoundFragmentClient(mock_api.base_url, 'token')
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    path = tmp_path / "track.wav"
+    path.write_bytes(os.urandom(CHUNK_SIZE * 4 + 1000))
+    return path
+
+
+def stored_bytes(mock_api, upload_response):
+    with open(mock_api.files[mock_api.files_by_name[upload_response['name']]]['path'], 'rb') as f:
+        return f.read()
+
+
+def test_upload_sends_content_range_chunks(mock_api, client, audio_file):
+    progress = []
+    uploader = ChunkedUploader(client, chunk_size=CHUNK_SIZE,
+                               progress_callback=lambda sent, total: progress.append(sent))
+    data = uploader.upload(str(audio_file))
+    content = audio_file.read_bytes()
+    assert data['size'] == len(content)
+    assert stored_bytes(mock_api, data) == content
+    assert uploader.content_hash == hashlib.sha256(content).hexdigest()
+    assert progress[-1] == len(content)
+
+
+def test_dropped_connection_resumes_from_the_acknowledged_offset(mock_api, client, audio_file):
+    flaky = FlakyClient(client, fail_on={3})
+    resumes = metrics.counter("upload_resumes").value
+    uploader = ChunkedUploader(flaky, chunk_size=CHUNK_SIZE, backoff_seconds=0)
+    data = uploader.upload(str(audio_file))
+
+    content = audio_file.read_bytes()
+    assert stored_bytes(mock_api, data) == content
+    assert uploader.content_hash == hashlib.sha256(content).hexdigest()
+    assert metrics.counter("upload_resumes").value == resumes + 1
+    # Two chunks landed, the third PUT failed, the offset query found 2 chunks, and the upload went on from there.
+    assert flaky.calls[3] == f"bytes */{len(content)}"
+    assert flaky.calls[4].startswith(f"bytes {2 * CHUNK_SIZE}-")
+    assert len(flaky.calls) == 7
+
+
+def test_restarted_upload_skips_bytes_the_server_already_has(mock_api, client, audio_file):
+    content = audio_file.read_bytes()
+    client.put_chunk(content[:CHUNK_SIZE], f"bytes 0-{CHUNK_SIZE - 1}/{len(content)}", audio_file.name)
+    uploader = ChunkedUploader(client, chunk_size=CHUNK_SIZE)
+    assert uploader.query_offset(audio_file.name, len(content)) == CHUNK_SIZE
+
+    data = uploader.upload(str(audio_file), offset=CHUNK_SIZE)
+    assert stored_bytes(mock_api, data) == content
+    # The transfer never read the first chunk, so there is no whole-file hash to report.
+    assert uploader.content_hash is None
+
+
+def test_gives_up_after_max_retries(client, audio_file):
+    flaky = FlakyClient(client, fail_on=range(1, 100))
+    uploader = ChunkedUploader(flaky, chunk_size=CHUNK_SIZE, max_retries=2, backoff_seconds=0)
+    with pytest.raises(ChunkedUploadError, match="after 2 retries"):
+        uploader.upload(str(audio_file))
+
+
+def test_same_named_uploads_of_different_sizes_do_not_mix(mock_api, client, tmp_path):
+    first, second = os.urandom(CHUNK_SIZE * 2), os.urandom(CHUNK_SIZE * 3)
+    # Interleave the chunks of two files that share a name, as two clients would.
+    client.put_chunk(first[:CHUNK_SIZE], f"bytes 0-{CHUNK_SIZE - 1}/{len(first)}", "take.wav")
+    client.put_chunk(second[:CHUNK_SIZE], f"bytes 0-{CHUNK_SIZE - 1}/{len(second)}", "take.wav")
+    response = client.put_chunk(first[CHUNK_SIZE:], f"bytes {CHUNK_SIZE}-{len(first) - 1}/{len(first)}", "take.wav")
+    assert stored_bytes(mock_api, response.json()) == first
+
+    # Finishing the first file must leave the second one's acknowledged chunk in place.
+    uploader = ChunkedUploader(client, chunk_size=CHUNK_SIZE)
+    assert uploader.query_offset("take.wav", len(second)) == CHUNK_SIZE
+    path = tmp_path / "take.wav"
+    path.write_bytes(second)
+    assert stored_bytes(mock_api, uploader.upload(str(path), offset=CHUNK_SIZE)) == second
@@ -0,0 +1,52 @@
+import socket
+
+import pytest
+import requests
+
+import fetch_genres
+from bench.mock_api import MockApiHandler
+from util.genre_catalog import GenreCatalog
+
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_refresh_fetches_then_gets_not_modified(mock_api, tmp_path):
+    catalog = GenreCatalog(str(tmp_path / "genres.json"), api_host=mock_api.base_url, api_token='token')
+    assert catalog.refresh() is True
+    assert catalog.lookup("hip-hop") == "Hip-Hop"
+    assert catalog.refresh() is False
+    # A second process starts from the file and its validators.
+    reloaded = GenreCatalog(str(tmp_path / "genres.json"), api_host=mock_api.base_url, ttl_seconds=0)
+    assert reloaded.refresh() is False
+    assert "Funk" in reloaded.names()
+
+
+def test_refresh_raises_on_http_error_but_lookups_keep_the_cached_list(mock_api, tmp_path, monkeypatch):
+    path = str(tmp_path / "genres.json")
+    assert GenreCatalog(path, api_host=mock_api.base_url).refresh() is True
+    monkeypatch.setattr(MockApiHandler, 'serve_genres', lambda handler: handler.send_json(500, {"error": "down"}))
+
+    catalog = GenreCatalog(path, api_host=mock_api.base_url, ttl_seconds=0)
+    with pytest.raises(requests.HTTPError):
+        catalog.refresh(force=True)
+    assert catalog.lookup("jazz") == "Jazz"
+
+
+def test_fetch_genres_main_exits_1_when_the_api_is_unreachable(tmp_path, monkeypatch):
+    monkeypatch.setenv('API_HOST', closed_port_url())
+    monkeypatch.setenv('API_TOKEN', 'token')
+    monkeypatch.setattr('sys.argv', ['fetch_genres.py', '--path', str(tmp_path / "genres.json")])
+    assert fetch_genres.main() == 1
+    assert not (tmp_path / "genres.json").exists()
+
+
+def test_fetch_genres_main_exits_0_after_a_fetch(mock_api, tmp_path, monkeypatch):
+    monkeypatch.setenv('API_HOST', mock_api.base_url)
+    monkeypatch.setenv('API_TOKEN', 'token')
+    monkeypatch.setattr('sys.argv', ['fetch_genres.py', '--path', str(tmp_path / "genres.json")])
+    assert fetch_genres.main() == 0
+    assert (tmp_path / "genres.json").exists()
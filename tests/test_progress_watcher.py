@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from util.http_session import create_session
+from util.progress_stub_server import ProgressStubHandler, ProgressStubServer
+from util.progress_watcher import AdaptiveBackoff, ProgressWatcher
+
+
+@pytest.fixture
+def session():
+    session = create_session('token')
+    yield session
+    session.close()
+
+
+def fast_backoff():
+    return AdaptiveBackoff(min_interval=0.01, max_interval=0.05, initial_interval=0.01)
+
+
+def test_stream_skips_payloads_that_are_not_objects(monkeypatch, mock_api, session):
+    def stream_progress(handler, upload_id):
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        handler.write_chunk(b'data: [1, 2]\n\n')
+        handler.write_chunk(b'data: "busy"\n\n')
+        handler.write_chunk(b'data: {"id": "x", "percentage": 100, "status": "finished"}\n\n')
+        handler.write_chunk(b"")
+
+    monkeypatch.setattr(ProgressStubHandler, 'stream_progress', stream_progress)
+    watcher = ProgressWatcher(session, mock_api.base_url)
+    assert watcher.watch(mock_api.create_session())['status'] == 'finished'
+    assert watcher.bad_events == 2
+
+
+def test_poll_counts_non_object_payloads_as_failed_polls(monkeypatch, mock_api, session):
+    monkeypatch.setattr(ProgressStubServer, 'progress', lambda server, upload_id: [upload_id])
+    watcher = ProgressWatcher(session, mock_api.base_url, mode="poll", backoff=fast_backoff(),
+                              max_consecutive_errors=3)
+    assert watcher.watch('any')['status'] == 'poll_error'
+    assert watcher.bad_events == 3
+
+
+def test_silent_stream_stops_at_the_deadline(monkeypatch, mock_api, session):
+    def stream_progress(handler, upload_id):
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        time.sleep(5)
+
+    monkeypatch.setattr(ProgressStubHandler, 'stream_progress', stream_progress)
+    watcher = ProgressWatcher(session, mock_api.base_url, timeout_seconds=0.5, request_timeout=(5, 30))
+    started = time.monotonic()
+    assert watcher.watch(mock_api.create_session())['status'] == 'timeout'
+    assert time.monotonic() - started < 2
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from util.remote_verify import RemoteVerifier
+
+CONTENT = b"remote verify test content" * 100
+
+
+@pytest.fixture
+def stored(mock_api, tmp_path):
+    file_id = mock_api.store_file("song.mp3", CONTENT)
+    local_path = tmp_path / "song.mp3"
+    local_path.write_bytes(CONTENT)
+    return {'fragment_id': 'fragment', 'file_id': file_id, 'name': 'song.mp3', 'local_path': str(local_path)}
+
+
+def verify(mock_api, target, mode):
+    verifier = RemoteVerifier(mock_api.base_url, 'token', workers=2, mode=mode)
+    try:
+        return verifier.verify_one(target)
+    finally:
+        verifier.session.close()
+
+
+@pytest.mark.parametrize("mode", ["head", "range", "hash"])
+def test_matching_file_is_ok(mock_api, stored, mode):
+    result = verify(mock_api, stored, mode)
+    assert result['outcome'] == 'ok'
+    assert result['remote_size'] == len(CONTENT)
+
+
+def test_hash_mode_compares_target_sha256(mock_api, stored):
+    target = dict(stored, local_path=None, sha256=hashlib.sha256(CONTENT).hexdigest())
+    assert verify(mock_api, target, "hash")['outcome'] == 'ok'
+    target['sha256'] = hashlib.sha256(b"other").hexdigest()
+    assert verify(mock_api, target, "hash")['outcome'] == 'hash_mismatch'
+
+
+def test_local_content_change_is_a_hash_mismatch(mock_api, stored, tmp_path):
+    (tmp_path / "song.mp3").write_bytes(CONTENT[::-1])
+    assert verify(mock_api, stored, "hash")['outcome'] == 'hash_mismatch'
+    assert verify(mock_api, stored, "range")['outcome'] == 'ok'
+
+
+def test_size_mismatch(mock_api, stored):
+    assert verify(mock_api, dict(stored, size=len(CONTENT) + 1), "range")['outcome'] == 'size_mismatch'
+
+
+def test_missing_file(mock_api, stored):
+    assert verify(mock_api, dict(stored, file_id='no-such-file'), "head")['outcome'] == 'missing'
+
+
+def test_hash_mode_without_local_digest_is_unverified(mock_api, stored):
+    result = verify(mock_api, dict(stored, local_path=None), "hash")
+    assert result['outcome'] == 'unverified'
+
+
+def test_hash_mode_with_unreadable_local_file_is_an_error(mock_api, stored, tmp_path):
+    result = verify(mock_api, dict(stored, local_path=str(tmp_path / "gone.mp3"), size=len(CONTENT)), "hash")
+    assert result['outcome'] == 'error'
+    assert "unreadable" in result['error']
+
+
+def averify(mock_api, targets, mode):
+    verifier = RemoteVerifier(mock_api.base_url, 'token', workers=4, mode=mode)
+
+    async def collect():
+        return [result async for result in verifier.averify_all(targets)]
+
+    try:
+        return asyncio.run(collect()), verifier.stats.summary()
+    finally:
+        verifier.session.close()
+
+
+@pytest.mark.parametrize("mode", ["head", "range", "hash"])
+def test_async_verify_matches_the_threaded_outcomes(mock_api, stored, mode):
+    pytest.importorskip("aiohttp")
+    targets = [stored, dict(stored, file_id='no-such-file'), dict(stored, size=1)]
+    results, summary = averify(mock_api, targets * 3, mode)
+    outcomes = sorted(result['outcome'] for result in results)
+    expected = sorted(verify(mock_api, target, mode)['outcome'] for target in targets) * 3
+    assert outcomes == sorted(expected)
+    assert summary['checked'] == 9
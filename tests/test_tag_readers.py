@@ -0,0 +1,29 @@
+import struct
+
+import pytest
+
+from util.tag_readers import detect_format, read_tags
+
+
+def write_wav(path, data, declared_size=None, sample_rate=8000):
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    size = len(data) if declared_size is None else declared_size
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", size) + data
+    path.write_bytes(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+
+@pytest.mark.parametrize("declared_size", [None, 0xFFFFFFFF, 10 ** 8])
+def test_wav_duration_is_clamped_to_the_file_length(tmp_path, declared_size):
+    path = tmp_path / "tone.wav"
+    write_wav(path, b"\0" * 16000, declared_size)
+    assert read_tags(str(path), technical=True)["durationSeconds"] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (b"ID3\x04\0\0\0\0\0\0", "mp3"),
+    (b"\xff\xfb\x90\x64", "mp3"),      # MPEG-1 Layer III
+    (b"\xff\xf1\x50\x80", None),       # ADTS AAC: same sync, layer bits 00
+    (b"\xff\xf9\x50\x80", None),       # ADTS AAC, MPEG-2 id
+])
+def test_detect_format_tells_mp3_from_adts(header, expected):
+    assert detect_format(header, "stream.bin") == expected
@@ -1,150 +1,35 @@
 #!/usr/bin/env python3
 
+import argparse
+import json
 import requests
 import time
-import json
 import threading
 import sys
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-import socket
-import socketserver
-import http.server
 from urllib.parse import urlparse
 
-load_dotenv()
-
-
-class SlowProxyHandler(http.server.BaseHTTPRequestHandler):
-    def __init__(self, *args, target_host, target_port, bandwidth_limit, **kwargs):
-        self.target_host = target_host
-        self.target_port = target_port
-        self.bandwidth_limit = bandwidth_limit
-        super().__init__(*args, **kwargs)
-
-    def do_POST(self):
-        self.proxy_request()
-
-    def do_GET(self):
-        self.proxy_request()
-
-    def proxy_request(self):
-        try:
-            target_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            target_sock.settimeout(30)
-            target_sock.connect((self.target_host, self.target_port))
-
-            request_line = f"{self.command} {self.path} HTTP/1.1\r\n"
-            target_sock.send(request_line.encode())
-
-            for header, value in self.headers.items():
-                if header.lower() not in ['host', 'connection']:
-                    target_sock.send(f"{header}: {value}\r\n".encode())
-            target_sock.send(f"Host: {self.target_host}:{self.target_port}\r\n".encode())
-            target_sock.send(f"Connection: close\r\n".encode())
-            target_sock.send(b"\r\n")
-
-            if 'content-length' in self.headers:
-                content_length = int(self.headers['content-length'])
-                if content_length > 0:
-                    print(f"Proxy: Forwarding {content_length} bytes...")
-                    self.forward_data_slow(self.rfile, target_sock, content_length)
-
-            response_data = b""
-            target_sock.settimeout(5)
-
-            try:
-                while True:
-                    chunk = target_sock.recv(4096)
-                    if not chunk:
-                        break
-                    response_data += chunk
-            except socket.timeout:
-                pass
-
-            target_sock.close()
-
-            if response_data:
-                self.wfile.write(response_data)
-            else:
-                self.send_error(500, "No response from server")
-
-        except Exception as e:
-            print(f"Proxy error: {e}")
-            try:
-                self.send_error(500, f"Proxy error: {str(e)}")
-            except:
-                pass
-
-    def forward_data_slow(self, source, destination, total_bytes):
-        bytes_sent = 0
-        chunk_size = min(8192, self.bandwidth_limit // 4)
-
-        while bytes_sent < total_bytes:
-            remaining = total_bytes - bytes_sent
-            to_read = min(chunk_size, remaining)
-
-            chunk = source.read(to_read)
-            if not chunk:
-                break
-
-            destination.send(chunk)
-            bytes_sent += len(chunk)
-
-            time.sleep(len(chunk) / self.bandwidth_limit)
-
-            progress = (bytes_sent / total_bytes) * 100
-            if int(progress) % 10 == 0:
-                print(f"Proxy: {progress:.0f}% uploaded ({bytes_sent}/{total_bytes} bytes)")
-
-        print(f"Proxy: Upload completed - {bytes_sent} bytes forwarded")
-
-    def log_message(self, format, *args):
-        pass
-
-
-class SlowProxy:
-    def __init__(self, target_host, target_port, proxy_port=8888, bandwidth_kbps=50):
-        self.target_host = target_host
-        self.target_port = target_port
-        self.proxy_port = proxy_port
-        self.bandwidth_limit = bandwidth_kbps * 1024
-        self.server = None
-        self.server_thread = None
-
-    def start(self):
-        def handler(*args, **kwargs):
-            return SlowProxyHandler(*args,
-                                    target_host=self.target_host,
-                                    target_port=self.target_port,
-                                    bandwidth_limit=self.bandwidth_limit,
-                                    **kwargs)
-
-        self.server = socketserver.TCPServer(("127.0.0.1", self.proxy_port), handler)
-        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
-        self.server_thread.start()
-        print(
-            f"Proxy started: localhost:{self.proxy_port} -> {self.target_host}:{self.target_port} @ {self.bandwidth_limit // 1024}KB/s")
-
-    def stop(self):
-        if self.server:
-            self.server.shutdown()
-            self.server.server_close()
+from util import metrics
+from util.adaptive_upload import AdaptiveUploader, AimdController
+from util.api_client import SoundFragmentClient
+from util.chunked_upload import ChunkedUploader, ChunkedUploadError
+from util.config import load_config
+from util.load_generator import LoadGenerator
+from util.progress_stub_server import ProgressStubServer
+from util.progress_watcher import TERMINAL_STATUSES, ProgressWatcher
+from util.slow_proxy import SlowProxy
 
 
 class UploadTester:
-    def __init__(self, use_proxy=False, bandwidth_kbps=50):
-        self.base_url = os.getenv('API_HOST').rstrip('/')
-        self.session = requests.Session()
+    def __init__(self, use_proxy=False, bandwidth_kbps=50, interrupt_after_bytes=None, network_profiles=None,
+                 seed=None, api_host=None, api_token=None, link_kbps=None):
+        self.base_url = (api_host or os.getenv('API_HOST') or '').rstrip('/')
         self.proxy = None
 
-        auth_token = os.getenv('API_TOKEN')
-        if auth_token:
-            self.session.headers.update({'Authorization': f'Bearer {auth_token}'})
-        else:
+        self.auth_token = api_token or os.getenv('API_TOKEN')
+        if not self.auth_token:
             raise ValueError("API_TOKEN required")
-
         if not self.base_url:
             raise ValueError("API_HOST required")
 
@@ -153,25 +38,31 @@ class UploadTester:
             host = parsed_url.hostname
             port = parsed_url.port or (443 if parsed_url.scheme == 'https' else 80)
 
-            self.proxy = SlowProxy(host, port, bandwidth_kbps=bandwidth_kbps)
+            # bandwidth_kbps caps each connection; link_kbps is the uplink they all share.
+            self.proxy = SlowProxy(host, port, bandwidth_kbps=bandwidth_kbps, global_bandwidth_kbps=link_kbps,
+                                   interrupt_after_bytes=interrupt_after_bytes,
+                                   profiles=network_profiles, seed=seed)
             self.proxy.start()
             self.base_url = f"http://127.0.0.1:{self.proxy.proxy_port}"
 
-    def test_upload_with_real_progress(self, file_path, entity_id="temp"):
-        upload_url = f"{self.base_url}/api/soundfragments/files/{entity_id}"
+        # The pooled session reports connect/send/response timings to util.metrics.
+        self.client = SoundFragmentClient(self.base_url, self.auth_token)
+        self.session = self.client.session
 
+    def test_upload_with_real_progress(self, file_path, entity_id="temp"):
         print(f"Testing: {file_path}")
         print(f"Size: {os.path.getsize(file_path) / (1024 * 1024):.2f}MB")
         print("=" * 60)
 
         upload_result = {'response': None, 'error': None, 'done': False, 'upload_id': None}
+        upload_done = threading.Event()
 
         def do_upload():
             try:
                 print("Starting upload request...")
-                with open(file_path, 'rb') as f:
-                    files = {'file': (file_path.name, f, 'audio/wav')}
-                    response = self.session.post(upload_url, files=files, timeout=(30, 600))
+                with open(file_path, 'rb') as f, metrics.span("upload"):
+                    response = self.client.upload_file(f, file_path.name, entity_id=entity_id,
+                                                       content_type='audio/wav')
                     upload_result['response'] = response
 
                     if response.status_code == 200:
@@ -186,24 +77,21 @@ class UploadTester:
                 print(f"Upload error: {e}")
             finally:
                 upload_result['done'] = True
+                upload_done.set()
 
         # Start upload in background
         upload_thread = threading.Thread(target=do_upload, daemon=True)
         upload_thread.start()
 
-        # Wait a moment for upload to start
-        time.sleep(1)
-
-        # Monitor for upload ID to become available
+        # Wait for the upload ID; the event wakes us as soon as the response lands
         start_time = time.time()
         poll_count = 0
 
         print("Waiting for upload ID...")
-        while not upload_result['done'] and not upload_result['upload_id']:
+        while not upload_done.wait(2):
             poll_count += 1
             elapsed = time.time() - start_time
             print(f"[{poll_count:2d}] {elapsed:5.1f}s - Waiting for server response...")
-            time.sleep(2)
 
         # Once we have upload ID, start monitoring progress
         if upload_result['upload_id']:
@@ -228,58 +116,214 @@ class UploadTester:
         if self.proxy:
             self.proxy.stop()
 
-    def monitor_server_progress(self, upload_id):
-        progress_url = f"{self.base_url}/api/soundfragments/upload-progress/{upload_id}"
+    def test_chunked_upload(self, file_path, entity_id="temp", chunk_size=1024 * 1024):
+        total = os.path.getsize(file_path)
+
+        print(f"Testing chunked upload: {file_path}")
+        print(f"Size: {total / (1024 * 1024):.2f}MB, chunk size: {chunk_size / 1024:.0f}KB")
+        print("=" * 60)
 
-        poll_count = 0
         start_time = time.time()
-        last_percentage = -1
 
-        while True:
-            try:
-                poll_count += 1
-                elapsed = time.time() - start_time
-
-                response = self.session.get(progress_url)
-
-                if response.status_code == 404:
-                    print(f"[{poll_count:2d}] {elapsed:5.1f}s - Server: Upload session not found (404)")
-                    break
-                elif response.status_code != 200:
-                    print(f"[{poll_count:2d}] {elapsed:5.1f}s - Server: HTTP {response.status_code}")
-                    try:
-                        error_data = response.json()
-                        print(f"      Error JSON: {json.dumps(error_data, indent=8)}")
-                    except:
-                        print(f"      Error Text: {response.text[:200]}")
-                    break
-
-                data = response.json()
-                status = data.get('status', 'unknown')
-                percentage = data.get('percentage', 0)
-
-                # Only show when progress changes or every 10 polls
-                if percentage != last_percentage or poll_count % 10 == 1:
-                    print(f"[{poll_count:2d}] {elapsed:5.1f}s - Server: {percentage:3d}% - {status}")
-                    last_percentage = percentage
-
-                if status in ['finished', 'error']:
-                    print("=" * 60)
-                    print(f"Server processing completed: {status}")
-                    if data.get('metadata'):
-                        metadata = data['metadata']
-                        print(f"File info: {metadata.get('durationSeconds', '?')}s, {metadata.get('bitRate', '?')} bps")
-                    break
-
-                time.sleep(0.5)
+        def on_progress(bytes_sent, total_bytes):
+            elapsed = time.time() - start_time
+            print(f"{elapsed:5.1f}s - Client: {bytes_sent * 100 // max(total_bytes, 1):3d}% "
+                  f"({bytes_sent}/{total_bytes} bytes)")
 
-            except Exception as e:
-                print(f"[{poll_count:2d}] Progress poll error: {e}")
-                break
+        uploader = ChunkedUploader(self.client, chunk_size=chunk_size, progress_callback=on_progress)
+        try:
+            data = uploader.upload(file_path, entity_id)
+            print(f"FINAL RESULT: SUCCESS - ID: {data.get('id')}")
+            if data.get('id'):
+                self.monitor_server_progress(data['id'])
+        except (ChunkedUploadError, requests.RequestException) as e:
+            print(f"FINAL RESULT: ERROR - {e}")
+
+        if self.proxy:
+            self.proxy.stop()
+
+    def test_load(self, file_paths, users=50, ramp_up_seconds=10.0, iterations=1, duration_seconds=None,
+                  entity_id="temp", progress_mode="auto", report_path=None):
+        print(f"Load test: {users} virtual users, ramp-up {ramp_up_seconds:.0f}s, "
+              f"{f'{duration_seconds:.0f}s' if duration_seconds else f'{iterations} cycle(s) each'}, "
+              f"{len(file_paths)} file(s)")
+        print("=" * 60)
+
+        completed = 0
+        completed_lock = threading.Lock()
+
+        def on_result(result):
+            nonlocal completed
+            with completed_lock:
+                completed += 1
+                count = completed
+            if result['error']:
+                print(f"[{count:4d}] VU {result['user']:3d} ERROR {result['error']}")
+            elif count % max(1, users // 10) == 0:
+                print(f"[{count:4d}] VU {result['user']:3d} done in {result['latency']:.2f}s")
+
+        generator = LoadGenerator(self.base_url, file_paths, users=users, ramp_up_seconds=ramp_up_seconds,
+                                  iterations=iterations, duration_seconds=duration_seconds, entity_id=entity_id,
+                                  api_token=self.auth_token, progress_mode=progress_mode, on_result=on_result)
+        try:
+            summary = generator.run()
+        finally:
+            generator.session.close()
+            if self.proxy:
+                self.proxy.stop()
+
+        print("=" * 60)
+        print(f"Cycles: {summary['cycles']}, errors: {summary['errors']} ({summary['error_rate']:.1%}), "
+              f"throughput: {summary['mb_per_second']:.2f}MB/s, {summary['cycles_per_second']:.2f} cycles/s")
+        for label in ('upload_latency', 'processing_latency', 'cycle_latency'):
+            stats = summary[label]
+            if stats['count']:
+                print(f"{label:20s} p50 {stats['p50']:8.3f}s  p95 {stats['p95']:8.3f}s  p99 {stats['p99']:8.3f}s")
+        for kind, count in summary['error_kinds'].items():
+            print(f"  {count:4d} x {kind}")
+        print("Throughput over time:")
+        for point in summary['timeline']:
+            print(f"  {point['second']:6.0f}s  users {point['activeUsers']:4d}  cycles {point['cycles']:4d}  "
+                  f"errors {point['errors']:3d}  {point['mb_per_second']:7.2f}MB/s")
+        if report_path:
+            with open(report_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"Report written to {report_path}")
+        return summary
+
+    def test_adaptive_upload(self, file_paths, entity_id="temp", max_concurrency=16, report_path=None):
+        print(f"Adaptive upload: {len(file_paths)} file(s), up to {max_concurrency} in flight")
+        print("=" * 60)
+
+        controller = AimdController(max_concurrency=max_concurrency)
+        uploader = AdaptiveUploader(self.base_url, self.auth_token, entity_id=entity_id, controller=controller)
+        try:
+            for result in uploader.upload_all(file_paths):
+                status = f"ERROR {result['error']}" if result['error'] else f"{result['latency']:.1f}s"
+                print(f"{Path(result['file_path']).name}: {status} "
+                      f"(now {result['concurrency']} x {result['chunk_size'] // 1024}KB)")
+        finally:
+            uploader.session.close()
+            if self.proxy:
+                self.proxy.stop()
+
+        summary = uploader.summary()
+        print("=" * 60)
+        for window in summary['windows']:
+            print(f"  {window['second']:6.1f}s  {window['concurrency']:2d} x {window['chunkSize'] // 1024:6d}KB  "
+                  f"{window['mbPerSecond']:7.2f}MB/s  {window['action']}")
+        if summary['converged']:
+            concurrency, chunk_size = summary['converged']
+            print(f"Converged on {concurrency} upload(s) x {chunk_size // 1024}KB chunks, "
+                  f"{summary['mb_per_second']:.2f}MB/s overall")
+        if report_path:
+            with open(report_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"Report written to {report_path}")
+        return summary
+
+    def monitor_server_progress(self, upload_id, mode="auto"):
+        start_time = time.time()
+        update_count = 0
+
+        def on_update(data):
+            nonlocal update_count
+            update_count += 1
+            elapsed = time.time() - start_time
+            print(f"[{update_count:2d}] {elapsed:5.1f}s - Server: {data.get('percentage', 0):3d}% - "
+                  f"{data.get('status', 'unknown')}")
+
+        watcher = ProgressWatcher(self.session, self.base_url, mode=mode, on_update=on_update)
+        data = watcher.watch(upload_id)
+        status = data.get('status')
+
+        if status == 'not_found':
+            print("Server: Upload session not found (404)")
+        elif status == 'http_error':
+            print(f"Server: HTTP {data.get('httpStatus')}")
+            print(f"      Error Text: {data.get('body')}")
+        elif status == 'poll_error':
+            print(f"Progress poll error: {data.get('error')}")
+        elif status in TERMINAL_STATUSES:
+            print("=" * 60)
+            print(f"Server processing completed: {status} ({watcher.requests_made} progress requests)")
+            if data.get('metadata'):
+                metadata = data['metadata']
+                print(f"File info: {metadata.get('durationSeconds', '?')}s, {metadata.get('bitRate', '?')} bps")
+        return data
+
+
+def run_load(args):
+    stub = None
+    api_host = api_token = None
+    if args.stub:
+        stub = ProgressStubServer(upload_seconds=args.stub_upload_seconds).start()
+        api_host, api_token = stub.base_url, 'stub-token'
+        print(f"Using local progress stub at {stub.base_url}")
+    try:
+        tester = UploadTester(use_proxy=args.bandwidth_kbps > 0, bandwidth_kbps=args.bandwidth_kbps,
+                              api_host=api_host, api_token=api_token)
+        if tester.proxy:
+            tester.proxy.verbose = False
+        tester.test_load([Path(p) for p in args.files], users=args.users, ramp_up_seconds=args.ramp_up,
+                         iterations=args.iterations, duration_seconds=args.duration,
+                         progress_mode=args.progress_mode, report_path=args.report)
+    finally:
+        if stub:
+            stub.stop()
+
+
+def export_metrics(args):
+    if args.metrics_json:
+        metrics.REGISTRY.write_json(args.metrics_json)
+        print(f"Timing metrics written to {args.metrics_json}")
+    if args.metrics_prom:
+        metrics.REGISTRY.write_prometheus(args.metrics_prom)
+        print(f"Prometheus metrics written to {args.metrics_prom}")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Upload + progress tests against the SoundFragment API.")
+    parser.add_argument('files', nargs='*', help="files to upload in load mode")
+    parser.add_argument('--load', action='store_true', help="run many virtual users instead of one upload")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--ramp-up', type=float, default=10.0, help="seconds over which users start")
+    parser.add_argument('--iterations', type=int, default=1, help="upload cycles per user")
+    parser.add_argument('--duration', type=float, help="run for this many seconds instead of --iterations")
+    parser.add_argument('--progress-mode', choices=('auto', 'poll'), default='auto')
+    parser.add_argument('--adaptive', action='store_true',
+                        help="upload the files with self-tuning concurrency and chunk size")
+    parser.add_argument('--max-concurrency', type=int, default=16, help="upper bound for --adaptive")
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help="route through SlowProxy at this rate")
+    parser.add_argument('--link-kbps', type=int, default=0, help="SlowProxy rate shared by all connections")
+    parser.add_argument('--stub', action='store_true', help="run against a local progress stub server")
+    parser.add_argument('--stub-upload-seconds', type=float, default=3.0)
+    parser.add_argument('--report', help="write the JSON summary here")
+    parser.add_argument('--metrics-json', help="write per-stage latency histograms as JSON here")
+    parser.add_argument('--metrics-prom', help="write the same metrics in Prometheus text format here")
+    args = parser.parse_args()
+
+    load_config()
     try:
+        if args.adaptive:
+            if not args.files:
+                parser.error("--adaptive needs at least one file")
+            tester = UploadTester(use_proxy=args.bandwidth_kbps > 0 or args.link_kbps > 0,
+                                  bandwidth_kbps=args.bandwidth_kbps, link_kbps=args.link_kbps or None)
+            if tester.proxy:
+                tester.proxy.verbose = False
+            tester.test_adaptive_upload([Path(p) for p in args.files], max_concurrency=args.max_concurrency,
+                                        report_path=args.report)
+            export_metrics(args)
+            return
+
+        if args.load:
+            if not args.files:
+                parser.error("--load needs at least one file")
+            run_load(args)
+            export_metrics(args)
+            return
+
         # Use slow proxy to simulate real network conditions
         tester = UploadTester(use_proxy=True, bandwidth_kbps=1000)
 
@@ -289,6 +333,7 @@ def main():
             tester.test_upload_with_real_progress(hardcoded_file, "temp")
         else:
             print(f"File not found: {hardcoded_file}")
+        export_metrics(args)
 
     except Exception as e:
         print(f"Error: {e}")
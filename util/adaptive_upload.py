@@ -0,0 +1,284 @@
+# adaptive_upload.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+from util.bulk_upload import UploadStats, latency_summary
+from util.chunked_upload import TRANSIENT_ERRORS, ChunkedUploader, ChunkedUploadError
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def _round_chunk(size, min_chunk, max_chunk):
+    # Powers of two keep the value from wandering on measurement noise.
+    size = max(min_chunk, min(max_chunk, int(size)))
+    return 1 << (size.bit_length() - 1)
+
+
+class AimdController:
+    """Picks upload concurrency and chunk size from measured throughput, AIMD style.
+
+    Every chunk PUT takes a slot (acquire/release), so at most concurrency requests are on
+    the wire whatever the number of files open. Finished chunks report their size and
+    duration, and throughput is their rate times the mean number of PUTs in flight.
+    429/5xx responses, timeouts and dropped connections report congestion. Once a window
+    has lasted window_seconds and seen at least one chunk per stream, it is evaluated:
+
+    - any congestion: concurrency is multiplied by decrease, the chunk size halved, and the
+      level that failed becomes a ceiling until the next probe. Failures of requests started
+      before the cut are not counted again, and the window after it is only a new baseline;
+    - throughput up by more than gain_threshold on the previous window: one more stream;
+    - no gain right after adding a stream: the link was already full, so that stream is
+      taken back and the controller holds, re-probing every probe_every quiet windows.
+
+    Between those events the chunk size follows the per-stream rate so each PUT takes about
+    target_chunk_seconds: small on slow uplinks (less to resend after a drop), large on fast
+    ones (fewer request round trips). history keeps one entry per window.
+    """
+
+    def __init__(self, initial_concurrency=2, min_concurrency=1, max_concurrency=16, initial_chunk_size=1024 * 1024,
+                 min_chunk_size=MIN_CHUNK_SIZE, max_chunk_size=MAX_CHUNK_SIZE, window_seconds=3.0,
+                 target_chunk_seconds=2.0, gain_threshold=0.1, decrease=0.5, probe_every=5):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.window_seconds = window_seconds
+        self.target_chunk_seconds = target_chunk_seconds
+        self.gain_threshold = gain_threshold
+        self.decrease = decrease
+        self.probe_every = probe_every
+        self.concurrency = max(min_concurrency, min(max_concurrency, initial_concurrency))
+        self.chunk_size = _round_chunk(initial_chunk_size, min_chunk_size, max_chunk_size)
+        self.history = []
+        self._active = 0
+        self._ceiling = None
+        self._previous_throughput = None
+        self._last_action = None
+        self._last_decrease_at = 0.0
+        self._quiet_windows = 0
+        self._started_at = time.monotonic()
+        self._lock = threading.Condition()
+        self._reset_window(self._started_at)
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._active_since = now
+        self._active_seconds = 0.0
+        self._window_bytes = 0
+        self._window_busy_seconds = 0.0
+        self._window_chunks = 0
+        self._window_latencies = []
+        self._window_congestion = []
+
+    def _count_active(self, now, delta):
+        # Integral of PUTs in flight over the window, for the mean stream count.
+        self._active_seconds += self._active * (now - self._active_since)
+        self._active_since = now
+        self._active += delta
+
+    def acquire(self):
+        """Wait for a request slot before a PUT."""
+        with self._lock:
+            while self._active >= self.concurrency:
+                self._lock.wait()
+            self._count_active(time.monotonic(), 1)
+
+    def release(self):
+        with self._lock:
+            self._count_active(time.monotonic(), -1)
+            self._lock.notify()
+
+    def record_chunk(self, size, seconds):
+        with self._lock:
+            self._window_bytes += size
+            self._window_busy_seconds += seconds
+            self._window_chunks += 1
+            self._window_latencies.append(seconds)
+            self._maybe_adjust(time.monotonic())
+
+    def record_congestion(self, kind, started_at):
+        metrics.counter(f"adaptive_congestion_{kind}").inc()
+        with self._lock:
+            if started_at < self._last_decrease_at:
+                return
+            self._window_congestion.append(kind)
+            self._maybe_adjust(time.monotonic())
+
+    def _maybe_adjust(self, now):
+        elapsed = now - self._window_start
+        if elapsed < self.window_seconds:
+            return
+        if not self._window_congestion and self._window_chunks < self.concurrency:
+            return
+
+        concurrency, chunk_size = self.concurrency, self.chunk_size
+        # Mean PUTs in flight x the rate chunks achieved: bytes per wall-clock window swing
+        # far more, because chunks finish in bursts.
+        self._count_active(now, 0)
+        streams = self._active_seconds / elapsed
+        per_stream = self._window_bytes / self._window_busy_seconds if self._window_busy_seconds else 0.0
+        throughput = streams * per_stream
+        if self._window_congestion:
+            action = 'decrease'
+            self._ceiling = max(self.min_concurrency, concurrency - 1)
+            self._last_decrease_at = now
+            self.concurrency = max(self.min_concurrency, int(concurrency * self.decrease))
+            self.chunk_size = max(self.min_chunk_size, self.chunk_size // 2)
+            # Throughput measured under congestion is no baseline for the next probe.
+            throughput_baseline = None
+        elif self._last_action == 'decrease':
+            # Chunks from before the cut still finished in this window; measure one clean
+            # window at the new level before judging any further step against it.
+            action = 'settle'
+            throughput_baseline = None
+        else:
+            probe = self._quiet_windows >= self.probe_every
+            if probe:
+                self._ceiling = None
+            limit = min(self.max_concurrency, self._ceiling or self.max_concurrency)
+            gained = (self._previous_throughput is None
+                      or throughput > self._previous_throughput * (1 + self.gain_threshold))
+            if (gained or probe) and concurrency < limit:
+                action = 'increase'
+                self.concurrency = concurrency + 1
+            elif not gained and self._last_action == 'increase':
+                action = 'back_off'
+                self.concurrency = max(self.min_concurrency, concurrency - 1)
+            else:
+                action = 'hold'
+            wanted = per_stream * self.target_chunk_seconds
+            # Only move once the ideal size is a factor of two away, so noise does not flip it.
+            if wanted >= self.chunk_size * 2 or wanted < self.chunk_size / 2:
+                self.chunk_size = _round_chunk(wanted, self.min_chunk_size, self.max_chunk_size)
+            throughput_baseline = throughput if action != 'back_off' else self._previous_throughput
+
+        self._quiet_windows = self._quiet_windows + 1 if action == 'hold' else 0
+        self._previous_throughput = throughput_baseline
+        self._last_action = action
+        self._lock.notify_all()
+        self.history.append({
+            'second': now - self._started_at,
+            'concurrency': concurrency,
+            'streams': streams,
+            'chunkSize': chunk_size,
+            'mbPerSecond': throughput / (1024 * 1024),
+            'chunkLatency': latency_summary(self._window_latencies)['p50'],
+            'congestion': len(self._window_congestion),
+            'action': action,
+        })
+        logger.debug("AIMD window: %.2f MB/s at %d stream(s) x %d KiB -> %s", throughput / (1024 * 1024),
+                     concurrency, chunk_size // 1024, action)
+        self._reset_window(now)
+
+    def converged(self, windows=5):
+        """(concurrency, chunk_size) most used in the last `windows` windows; None until there are that many."""
+        if len(self.history) < windows:
+            return None
+        recent = self.history[-windows:]
+        settings = [(entry['concurrency'], entry['chunkSize']) for entry in recent]
+        return max(set(settings), key=settings.count)
+
+
+class _MeasuredChunkedUploader(ChunkedUploader):
+    """ChunkedUploader that reports every PUT to the controller and takes its chunk size from it."""
+
+    def __init__(self, client, controller, **kwargs):
+        super().__init__(client, chunk_size=controller.chunk_size, **kwargs)
+        self.controller = controller
+
+    def next_chunk_size(self):
+        return self.controller.chunk_size
+
+    def _put(self, entity_id, file_name, body, content_range):
+        self.controller.acquire()
+        started = time.monotonic()
+        try:
+            response = super()._put(entity_id, file_name, body, content_range)
+        except ChunkedUploadError:
+            # _put only raises this for retryable statuses: 408, 429 and 5xx.
+            self.controller.record_congestion('http', started)
+            raise
+        except requests.Timeout:
+            self.controller.record_congestion('timeout', started)
+            raise
+        except TRANSIENT_ERRORS:
+            self.controller.record_congestion('connection', started)
+            raise
+        finally:
+            self.controller.release()
+        if body:
+            self.controller.record_chunk(len(body), time.monotonic() - started)
+        return response
+
+
+class AdaptiveUploader:
+    """Upload many files with resumable chunked PUTs, letting an AimdController size the work.
+
+    The number of files in flight follows controller.concurrency (re-read whenever a slot
+    frees) and every chunk uses the controller's current chunk size, so the uploader settles
+    on whatever the link sustains. Results look like BulkUploader's, plus the concurrency and
+    chunk size in force when the file finished.
+    """
+
+    def __init__(self, api_host, api_token, entity_id="temp", controller=None, session=None, max_retries=5,
+                 backoff_seconds=0.5, timeout=(10, 60)):
+        self.controller = controller or AimdController()
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.client = SoundFragmentClient(api_host, api_token, pool_size=self.controller.max_concurrency,
+                                          timeout=timeout, session=session)
+        self.session = self.client.session
+        self.entity_id = entity_id
+        self.stats = UploadStats()
+
+    def upload_all(self, file_paths):
+        with ThreadPoolExecutor(max_workers=self.controller.max_concurrency) as executor:
+            pending = set()
+            for file_path in file_paths:
+                while len(pending) >= self.controller.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._finish(done)
+                pending.add(executor.submit(self.upload_one, file_path))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._finish(done)
+
+    def _finish(self, done):
+        for future in done:
+            result = future.result()
+            self.stats.record(result)
+            yield result
+
+    def upload_one(self, file_path):
+        result = {'file_path': str(file_path), 'upload_id': None, 'size': 0, 'latency': None, 'attempts': 1,
+                  'error': None, 'content_hash': None, 'concurrency': None, 'chunk_size': None}
+        uploader = _MeasuredChunkedUploader(self.client, self.controller, max_retries=self.max_retries,
+                                            backoff_seconds=self.backoff_seconds, timeout=self.timeout)
+        started = time.monotonic()
+        try:
+            result['size'] = os.path.getsize(file_path)
+            data = uploader.upload(file_path, self.entity_id)
+            result.update(upload_id=data.get('id'), latency=time.monotonic() - started,
+                          content_hash=uploader.content_hash)
+        except (OSError, ChunkedUploadError, requests.RequestException) as e:
+            result['error'] = str(e)
+        result.update(concurrency=self.controller.concurrency, chunk_size=self.controller.chunk_size)
+        return result
+
+    def summary(self):
+        summary = self.stats.summary()
+        summary['converged'] = self.controller.converged()
+        summary['windows'] = list(self.controller.history)
+        return summary
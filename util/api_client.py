@@ -0,0 +1,331 @@
+# api_client.py
+
+import json
+import os
+import time
+import uuid
+
+from util import metrics
+from util.http_session import create_session
+
+DEFAULT_TIMEOUT = (10, 60)
+UPLOAD_TIMEOUT = (30, 600)
+
+
+class MultipartFileBody:
+    """multipart/form-data body for one file, read from fileobj while it is being sent.
+
+    requests' files= builds the whole body in memory first; this produces the same bytes
+    block by block, with a Content-Length, so a large upload holds one block at a time.
+    """
+
+    def __init__(self, fileobj, file_name, size, field="file", content_type="application/octet-stream"):
+        self.boundary = uuid.uuid4().hex
+        quoted = file_name.replace('"', '%22')
+        self._head = (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{quoted}"\r\n'
+                      f'Content-Type: {content_type}\r\n\r\n').encode()
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self._file = fileobj
+        self._remaining = size
+        self.length = len(self._head) + size + len(self._tail)
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        blocks = []
+        while size > 0:
+            if self._head:
+                block, self._head = self._head[:size], self._head[size:]
+            elif self._remaining:
+                block = self._file.read(min(size, self._remaining))
+                if not block:
+                    raise OSError("file shrank while it was being uploaded")
+                self._remaining -= len(block)
+            elif self._tail:
+                block, self._tail = self._tail[:size], self._tail[size:]
+            else:
+                break
+            blocks.append(block)
+            size -= len(block)
+        return b''.join(blocks)
+
+
+def _remaining_size(fileobj):
+    return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+
+
+class EventStreamParser:
+    """Turns text/event-stream lines into the JSON payloads of their data: fields."""
+
+    def __init__(self):
+        self._data_lines = []
+
+    def feed(self, line):
+        """Returns the decoded event when line (without its newline) ends one, else None."""
+        if line:
+            if line.startswith('data:'):
+                self._data_lines.append(line[5:].strip())
+            return None
+        if not self._data_lines:
+            return None
+        # A blank line ends the event.
+        data, self._data_lines = '\n'.join(self._data_lines), []
+        return json.loads(data)
+
+
+class _Endpoints:
+    """URLs of the API, shared by the sync and asyncio clients."""
+
+    def __init__(self, api_host):
+        self.api_host = api_host.rstrip('/')
+
+    def genres_url(self):
+        return f"{self.api_host}/api/genres"
+
+    def upload_url(self, entity_id="temp"):
+        return f"{self.api_host}/api/soundfragments/files/{entity_id}"
+
+    def upsert_url(self):
+        return f"{self.api_host}/api/soundfragments/"
+
+    def file_url(self, fragment_id, file_id):
+        return f"{self.api_host}/api/soundfragments/files/{fragment_id}/{file_id}"
+
+    def progress_url(self, upload_id):
+        return f"{self.api_host}/api/soundfragments/upload-progress/{upload_id}"
+
+
+def _conditional_headers(etag, last_modified):
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
+
+
+def chunk_headers(file_name, content_range):
+    """Headers of one resumable-upload PUT; content_range is "bytes first-last/total" or "bytes */total"."""
+    return {
+        'Content-Range': content_range,
+        'Content-Type': 'application/octet-stream',
+        'X-File-Name': file_name,
+    }
+
+
+def _range_header(byte_range):
+    start, end = byte_range
+    return {'Range': f"bytes={start}-{'' if end is None else end}"}
+
+
+class SoundFragmentClient(_Endpoints):
+    """Blocking client for the genre and SoundFragment endpoints over one pooled keep-alive session.
+
+    Every call takes a timeout ((connect, read) seconds or one number, as in requests) that
+    overrides the client default, and returns the requests.Response for the caller to judge.
+    upload_file streams the multipart body from disk and put_chunk sends one resumable chunk;
+    get_file and progress_stream return open streaming responses, so use them as context managers.
+    """
+
+    def __init__(self, api_host, api_token=None, pool_size=10, timeout=DEFAULT_TIMEOUT, session=None):
+        super().__init__(api_host)
+        self.timeout = timeout
+        self.session = session or create_session(api_token, pool_size=pool_size)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, method, url, timeout=None, **kwargs):
+        return self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+
+    def get_genres(self, etag=None, last_modified=None, timeout=None):
+        return self._request('GET', self.genres_url(), headers=_conditional_headers(etag, last_modified),
+                             timeout=timeout)
+
+    def upload_file(self, fileobj, file_name, entity_id="temp", size=None, content_type="application/octet-stream",
+                    timeout=None):
+        """Multipart POST of fileobj from its current position; size defaults to the rest of the file."""
+        body = MultipartFileBody(fileobj, file_name, _remaining_size(fileobj) if size is None else size,
+                                 content_type=content_type)
+        return self._request('POST', self.upload_url(entity_id), data=body,
+                             headers={'Content-Type': body.content_type}, timeout=timeout or UPLOAD_TIMEOUT)
+
+    def put_chunk(self, body, content_range, file_name, entity_id="temp", timeout=None):
+        """One Content-Range PUT of a resumable upload; the server answers 308 until the last chunk.
+
+        An empty body with "bytes */<total>" asks for the acknowledged offset. ChunkedUploader
+        drives the whole retry and resume loop on top of this.
+        """
+        return self._request('PUT', self.upload_url(entity_id), data=body,
+                             headers=chunk_headers(file_name, content_range), timeout=timeout or UPLOAD_TIMEOUT)
+
+    def upsert(self, payload, timeout=None):
+        return self._request('POST', self.upsert_url(), json=payload, timeout=timeout)
+
+    def head_file(self, fragment_id, file_id, timeout=None):
+        return self._request('HEAD', self.file_url(fragment_id, file_id), timeout=timeout)
+
+    def get_file(self, fragment_id, file_id, byte_range=None, timeout=None):
+        """Streaming GET of a stored file; byte_range=(start, end or None) asks for part of it."""
+        headers = _range_header(byte_range) if byte_range else {}
+        return self._request('GET', self.file_url(fragment_id, file_id), headers=headers, stream=True,
+                             timeout=timeout)
+
+    def get_progress(self, upload_id, timeout=None):
+        return self._request('GET', self.progress_url(upload_id), timeout=timeout)
+
+    def progress_stream(self, upload_id, timeout=None):
+        return self._request('GET', f"{self.progress_url(upload_id)}/stream", stream=True,
+                             headers={'Accept': 'text/event-stream'}, timeout=timeout)
+
+    @staticmethod
+    def iter_events(response):
+        """Decoded events of an open progress_stream response, as each one arrives."""
+        parser = EventStreamParser()
+        # chunk_size=None hands lines over as each chunk arrives instead of waiting for 512 bytes.
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            event = parser.feed(line)
+            if event is not None:
+                yield event
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError as e:
+        raise ImportError("AsyncSoundFragmentClient needs aiohttp (pip install aiohttp)") from e
+    return aiohttp
+
+
+def _trace_config(aiohttp):
+    # The same connect timings and status counters the sync session reports.
+    async def on_connection_create_start(session, context, params):
+        context.connect_started = time.perf_counter()
+
+    async def on_connection_create_end(session, context, params):
+        metrics.histogram("http_connect_seconds").observe(time.perf_counter() - context.connect_started)
+
+    async def on_request_end(session, context, params):
+        metrics.counter(f"http_responses_{params.response.status // 100}xx").inc()
+
+    async def on_request_exception(session, context, params):
+        metrics.counter("http_send_errors").inc()
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class AsyncSoundFragmentClient(_Endpoints):
+    """asyncio twin of SoundFragmentClient, on aiohttp (an optional dependency, imported on first use).
+
+    One event loop keeps up to limit requests in flight over a keep-alive connection pool,
+    without a thread per request. Plain calls read the body before returning, so the response
+    can be inspected after the connection is back in the pool (await response.json() still
+    works). get_file and progress_stream are not awaited but entered: async with
+    client.get_file(...) as response, then response.content.iter_chunked(size).
+    """
+
+    def __init__(self, api_host, api_token=None, limit=100, timeout=DEFAULT_TIMEOUT, keepalive_seconds=30):
+        super().__init__(api_host)
+        self.api_token = api_token
+        self.limit = limit
+        self.timeout = timeout
+        self.keepalive_seconds = keepalive_seconds
+        self._session = None
+
+    @property
+    def session(self):
+        """The aiohttp.ClientSession, created on first use inside the running loop."""
+        if self._session is None:
+            aiohttp = _import_aiohttp()
+            headers = {'Authorization': f'Bearer {self.api_token}'} if self.api_token else None
+            connector = aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=self.keepalive_seconds)
+            self._session = aiohttp.ClientSession(connector=connector, headers=headers,
+                                                  trace_configs=[_trace_config(aiohttp)])
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _client_timeout(self, timeout):
+        aiohttp = _import_aiohttp()
+        timeout = timeout or self.timeout
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+        return aiohttp.ClientTimeout(total=timeout)
+
+    def _request(self, method, url, timeout=None, **kwargs):
+        return self.session.request(method, url, timeout=self._client_timeout(timeout), **kwargs)
+
+    async def _fetch(self, method, url, timeout=None, **kwargs):
+        async with self._request(method, url, timeout=timeout, **kwargs) as response:
+            await response.read()
+            return response
+
+    async def get_genres(self, etag=None, last_modified=None, timeout=None):
+        return await self._fetch('GET', self.genres_url(), headers=_conditional_headers(etag, last_modified),
+                                 timeout=timeout)
+
+    async def upload_file(self, file_path, file_name=None, entity_id="temp", content_type="application/octet-stream",
+                          timeout=None):
+        """Multipart POST of file_path; aiohttp reads the file in blocks as the body goes out."""
+        form = _import_aiohttp().FormData()
+        with open(file_path, 'rb') as f:
+            form.add_field('file', f, filename=file_name or os.path.basename(file_path),
+                           content_type=content_type)
+            return await self._fetch('POST', self.upload_url(entity_id), data=form, timeout=timeout or UPLOAD_TIMEOUT)
+
+    async def put_chunk(self, body, content_range, file_name, entity_id="temp", timeout=None):
+        return await self._fetch('PUT', self.upload_url(entity_id), data=body,
+                                 headers=chunk_headers(file_name, content_range), timeout=timeout or UPLOAD_TIMEOUT)
+
+    async def upsert(self, payload, timeout=None):
+        return await self._fetch('POST', self.upsert_url(), json=payload, timeout=timeout)
+
+    async def head_file(self, fragment_id, file_id, timeout=None):
+        return await self._fetch('HEAD', self.file_url(fragment_id, file_id), timeout=timeout)
+
+    def get_file(self, fragment_id, file_id, byte_range=None, timeout=None):
+        headers = _range_header(byte_range) if byte_range else {}
+        return self._request('GET', self.file_url(fragment_id, file_id), headers=headers, timeout=timeout)
+
+    async def get_progress(self, upload_id, timeout=None):
+        return await self._fetch('GET', self.progress_url(upload_id), timeout=timeout)
+
+    def progress_stream(self, upload_id, timeout=None):
+        return self._request('GET', f"{self.progress_url(upload_id)}/stream",
+                             headers={'Accept': 'text/event-stream'}, timeout=timeout)
+
+    @staticmethod
+    async def iter_events(response):
+        parser = EventStreamParser()
+        async for line in response.content:
+            event = parser.feed(line.decode('utf-8').rstrip('\r\n'))
+            if event is not None:
+                yield event
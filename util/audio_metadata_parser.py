@@ -1,88 +1,211 @@
 # audio_metadata_parser.py
 
+import logging
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import mutagen
-from mutagen.id3 import ID3NoHeaderError
-from mutagen.mp3 import MP3
-from mutagen.wave import WAVE
-from mutagen.easyid3 import EasyID3
+
+from util import metrics
+from util.tag_readers import TECHNICAL_FIELDS, read_tags
+
+PARSER_VERSION = "2"
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".ogg", ".opus", ".m4a")
+
+
+def empty_metadata(technical=False):
+    metadata = {"artist": None, "title": None, "album": None, "genre": None}
+    if technical:
+        metadata.update(dict.fromkeys(TECHNICAL_FIELDS))
+    return metadata
+
+
+def iter_audio_files(root, extensions=AUDIO_EXTENSIONS):
+    """Walk root depth-first and yield audio file paths without building a full listing."""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith(extensions):
+                        yield entry.path
+        except OSError as e:
+            logging.getLogger(__name__).warning("Cannot scan %s: %s", directory, e)
+
+
+def _parse_chunk(file_paths, options):
+    # Workers have their own copy of util.metrics, so timings travel back with the results.
+    parser = AudioMetadataParser(logging.getLogger(__name__), **options)
+    results = []
+    for file_path in file_paths:
+        started = time.perf_counter()
+        metadata = parser._parse_file(file_path)
+        results.append((file_path, metadata, time.perf_counter() - started))
+    return results
+
+
+def _record_parse_times(results):
+    parse_seconds = metrics.histogram("parse_seconds")
+    for _, _, seconds in results:
+        parse_seconds.observe(seconds)
+    return [(file_path, metadata) for file_path, metadata, _ in results]
 
 
 class AudioMetadataParser:
-    def __init__(self, logger):
+    def __init__(self, logger, cache=None, technical=False, analyze_waveform=False, genre_normalizer=None):
+        """technical adds header-only durationSeconds/bitRate/sampleRate/channels.
+
+        analyze_waveform additionally memory-maps WAV audio and adds a "waveform" entry with
+        peak, RMS and clip counts (requires numpy; other formats get None).
+
+        genre_normalizer (a GenreNormalizer) maps "genre" onto the canonical list and keeps the
+        tag value as "rawGenre". It runs in this process on the way out, so cached entries
+        hold raw tags and stay valid when genres.json changes.
+        """
         self.logger = logger
+        self.cache = cache
+        self.genre_normalizer = genre_normalizer
+        self.technical = technical
+        self.analyze_waveform = analyze_waveform
+        self.cache_version = PARSER_VERSION
+        if technical:
+            self.cache_version += "+technical"
+        if analyze_waveform:
+            # Fail here, not once per file, when the optional numpy dependency is missing.
+            import util.waveform_stats  # noqa: F401
+            self.cache_version += "+waveform"
+
+    def _worker_options(self):
+        return {"technical": self.technical, "analyze_waveform": self.analyze_waveform}
+
+    def parse_many(self, file_paths, workers=None, chunk_size=32, max_pending_chunks=None):
+        """Parse files on a process pool and yield (file_path, metadata) in completion order.
+
+        Paths are consumed lazily and at most max_pending_chunks chunks are in flight, so
+        memory stays bounded however long the input is. workers=1 parses in-process.
+        Cache lookups and writes happen here in the parent; only misses reach the pool.
+        """
+        if workers == 1:
+            for file_path in file_paths:
+                yield file_path, self.parse_metadata(file_path)
+            return
+        for file_path, metadata in self._parse_pool(file_paths, workers, chunk_size, max_pending_chunks):
+            yield file_path, self._normalize_genre(metadata)
+
+    def _parse_pool(self, file_paths, workers, chunk_size, max_pending_chunks):
+        workers = workers or os.cpu_count() or 1
+        if max_pending_chunks is None:
+            max_pending_chunks = workers * 2
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            chunk = []
+            for file_path in file_paths:
+                if self.cache is not None:
+                    metadata = self.cache.get(file_path, self.cache_version)
+                    if metadata is not None:
+                        metrics.counter("parse_cache_hits").inc()
+                        yield file_path, metadata
+                        continue
+
+                chunk.append(file_path)
+                if len(chunk) < chunk_size:
+                    continue
+                pending[executor.submit(_parse_chunk, chunk, self._worker_options())] = chunk
+                chunk = []
+                if len(pending) >= max_pending_chunks:
+                    yield from self._collect_completed(pending)
+
+            if chunk:
+                pending[executor.submit(_parse_chunk, chunk, self._worker_options())] = chunk
+            while pending:
+                yield from self._collect_completed(pending)
+
+    def _collect_completed(self, pending):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            chunk = pending.pop(future)
+            try:
+                results = _record_parse_times(future.result())
+            except Exception as e:
+                # A crashed or unpicklable chunk says nothing about the files, so the empty
+                # fallback is not cached and the next run parses them again.
+                metrics.counter("parse_errors").inc(len(chunk))
+                self.logger.error("Worker failed on a chunk of %d files: %s", len(chunk), e)
+                yield from ((file_path, self._empty_metadata()) for file_path in chunk)
+                continue
+            if self.cache is not None:
+                for file_path, metadata in results:
+                    self.cache.put(file_path, metadata, self.cache_version)
+            yield from results
+
+    def parse_on(self, executor, file_path):
+        """Parse one file on executor (typically a shared ProcessPoolExecutor) and wait for it.
+
+        Cache and genre handling stay in the calling process, as in parse_many; this is for
+        callers that schedule files one at a time from their own threads.
+        """
+        if self.cache is not None:
+            metadata = self.cache.get(file_path, self.cache_version)
+            if metadata is not None:
+                metrics.counter("parse_cache_hits").inc()
+                return self._normalize_genre(metadata)
+        results = executor.submit(_parse_chunk, [file_path], self._worker_options()).result()
+        metadata = _record_parse_times(results)[0][1]
+        if self.cache is not None:
+            self.cache.put(file_path, metadata, self.cache_version)
+        return self._normalize_genre(metadata)
+
+    def parse_directory(self, root, extensions=AUDIO_EXTENSIONS, **kwargs):
+        return self.parse_many(iter_audio_files(root, extensions), **kwargs)
 
     def parse_metadata(self, file_path):
-        artist = None
-        title = None
-        album = None
-        genre = None
+        if self.cache is None:
+            with metrics.span("parse"):
+                metadata = self._parse_file(file_path)
+            return self._normalize_genre(metadata)
+
+        metadata = self.cache.get(file_path, self.cache_version)
+        if metadata is None:
+            with metrics.span("parse"):
+                metadata = self._parse_file(file_path)
+            self.cache.put(file_path, metadata, self.cache_version)
+        else:
+            metrics.counter("parse_cache_hits").inc()
+        return self._normalize_genre(metadata)
+
+    def _normalize_genre(self, metadata):
+        if self.genre_normalizer is None:
+            return metadata
+        # Copy: the cache's in-memory tier may hand out the same dict again.
+        metadata = dict(metadata, rawGenre=metadata.get("genre"))
+        metadata["genre"] = self.genre_normalizer.normalize(metadata["rawGenre"])
+        return metadata
+
+    def _empty_metadata(self):
+        metadata = empty_metadata(self.technical)
+        if self.analyze_waveform:
+            metadata["waveform"] = None
+        return metadata
+
+    def _parse_file(self, file_path):
         filename = os.path.basename(file_path)
 
         try:
-            if filename.lower().endswith(".mp3"):
-                try:
-                    audio = EasyID3(file_path)
-                    if 'artist' in audio: artist = audio['artist'][0]
-                    if 'title' in audio: title = audio['title'][0]
-                    if 'album' in audio: album = audio['album'][0]
-                    if 'genre' in audio: genre = audio['genre'][0]
-                except ID3NoHeaderError:
-                    self.logger.debug(f"No EasyID3 tags for MP3 {filename}. Trying full mutagen load.")
-                except Exception as e_easyid3:
-                    self.logger.warning(f"EasyID3 failed for {filename}: {e_easyid3}. Trying general load.")
-
-            if not (artist and title and album) or not filename.lower().endswith(".mp3"):
-                audio_obj = mutagen.File(file_path, easy=False)
-                if audio_obj is None:
-                    self.logger.warning(f"Mutagen could not recognize file type for {filename}.")
-                    return {"artist": None, "title": None, "album": None, "genre": None}
-
-                if isinstance(audio_obj, MP3):
-                    if not artist and 'TPE1' in audio_obj: artist = str(audio_obj['TPE1'].text[0]) if audio_obj[
-                        'TPE1'].text else None
-                    if not title and 'TIT2' in audio_obj: title = str(audio_obj['TIT2'].text[0]) if audio_obj[
-                        'TIT2'].text else None
-                    if not album and 'TALB' in audio_obj: album = str(audio_obj['TALB'].text[0]) if audio_obj[
-                        'TALB'].text else None
-                    if not genre and 'TCON' in audio_obj: genre = str(audio_obj['TCON'].text[0]) if audio_obj[
-                        'TCON'].text else None
-                elif isinstance(audio_obj, WAVE) and audio_obj.tags:
-                    if not artist:
-                        if 'ARTIST' in audio_obj.tags:
-                            artist = str(audio_obj.tags['ARTIST'][0])
-                        elif 'IART' in audio_obj.tags:
-                            artist = str(audio_obj.tags['IART'][0])
-                    if not title:
-                        if 'TITLE' in audio_obj.tags:
-                            title = str(audio_obj.tags['TITLE'][0])
-                        elif 'INAM' in audio_obj.tags:
-                            title = str(audio_obj.tags['INAM'][0])
-                    if not album:
-                        if 'ALBUM' in audio_obj.tags: album = str(audio_obj.tags['ALBUM'][0])
-                        elif 'IPRD' in audio_obj.tags:
-                            album = str(audio_obj.tags['IPRD'][0])
-                    if not genre:
-                        if 'GENRE' in audio_obj.tags: genre = str(audio_obj.tags['GENRE'][0])
-
-                if not artist and 'artist' in audio_obj:
-                    artist_val = audio_obj.get('artist')
-                    if isinstance(artist_val, list) and artist_val:
-                        artist = str(artist_val[0])
-                    elif isinstance(artist_val, str):
-                        artist = artist_val
-                if not title and 'title' in audio_obj:
-                    title_val = audio_obj.get('title')
-                    if isinstance(title_val, list) and title_val:
-                        title = str(title_val[0])
-                    elif isinstance(title_val, str):
-                        title = title_val
-                if not album and 'album' in audio_obj:
-                    album_val = audio_obj.get('album')
-                    if isinstance(album_val, list) and album_val:
-                        album = str(album_val[0])
-                    elif isinstance(album_val, str):
-                        album = album_val
+            tags = read_tags(file_path, technical=self.technical)
+            if tags is None:
+                self.logger.warning("Mutagen could not recognize file type for %s.", filename)
+                return self._empty_metadata()
+
+            artist = tags.get("artist")
+            title = tags.get("title")
+            album = tags.get("album")
+            genre = tags.get("genre")
 
             if artist and artist.strip().lower() in ["unknown artist", "unknown", "various artists"]: artist = None
             if title and title.strip().lower() in ["unknown title", "unknown", "untitled"]: title = None
@@ -97,15 +220,33 @@ class AudioMetadataParser:
             genre = genre.strip() if genre else None
 
             if artist or title or album or genre:
-                self.logger.info(f"Metadata parsed for {filename}: Artist='{artist}', Title='{title}', Album='{album}', Genre='{genre}'")
+                self.logger.info("Metadata parsed for %s: Artist='%s', Title='%s', Album='%s', Genre='%s'",
+                                 filename, artist, title, album, genre)
             else:
-                self.logger.info(f"No specific artist/title/album/genre metadata found in {filename}.")
+                self.logger.info("No specific artist/title/album/genre metadata found in %s.", filename)
 
-            return {"artist": artist, "title": title, "album": album, "genre": genre}
+            metadata = {"artist": artist, "title": title, "album": album, "genre": genre}
+            if self.technical:
+                for field in TECHNICAL_FIELDS:
+                    metadata[field] = tags.get(field)
+            if self.analyze_waveform:
+                metadata["waveform"] = self._analyze_waveform(file_path)
+            return metadata
 
         except mutagen.MutagenError as e:
-            self.logger.warning(f"Mutagen error parsing metadata for {filename}: {e}.")
-            return {"artist": None, "title": None, "album": None, "genre": None}
+            self.logger.warning("Mutagen error parsing metadata for %s: %s.", filename, e)
+            return self._empty_metadata()
         except Exception as e:
-            self.logger.error(f"Unexpected error parsing metadata for {filename}: {e}")
-            return {"artist": None, "title": None, "album": None, "genre": None}
\ No newline at end of file
+            self.logger.error("Unexpected error parsing metadata for %s: %s", filename, e)
+            return self._empty_metadata()
+
+    def _analyze_waveform(self, file_path):
+        if not str(file_path).lower().endswith((".wav", ".wave")):
+            return None
+        # numpy is only needed for this opt-in stage, so it is imported on first use.
+        from util.waveform_stats import analyze_wav
+        try:
+            return analyze_wav(file_path)
+        except (ValueError, OSError) as e:
+            self.logger.warning("Waveform analysis skipped for %s: %s", os.path.basename(file_path), e)
+            return None
\ No newline at end of file
@@ -0,0 +1,228 @@
+# batch_upsert.py
+
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+from util.bulk_upload import RETRYABLE_STATUS, latency_summary
+from util.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def payload_from_metadata(file_path, metadata, fragment_type="SONG", uploaded=True):
+    """Upsert payload for a parsed file; the title falls back to the file name.
+
+    uploaded=True names the file in newlyUploaded, so it must already be uploaded; pass
+    False for a metadata-only fragment.
+    """
+    payload = {
+        "title": metadata.get("title") or Path(file_path).stem,
+        "artist": metadata.get("artist"),
+        "genre": metadata.get("genre"),
+        "type": fragment_type,
+        "newlyUploaded": [Path(file_path).name] if uploaded else None,
+    }
+    return {key: value for key, value in payload.items() if value is not None}
+
+
+class JsonLinesWriter:
+    """Append one JSON document per line; a crash loses at most the unflushed tail."""
+
+    def __init__(self, path, flush_every=100):
+        self.path = path
+        self.flush_every = flush_every
+        self._file = open(path, 'a', encoding='utf-8')
+        self._unflushed = 0
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._file.flush()
+                self._unflushed = 0
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UpsertStats:
+    def __init__(self):
+        self.ok = 0
+        self.failed = 0
+        self.retries = 0
+        self.latencies = []
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.retries += max(0, result['attempts'] - 1)
+            if result['error'] is None:
+                self.ok += 1
+                self.latencies.append(result['latency'])
+            else:
+                self.failed += 1
+
+    def summary(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            return {
+                'ok': self.ok,
+                'failed': self.failed,
+                'retries': self.retries,
+                'elapsed_seconds': elapsed,
+                'upserts_per_second': self.ok / elapsed,
+                'latency': latency_summary(self.latencies),
+            }
+
+
+class BatchUpserter:
+    """Upsert many SoundFragment payloads concurrently over one pooled keep-alive session.
+
+    At most workers requests are in flight and, with requests_per_second set, every attempt
+    (retries included) first takes a token from a shared TokenBucket. 408/429/5xx responses and
+    connection errors are retried with exponential backoff, honouring Retry-After. Results are
+    yielded in completion order as dicts with index, title, id, status, attempts, latency,
+    error and response; with results_path they are also appended there as JSON lines.
+    """
+
+    def __init__(self, api_host, api_token, workers=8, requests_per_second=None, max_retries=3,
+                 backoff_seconds=0.5, timeout=(10, 60), session=None, results_path=None):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.client = SoundFragmentClient(api_host, api_token, pool_size=workers, timeout=timeout, session=session)
+        self.session = self.client.session
+        self.rate_limiter = TokenBucket(requests_per_second, capacity=max(1, workers)) if requests_per_second else None
+        self.results_path = results_path
+        self.stats = UpsertStats()
+
+    def upsert_all(self, payloads):
+        writer = JsonLinesWriter(self.results_path) if self.results_path else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = set()
+                for index, payload in enumerate(payloads):
+                    pending.add(executor.submit(self.upsert_one, index, payload))
+                    if len(pending) >= self.workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from self._finish(done, writer)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._finish(done, writer)
+        finally:
+            if writer:
+                writer.close()
+
+    def _finish(self, done, writer):
+        for future in done:
+            result = future.result()
+            self.stats.record(result)
+            if writer:
+                writer.write(result)
+            yield result
+
+    def upsert_one(self, index, payload):
+        result = {'index': index, 'title': payload.get('title'), 'id': None, 'status': None, 'attempts': 0,
+                  'latency': None, 'error': None, 'response': None}
+        while True:
+            result['attempts'] += 1
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            retry_after = None
+            started = time.monotonic()
+            try:
+                response = self.client.upsert(payload, timeout=self.timeout)
+                result['status'] = response.status_code
+                if response.status_code in (200, 201):
+                    data = response.json()
+                    result.update(id=data.get('id'), response=data, latency=time.monotonic() - started, error=None)
+                    metrics.histogram("upsert_seconds").observe(result['latency'])
+                    return result
+                result['error'] = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRYABLE_STATUS:
+                    metrics.counter("upsert_errors").inc()
+                    return result
+                retry_after = response.headers.get('Retry-After')
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result['error'] = str(e)
+            except (requests.RequestException, ValueError) as e:
+                result['error'] = str(e)
+                metrics.counter("upsert_errors").inc()
+                return result
+
+            if result['attempts'] > self.max_retries:
+                metrics.counter("upsert_errors").inc()
+                return result
+            delay = self.backoff_seconds * 2 ** (result['attempts'] - 1)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            metrics.counter("upsert_retries").inc()
+            logger.warning("Upsert of %r failed (%s), retrying in %.1fs", result['title'], result['error'], delay)
+            time.sleep(delay)
+
+
+def read_json_lines(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    from util.audio_metadata_parser import AudioMetadataParser
+    from util.config import load_config
+
+    parser = argparse.ArgumentParser(description="Upsert SoundFragments in bulk.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--payloads', help="JSON-lines file, one upsert payload per line")
+    source.add_argument('--directory', help="parse audio files here and upsert one metadata-only fragment per "
+                                            "file (nothing is uploaded; use lv426 upload for that)")
+    parser.add_argument('--results', default='upsert_results.jsonl', help="JSON-lines results file")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rps', type=float, help="client-side requests-per-second limit")
+    parser.add_argument('--retries', type=int, default=3)
+    args = parser.parse_args()
+
+    config = load_config()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.payloads:
+        payloads = read_json_lines(args.payloads)
+    else:
+        metadata_parser = AudioMetadataParser(logging.getLogger("batch_upsert.parse"))
+        payloads = (payload_from_metadata(path, metadata, uploaded=False)
+                    for path, metadata in metadata_parser.parse_directory(args.directory))
+
+    upserter = BatchUpserter(config['API_HOST'], config['API_TOKEN'], workers=args.workers,
+                             requests_per_second=args.rps, max_retries=args.retries, results_path=args.results)
+    for result in upserter.upsert_all(payloads):
+        if result['error']:
+            logger.error("#%d %r: %s", result['index'], result['title'], result['error'])
+    summary = upserter.stats.summary()
+    logger.info("Upserted %d fragments (%d failed, %d retries) in %.1fs, %.1f/s; results in %s",
+                summary['ok'], summary['failed'], summary['retries'], summary['elapsed_seconds'],
+                summary['upserts_per_second'], args.results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# bulk_upload.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+from util.audio_metadata_parser import AUDIO_EXTENSIONS, iter_audio_files
+from util.dedupe_index import ContentHasher, HashingReader
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def latency_summary(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) if ordered else None,
+        'p50': percentile(ordered, 0.50),
+        'p95': percentile(ordered, 0.95),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1] if ordered else None,
+    }
+
+
+class UploadStats:
+    def __init__(self):
+        self.files_ok = 0
+        self.files_failed = 0
+        self.files_skipped = 0
+        self.bytes_sent = 0
+        self.bytes_skipped = 0
+        self.retries = 0
+        self.latencies = []
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            if result.get('skipped'):
+                self.files_skipped += 1
+                self.bytes_skipped += result['size']
+                return
+            self.retries += result['attempts'] - 1
+            if result['error'] is None:
+                self.files_ok += 1
+                self.bytes_sent += result['size']
+                self.latencies.append(result['latency'])
+            else:
+                self.files_failed += 1
+
+    def summary(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            latencies = sorted(self.latencies)
+            return {
+                'files_ok': self.files_ok,
+                'files_failed': self.files_failed,
+                'files_skipped': self.files_skipped,
+                'bytes_skipped': self.bytes_skipped,
+                'retries': self.retries,
+                'bytes_sent': self.bytes_sent,
+                'elapsed_seconds': elapsed,
+                'mb_per_second': self.bytes_sent / (1024 * 1024) / elapsed,
+                'files_per_second': self.files_ok / elapsed,
+                'latency_p50': percentile(latencies, 0.50),
+                'latency_p95': percentile(latencies, 0.95),
+                'latency_max': latencies[-1] if latencies else None,
+            }
+
+
+class BulkUploader:
+    """Upload many files through a bounded thread pool sharing one pooled keep-alive session.
+
+    Results are yielded in completion order as dicts with file_path, upload_id, size,
+    latency, attempts and error. A failing file is retried with exponential backoff on its
+    own worker thread, so the rest of the batch keeps moving.
+
+    Each body is SHA-256 hashed as it is read (content_hash). With a DedupeIndex, a file whose
+    stat key maps to already-uploaded content is skipped before any bytes are sent (skipped,
+    plus the index entry as known); dedupe_requires_fragment only skips content that reached
+    a fragment, and verify_remote HEADs the stored file first and re-uploads it if it is gone.
+    """
+
+    def __init__(self, api_host, api_token, entity_id="temp", workers=4, max_retries=3, backoff_seconds=1.0,
+                 timeout=(30, 600), session=None, dedupe_index=None, dedupe_requires_fragment=False,
+                 verify_remote=False):
+        self.entity_id = entity_id
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.client = SoundFragmentClient(api_host, api_token, pool_size=workers, timeout=timeout, session=session)
+        self.session = self.client.session
+        self.dedupe_index = dedupe_index
+        self.dedupe_requires_fragment = dedupe_requires_fragment
+        self.verify_remote = verify_remote
+        self.stats = UploadStats()
+
+    def upload_all(self, file_paths):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for file_path in file_paths:
+                pending.add(executor.submit(self.upload_one, file_path))
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._finish(done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._finish(done)
+
+    def upload_directory(self, root, extensions=AUDIO_EXTENSIONS):
+        return self.upload_all(iter_audio_files(root, extensions))
+
+    def _finish(self, done):
+        for future in done:
+            result = future.result()
+            self.stats.record(result)
+            yield result
+
+    def upload_one(self, file_path):
+        result = {'file_path': str(file_path), 'upload_id': None, 'size': 0, 'latency': None,
+                  'attempts': 0, 'error': None, 'content_hash': None, 'skipped': False, 'known': None}
+        try:
+            result['size'] = os.path.getsize(file_path)
+        except OSError as e:
+            result['error'] = str(e)
+            return result
+
+        known = self._known_content(file_path)
+        if known is not None:
+            result.update(upload_id=known['upload_id'], content_hash=known['hash'], skipped=True, known=known,
+                          latency=0.0)
+            metrics.counter("upload_skipped").inc()
+            return result
+
+        while True:
+            result['attempts'] += 1
+            started = time.monotonic()
+            # The hash is taken from the same read that builds the request body.
+            hasher = ContentHasher()
+            try:
+                with open(file_path, 'rb') as f:
+                    response = self.client.upload_file(HashingReader(f, hasher), Path(file_path).name,
+                                                       entity_id=self.entity_id, size=result['size'],
+                                                       timeout=self.timeout)
+                if response.status_code not in RETRYABLE_STATUS:
+                    response.raise_for_status()
+                    result['upload_id'] = response.json().get('id')
+                    result['latency'] = time.monotonic() - started
+                    result['error'] = None
+                    result['content_hash'] = hasher.hexdigest(result['size'])
+                    metrics.histogram("upload_seconds").observe(result['latency'])
+                    metrics.counter("upload_bytes").inc(result['size'])
+                    self._remember(file_path, result)
+                    return result
+                result['error'] = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                result['error'] = str(e)
+            except (requests.RequestException, ValueError) as e:
+                result['error'] = str(e)
+                metrics.counter("upload_errors").inc()
+                return result
+
+            if result['attempts'] > self.max_retries:
+                metrics.counter("upload_errors").inc()
+                return result
+            delay = self.backoff_seconds * 2 ** (result['attempts'] - 1)
+            metrics.counter("upload_retries").inc()
+            logger.warning("Upload of %s failed (%s), retrying in %.1fs", file_path, result['error'], delay)
+            time.sleep(delay)
+
+    def _known_content(self, file_path):
+        if self.dedupe_index is None:
+            return None
+        known = self.dedupe_index.lookup_path(file_path)
+        if known is None or (self.dedupe_requires_fragment and not known['file_id']):
+            return None
+        if self.verify_remote and known['fragment_id'] and known['file_id'] and not self._remote_has(known):
+            logger.info("%s is indexed but no longer on the server; uploading again", file_path)
+            self.dedupe_index.forget(known['hash'])
+            return None
+        return known
+
+    def _remote_has(self, known):
+        try:
+            response = self.client.head_file(known['fragment_id'], known['file_id'], timeout=self.timeout)
+        except requests.RequestException as e:
+            # Unreachable is not proof of absence; trust the index rather than re-upload.
+            logger.warning("Remote check for %s failed: %s", known['hash'][:12], e)
+            return True
+        if response.status_code == 404:
+            return False
+        remote_hash = response.headers.get('X-Content-SHA256')
+        return response.ok and (remote_hash is None or remote_hash == known['hash'])
+
+    def _remember(self, file_path, result):
+        if self.dedupe_index is None or result['content_hash'] is None:
+            return
+        self.dedupe_index.record_file(file_path, result['content_hash'])
+        self.dedupe_index.record_content(result['content_hash'], result['size'], name=Path(file_path).name,
+                                         upload_id=result['upload_id'])
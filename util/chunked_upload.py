@@ -0,0 +1,151 @@
+# chunked_upload.py
+
+import logging
+import os
+import re
+import time
+
+import requests
+
+from util import metrics
+from util.dedupe_index import ContentHasher
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+RESUME_INCOMPLETE = 308
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+_RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d+)")
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedUploadError(Exception):
+    pass
+
+
+class ChunkedUploader:
+    """Resumable upload that sends a file as a sequence of Content-Range PUTs.
+
+    Each request carries one chunk; the server answers 308 with a Range header naming the
+    bytes it has persisted, or 200/201 with the upload JSON once the last chunk lands. An
+    empty PUT with "Content-Range: bytes */<total>" asks for the current offset, which is
+    how an interrupted transfer resumes from the last acknowledged byte instead of zero.
+
+    The chunks are hashed as they are read; after upload() content_hash holds the file's
+    SHA-256, or None when the transfer started or resumed past bytes it never read.
+    Every PUT goes through client.put_chunk (a SoundFragmentClient).
+    """
+
+    def __init__(self, client, chunk_size=DEFAULT_CHUNK_SIZE, max_retries=5, backoff_seconds=1.0,
+                 timeout=(30, 120), progress_callback=None):
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+        self.content_hash = None
+
+    def upload(self, file_path, entity_id="temp", offset=0):
+        file_name = os.path.basename(file_path)
+        total = os.path.getsize(file_path)
+        retries = 0
+        hasher = ContentHasher()
+        self.content_hash = None
+
+        while True:
+            try:
+                with metrics.span("upload"):
+                    data = self._send_from(file_path, entity_id, file_name, offset, total, hasher)
+                self.content_hash = hasher.hexdigest(total)
+                metrics.counter("upload_bytes").inc(total)
+                return data
+            except TRANSIENT_ERRORS + (ChunkedUploadError,) as e:
+                retries += 1
+                if retries > self.max_retries:
+                    raise ChunkedUploadError(f"Giving up on {file_name} after {self.max_retries} retries: {e}")
+                time.sleep(self.backoff_seconds * 2 ** (retries - 1))
+                try:
+                    response = self._put(entity_id, file_name, b"", f"bytes */{total}")
+                except TRANSIENT_ERRORS + (ChunkedUploadError,):
+                    continue
+                if response.status_code != RESUME_INCOMPLETE:
+                    self._report(total, total)
+                    return self._finish(response)
+                offset = self._acknowledged_offset(response)
+                metrics.counter("upload_resumes").inc()
+                logger.warning("Resuming %s at byte %d after error: %s", file_name, offset, e)
+
+    def _send_from(self, file_path, entity_id, file_name, offset, total, hasher):
+        if total == 0:
+            return self._finish(self._put(entity_id, file_name, b"", "bytes */0"))
+
+        while True:
+            resend_from = None
+            for chunk in self._iter_chunks(file_path, offset):
+                end = offset + len(chunk) - 1
+                hasher.feed(offset, chunk)
+                response = self._put(entity_id, file_name, chunk, f"bytes {offset}-{end}/{total}")
+                if response.status_code != RESUME_INCOMPLETE:
+                    self._report(total, total)
+                    return self._finish(response)
+
+                acknowledged = self._acknowledged_offset(response)
+                self._report(acknowledged, total)
+                if acknowledged != end + 1:
+                    # The server kept less than we sent; restart the read from its offset.
+                    resend_from = acknowledged
+                    break
+                offset = acknowledged
+
+            if resend_from is None:
+                raise ChunkedUploadError("server did not confirm completion after the last chunk")
+            offset = resend_from
+
+    def next_chunk_size(self):
+        """Size of the next PUT; asked before every chunk, so an override can change it mid-file."""
+        return self.chunk_size
+
+    def _iter_chunks(self, file_path, offset):
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                chunk = f.read(self.next_chunk_size())
+                if not chunk:
+                    return
+                yield chunk
+
+    def query_offset(self, file_name, total, entity_id="temp"):
+        response = self._put(entity_id, file_name, b"", f"bytes */{total}")
+        if response.status_code == RESUME_INCOMPLETE:
+            return self._acknowledged_offset(response)
+        if response.status_code in (200, 201):
+            return total
+        raise ChunkedUploadError(f"Offset query failed with status {response.status_code}: {response.text[:200]}")
+
+    def _put(self, entity_id, file_name, body, content_range):
+        with metrics.span("upload_chunk"):
+            response = self.client.put_chunk(body, content_range, file_name, entity_id, timeout=self.timeout)
+        if response.status_code in RETRYABLE_STATUS:
+            raise ChunkedUploadError(f"HTTP {response.status_code}")
+        if response.status_code != RESUME_INCOMPLETE and response.status_code >= 400:
+            response.raise_for_status()
+        return response
+
+    @staticmethod
+    def _acknowledged_offset(response):
+        match = _RANGE_PATTERN.match(response.headers.get('Range', ''))
+        return int(match.group(2)) + 1 if match else 0
+
+    @staticmethod
+    def _finish(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    def _report(self, bytes_sent, total):
+        if self.progress_callback:
+            self.progress_callback(bytes_sent, total)
@@ -0,0 +1,20 @@
+# config.py
+
+import os
+
+_loaded = False
+
+
+def load_config(env_file=None):
+    """os.environ after .env (or env_file) has been read into it; only the first call reads a file.
+
+    python-dotenv is imported here rather than by every script, and exported variables win
+    over .env as with load_dotenv(). The lv426 CLI loads it once and the script main() it
+    dispatches to gets the same environment back.
+    """
+    global _loaded
+    if not _loaded:
+        from dotenv import load_dotenv
+        load_dotenv(env_file)
+        _loaded = True
+    return os.environ
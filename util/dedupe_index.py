@@ -0,0 +1,134 @@
+# dedupe_index.py
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+HASH_ALGORITHM = "sha256"
+
+
+class ContentHasher:
+    """Hash a file from the byte ranges an upload reads anyway.
+
+    feed(offset, data) accepts chunks in upload order; bytes already hashed are skipped, so
+    a resumed upload that re-sends a range does not corrupt the digest. hexdigest() is None
+    unless every byte from 0 to total was seen exactly once in order.
+    """
+
+    def __init__(self, algorithm=HASH_ALGORITHM):
+        self._hash = hashlib.new(algorithm)
+        self.hashed = 0
+
+    def feed(self, offset, data):
+        end = offset + len(data)
+        if offset <= self.hashed < end:
+            self._hash.update(memoryview(data)[self.hashed - offset:])
+            self.hashed = end
+
+    def hexdigest(self, total):
+        return self._hash.hexdigest() if self.hashed == total else None
+
+
+class HashingReader:
+    """File wrapper that hashes whatever is read through it, for multipart bodies."""
+
+    def __init__(self, fileobj, hasher):
+        self._file = fileobj
+        self._hasher = hasher
+        self._offset = 0
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._hasher.feed(self._offset, data)
+        self._offset += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class DedupeIndex:
+    """Local SQLite index of uploaded content: hash -> upload/fragment/file IDs.
+
+    A second table maps path + (size, mtime_ns) to the hash seen at upload, so an unchanged
+    file is recognised from one stat() without reading a byte of it.
+    """
+
+    def __init__(self, db_path="dedupe_index.sqlite3"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            "hash TEXT PRIMARY KEY, size INTEGER NOT NULL, name TEXT, upload_id TEXT, "
+            "fragment_id TEXT, file_id TEXT, recorded_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def known_hash(self, file_path):
+        """Hash recorded for file_path if the file is unchanged since, else None."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, hash FROM files WHERE path = ?",
+                                     (os.path.abspath(file_path),)).fetchone()
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+            return None
+        return row[2]
+
+    def lookup(self, content_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash, size, name, upload_id, fragment_id, file_id FROM content WHERE hash = ?",
+                (content_hash,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('hash', 'size', 'name', 'upload_id', 'fragment_id', 'file_id'), row))
+
+    def lookup_path(self, file_path):
+        content_hash = self.known_hash(file_path)
+        return self.lookup(content_hash) if content_hash else None
+
+    def record_file(self, file_path, content_hash):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                               (os.path.abspath(file_path), st.st_size, st.st_mtime_ns, content_hash))
+
+    def record_content(self, content_hash, size, name=None, upload_id=None, fragment_id=None, file_id=None):
+        """Insert or update an entry; fields passed as None keep their stored value."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO content (hash, size, name, upload_id, fragment_id, file_id, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(hash) DO UPDATE SET "
+                "name = COALESCE(excluded.name, name), upload_id = COALESCE(excluded.upload_id, upload_id), "
+                "fragment_id = COALESCE(excluded.fragment_id, fragment_id), "
+                "file_id = COALESCE(excluded.file_id, file_id), recorded_at = excluded.recorded_at",
+                (content_hash, size, name, upload_id, fragment_id, file_id, time.time()))
+
+    def forget(self, content_hash):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM content WHERE hash = ?", (content_hash,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,205 @@
+# genre_catalog.py
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+
+DEFAULT_GENRES_PATH = "genres.json"
+DEFAULT_TTL_SECONDS = 3600
+# After a failed refresh, wait this long before trying the API again.
+RETRY_AFTER_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def extract_genre_names(payload):
+    """Genre names from an /api/genres payload: a list of {"name": ...} objects or of strings."""
+    if not isinstance(payload, list):
+        return []
+    names = []
+    for genre in payload:
+        if isinstance(genre, dict):
+            genre = genre.get('name')
+        if isinstance(genre, str) and genre:
+            names.append(genre)
+    return sorted(set(names))
+
+
+def atomic_write_json(path, data):
+    """Write data to path via a temporary file in the same directory and os.replace, so readers
+    never see a half-written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class GenreCatalog:
+    """The /api/genres list, cached in genres.json and indexed for casefolded lookups.
+
+    The file is read once; the API is asked again only after ttl_seconds, with If-None-Match /
+    If-Modified-Since so an unchanged list costs a 304. Validators and the fetch time live in
+    a sidecar <path>.meta. genres.json itself stays a plain sorted list of names and is only
+    rewritten, atomically, when the list actually changes. Without api_host the catalog is
+    file-only.
+    """
+
+    def __init__(self, path=DEFAULT_GENRES_PATH, api_host=None, api_token=None, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 session=None, request_timeout=10):
+        self.path = path
+        self.meta_path = f"{path}.meta"
+        self.api_host = api_host
+        self.url = f"{api_host.rstrip('/')}/api/genres" if api_host else None
+        self.api_token = api_token
+        self.ttl_seconds = ttl_seconds
+        self.request_timeout = request_timeout
+        self._session = session
+        self._client = None
+        self._names = None
+        self._index = {}
+        self._meta = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = SoundFragmentClient(self.api_host, self.api_token, pool_size=1,
+                                               timeout=self.request_timeout, session=self._session)
+        return self._client
+
+    @property
+    def session(self):
+        return self.client.session
+
+    def names(self):
+        self._ensure_fresh()
+        return list(self._names)
+
+    def lookup(self, name):
+        """Canonical genre name for name (case-insensitive), or None when it is not in the catalog."""
+        if time.monotonic() >= self._expires_at:
+            self._ensure_fresh()
+        return self._index.get(name.casefold()) if name else None
+
+    def __contains__(self, name):
+        return self.lookup(name) is not None
+
+    def __len__(self):
+        self._ensure_fresh()
+        return len(self._names)
+
+    def _ensure_fresh(self):
+        if self._names is not None and time.monotonic() < self._expires_at:
+            return
+        with self._lock:
+            if self._names is None:
+                self._load()
+            if time.monotonic() >= self._expires_at:
+                self._refresh_locked()
+
+    def refresh(self, force=False):
+        """Ask the API for the list now (conditionally, unless force). Returns True when it changed.
+
+        False means the server answered 304 or sent the same list. A failed fetch raises
+        requests.RequestException or ValueError (a body that is not JSON) instead.
+        """
+        with self._lock:
+            if self._names is None:
+                self._load()
+            return self._refresh_locked(force, raise_errors=True)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                names = extract_genre_names(json.load(f))
+        except (OSError, ValueError):
+            names = []
+        try:
+            with open(self.meta_path) as f:
+                self._meta = json.load(f)
+        except (OSError, ValueError):
+            self._meta = {}
+        self._set_names(names)
+
+        # Carry the on-disk age over so a fresh file is not re-fetched by every new process.
+        age = time.time() - self._meta.get('fetchedAt', 0)
+        remaining = self.ttl_seconds - age if names else 0
+        self._expires_at = time.monotonic() + remaining if self.url else float('inf')
+
+    def _set_names(self, names):
+        self._index = {name.casefold(): name for name in names}
+        self._names = names
+
+    def _refresh_locked(self, force=False, raise_errors=False):
+        if not self.url:
+            self._expires_at = float('inf')
+            return False
+
+        validators = {}
+        if not force and self._names:
+            validators = {'etag': self._meta.get('etag'), 'last_modified': self._meta.get('lastModified')}
+
+        try:
+            with metrics.span("genre_fetch"):
+                response = self.client.get_genres(**validators)
+            if response.status_code == 304:
+                metrics.counter("genre_not_modified").inc()
+                logger.debug("Genres at %s unchanged (304)", self.url)
+                changed = False
+            else:
+                response.raise_for_status()
+                names = extract_genre_names(response.json())
+                if not names:
+                    logger.warning("No genre names found or API returned an unexpected format.")
+                changed = names != self._names
+                if changed:
+                    atomic_write_json(self.path, names)
+                    self._set_names(names)
+                    logger.info("Saved %d genres to %s", len(names), self.path)
+                self._meta = {'etag': response.headers.get('ETag'),
+                              'lastModified': response.headers.get('Last-Modified')}
+        except (requests.RequestException, ValueError) as e:
+            self._expires_at = time.monotonic() + min(self.ttl_seconds, RETRY_AFTER_SECONDS)
+            if raise_errors:
+                raise
+            # Lookups keep serving the names they have and try again after the retry delay.
+            logger.error("Genre refresh from %s failed: %s", self.url, e)
+            return False
+
+        self._meta['fetchedAt'] = time.time()
+        atomic_write_json(self.meta_path, self._meta)
+        self._expires_at = time.monotonic() + self.ttl_seconds
+        return changed
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_genre_catalog(path=DEFAULT_GENRES_PATH, **kwargs):
+    """Process-wide GenreCatalog for path; later calls return the same instance and ignore kwargs."""
+    key = os.path.abspath(path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = GenreCatalog(path, **kwargs)
+        return catalog
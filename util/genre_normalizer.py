@@ -0,0 +1,151 @@
+# genre_normalizer.py
+
+import re
+
+from mutagen.id3 import TCON
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# "(7)", "7", "(17)Rock", "(RX)": ID3v1 numeric codes and the v2.3 refinement forms.
+ID3V1_GENRE = re.compile(r"^\s*(?:\(\s*(?:\d{1,3}|RX|CR)\s*\)|\d{1,3}\s*$)")
+MULTI_GENRE_SEPARATORS = re.compile(r"\s*[;/,|\x00]\s*")
+ID3V1_CODES = 256
+
+
+def genre_key(text):
+    """Casefolded, punctuation- and space-free key: "Hip-Hop", "hip hop" and "HIPHOP" share one."""
+    return NON_ALNUM.sub("", text.casefold().replace("&", "and"))
+
+
+def genre_tokens(text):
+    return [token for token in NON_ALNUM.split(text.casefold()) if token]
+
+
+def trigrams(text):
+    padded = f"  {NON_ALNUM.sub(' ', text.casefold()).strip()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class GenreNormalizer:
+    """Map raw tag genres onto a canonical genre list through precomputed indexes.
+
+    normalize() answers repeated values from a memo dict, so a genre seen before costs one
+    dict lookup. A new value is tried, in order, as an exact/casefolded name, as a
+    punctuation-stripped key, as an ID3v1 code (via mutagen's TCON table), each part of a
+    multi-genre value ("Rock; Pop"), as whole words ("Classic Rock" contains the name
+    "Rock"), and finally through a trigram index: only canonical names sharing a trigram are
+    scored, and the best Dice similarity wins if it is >= min_similarity and at least
+    min_margin above the runner-up. Unmatched values map to None.
+    """
+
+    def __init__(self, canonical_names, min_similarity=0.7, min_margin=0.05, memo_size=65536):
+        self.names = sorted(set(name for name in canonical_names if name))
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.memo_size = memo_size
+        self._by_casefold = {}
+        self._by_key = {}
+        self._tokens = []
+        self._token_index = {}
+        self._trigrams = []
+        self._trigram_index = {}
+        for position, name in enumerate(self.names):
+            self._by_casefold.setdefault(name.casefold(), name)
+            self._by_key.setdefault(genre_key(name), name)
+            tokens = frozenset(genre_tokens(name))
+            self._tokens.append(tokens)
+            for token in tokens:
+                self._token_index.setdefault(token, []).append(position)
+            grams = trigrams(name)
+            self._trigrams.append(grams)
+            for gram in grams:
+                self._trigram_index.setdefault(gram, []).append(position)
+
+        # ID3v1 codes go into the key index ("(7)" keys to "7"), so they land on whatever
+        # spelling of Hip-Hop the server uses, or on a word of it (code 1, Classic Rock, on Rock).
+        for code in range(ID3V1_CODES):
+            translated = TCON(encoding=3, text=[str(code)]).genres
+            name = (self._by_key.get(genre_key(translated[0])) or self.token_match(translated[0])
+                    if translated else None)
+            if name:
+                self._by_key.setdefault(str(code), name)
+
+        self._memo = {name: name for name in self.names}
+
+    @classmethod
+    def from_catalog(cls, catalog, **kwargs):
+        return cls(catalog.names(), **kwargs)
+
+    @classmethod
+    def from_file(cls, path="genres.json", **kwargs):
+        from util.genre_catalog import GenreCatalog
+        return cls.from_catalog(GenreCatalog(path), **kwargs)
+
+    def normalize(self, raw):
+        """Canonical name for raw, or None."""
+        try:
+            return self._memo[raw]
+        except KeyError:
+            pass
+        except TypeError:
+            return None
+        result = self._resolve(raw) if raw else None
+        if len(self._memo) >= self.memo_size:
+            self._memo = {name: name for name in self.names}
+        self._memo[raw] = result
+        return result
+
+    def _resolve(self, raw):
+        text = raw.strip()
+        name = self._by_casefold.get(text.casefold()) or self._by_key.get(genre_key(text))
+        if name:
+            return name
+
+        if ID3V1_GENRE.match(text):
+            for translated in TCON(encoding=3, text=[text]).genres:
+                name = self._by_key.get(genre_key(translated)) or self.token_match(translated)
+                if name:
+                    return name
+
+        parts = [part for part in MULTI_GENRE_SEPARATORS.split(text) if part]
+        if len(parts) > 1:
+            for part in parts:
+                name = self._by_casefold.get(part.casefold()) or self._by_key.get(genre_key(part))
+                if name:
+                    return name
+
+        return self.token_match(text) or self.fuzzy_match(text)
+
+    def token_match(self, text):
+        """Canonical name whose words all occur as whole words in text.
+
+        The name with the most words wins, then the one whose last word comes latest, since the
+        head noun ends an English genre: "Classic Rock" is Rock and "Pop Rock" is Rock too.
+        """
+        words = genre_tokens(text)
+        present = set(words)
+        best, best_rank = None, None
+        for position in {position for word in present for position in self._token_index.get(word, ())}:
+            tokens = self._tokens[position]
+            if tokens <= present:
+                rank = (len(tokens), max(index for index, word in enumerate(words) if word in tokens))
+                if best_rank is None or rank > best_rank:
+                    best, best_rank = self.names[position], rank
+        return best
+
+    def fuzzy_match(self, text):
+        grams = trigrams(text)
+        shared = {}
+        for gram in grams:
+            for position in self._trigram_index.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        best, best_score, runner_up = None, 0.0, 0.0
+        for position, count in shared.items():
+            score = 2 * count / (len(grams) + len(self._trigrams[position]))
+            if score > best_score:
+                best, best_score, runner_up = self.names[position], score, best_score
+            elif score > runner_up:
+                runner_up = score
+        if best_score < self.min_similarity or best_score - runner_up < self.min_margin:
+            return None
+        return best
@@ -0,0 +1,271 @@
+# library_sync.py
+
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import select
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from util.audio_metadata_parser import AUDIO_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+
+def scan_library(root, extensions=AUDIO_EXTENSIONS):
+    """{absolute path: (size, mtime_ns)} for every audio file under root, via an os.scandir walk."""
+    found = {}
+    pending = [os.path.abspath(root)]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file() and entry.name.lower().endswith(extensions):
+                            st = entry.stat()
+                            found[entry.path] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning("Cannot scan %s: %s", directory, e)
+    return found
+
+
+def diff_library(current, previous):
+    """Compare two {path: (size, mtime_ns)} maps; returns sorted added, changed and removed paths."""
+    added = sorted(path for path in current if path not in previous)
+    changed = sorted(path for path, key in current.items() if path in previous and previous[path] != key)
+    removed = sorted(path for path in previous if path not in current)
+    return {'added': added, 'changed': changed, 'removed': removed}
+
+
+def rescan_paths(paths, snapshot, extensions=AUDIO_EXTENSIONS):
+    """Current and snapshot stat maps restricted to paths (files, or directories taken whole),
+    ready for diff_library; used after a watcher reports what changed."""
+    current, previous = {}, {}
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path) or not path.lower().endswith(extensions):
+            current.update(scan_library(path, extensions) if os.path.isdir(path) else {})
+            previous.update(snapshot.stat_map(root=path))
+            continue
+        try:
+            st = os.stat(path)
+            current[path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+        known = snapshot.get(path)
+        if known:
+            previous[path] = (known['size'], known['mtime_ns'])
+    return current, previous
+
+
+class LibrarySnapshot:
+    """SQLite record of what the last sync saw and ingested: path, size, mtime, hash and remote IDs."""
+
+    def __init__(self, db_path="library_snapshot.sqlite3"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshot ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT, "
+            "fragment_id TEXT, file_id TEXT, synced_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stat_map(self, root=None):
+        query, params = "SELECT path, size, mtime_ns FROM snapshot", ()
+        if root is not None:
+            prefix = os.path.join(os.path.abspath(root), '')
+            query, params = query + " WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+        with self._lock:
+            return {path: (size, mtime_ns) for path, size, mtime_ns in self._conn.execute(query, params)}
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, size, mtime_ns, hash, fragment_id, file_id FROM snapshot WHERE path = ?",
+                (path,)).fetchone()
+        return dict(zip(('path', 'size', 'mtime_ns', 'hash', 'fragment_id', 'file_id'), row)) if row else None
+
+    def record(self, path, size, mtime_ns, content_hash=None, fragment_id=None, file_id=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshot (path, size, mtime_ns, hash, fragment_id, file_id, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, content_hash, fragment_id, file_id, time.time()))
+
+    def remove(self, path):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM snapshot WHERE path = ?", (path,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SyncJournal:
+    """Append-only JSON-lines log of one sync run, fsynced per record.
+
+    begin() writes the plan, done()/failed() one line per file, end() marks completion and
+    clears the file. If a run dies in between, pending() returns the planned entries that
+    never got a done line, so the next run picks them up first. A torn last line is ignored.
+    """
+
+    def __init__(self, path="library_sync.journal"):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _read(self):
+        records = []
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return records
+
+    def pending(self):
+        plan, finished = {}, set()
+        for record in self._read():
+            if record['type'] == 'begin':
+                plan = {entry['path']: entry for entry in record['plan']}
+                finished = set()
+            elif record['type'] == 'done':
+                finished.add(record['path'])
+            elif record['type'] == 'end':
+                plan = {}
+        return [entry for path, entry in plan.items() if path not in finished]
+
+    def _append(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def begin(self, plan):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._append({'type': 'begin', 'at': time.time(), 'plan': plan})
+
+    def done(self, path, **info):
+        self._append(dict(info, type='done', path=path))
+
+    def failed(self, path, error):
+        self._append({'type': 'failed', 'path': path, 'error': error})
+
+    def end(self):
+        self._append({'type': 'end', 'at': time.time()})
+        self._file.close()
+        self._file = None
+        # The snapshot now holds everything the journal could tell a later run.
+        tmp_path = f"{self.path}.tmp"
+        open(tmp_path, 'w').close()
+        os.replace(tmp_path, self.path)
+
+
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Recursive inotify watch on Linux (through libc, no extra dependency).
+
+    changed_paths() blocks until something under root changes, then keeps collecting until
+    the tree has been quiet for settle_seconds and returns the set of touched paths.
+    available() is False on other platforms, where callers fall back to periodic scans.
+    """
+
+    def __init__(self, root, settle_seconds=2.0):
+        self.root = os.path.abspath(root)
+        self.settle_seconds = settle_seconds
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories = {}
+        self._watch_tree(self.root)
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and ctypes.util.find_library('c') is not None
+
+    def _watch_tree(self, top):
+        pending = [top]
+        while pending:
+            directory = pending.pop()
+            descriptor = self._add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if descriptor < 0:
+                logger.warning("Cannot watch %s: %s", directory, os.strerror(ctypes.get_errno()))
+                continue
+            self._directories[descriptor] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+    def changed_paths(self, timeout=None):
+        changed = set()
+        wait = timeout
+        while True:
+            ready, _, _ = select.select([self._fd], [], [], wait)
+            if not ready:
+                return changed
+            self._read_events(os.read(self._fd, 64 * 1024), changed)
+            wait = self.settle_seconds
+
+    def _read_events(self, buffer, changed):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            descriptor, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            raw_name = buffer[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += _EVENT_HEADER.size + length
+            directory = self._directories.get(descriptor)
+            if directory is None:
+                continue
+            if mask & _IN_DELETE_SELF:
+                self._directories.pop(descriptor, None)
+                changed.add(directory)
+                continue
+            path = os.path.join(directory, os.fsdecode(raw_name))
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    # A new or moved-in directory may already hold files; watch it and report it whole.
+                    self._watch_tree(path)
+                changed.add(path)
+            elif not mask & _IN_CREATE:
+                # Creation is reported again as IN_CLOSE_WRITE once the file is complete.
+                changed.add(path)
+
+    def close(self):
+        os.close(self._fd)
@@ -0,0 +1,202 @@
+# load_generator.py
+
+import itertools
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+from util.bulk_upload import latency_summary
+from util.progress_watcher import TERMINAL_STATUSES, ProgressWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class LoadStats:
+    """Per-cycle results of a load run, plus a timeline bucketed by completion time."""
+
+    def __init__(self, bucket_seconds=1.0):
+        self.bucket_seconds = bucket_seconds
+        self.started_at = time.monotonic()
+        self.results = []
+        self.active_users = 0
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def user_started(self):
+        with self._lock:
+            self.active_users += 1
+            bucket = self._bucket(time.monotonic())
+            bucket['activeUsers'] = max(bucket['activeUsers'], self.active_users)
+
+    def user_finished(self):
+        with self._lock:
+            self.active_users -= 1
+
+    def _bucket(self, now):
+        index = int((now - self.started_at) // self.bucket_seconds)
+        bucket = self.buckets.get(index)
+        if bucket is None:
+            bucket = self.buckets[index] = {'cycles': 0, 'errors': 0, 'bytes': 0, 'activeUsers': self.active_users}
+        return bucket
+
+    def record(self, result):
+        with self._lock:
+            self.results.append(result)
+            bucket = self._bucket(time.monotonic())
+            bucket['cycles'] += 1
+            if result['error']:
+                bucket['errors'] += 1
+            else:
+                bucket['bytes'] += result['size']
+
+    def summary(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            ok = [r for r in self.results if not r['error']]
+            errors = {}
+            for result in self.results:
+                if result['error']:
+                    errors[result['error']] = errors.get(result['error'], 0) + 1
+            bytes_sent = sum(r['size'] for r in ok)
+            timeline = []
+            active = 0
+            for index in range(max(self.buckets, default=-1) + 1):
+                # A second with no completions still had the users of the one before it.
+                bucket = self.buckets.get(index, {'cycles': 0, 'errors': 0, 'bytes': 0, 'activeUsers': active})
+                active = bucket['activeUsers']
+                timeline.append({
+                    'second': index * self.bucket_seconds,
+                    'activeUsers': bucket['activeUsers'],
+                    'cycles': bucket['cycles'],
+                    'errors': bucket['errors'],
+                    'mb_per_second': bucket['bytes'] / (1024 * 1024) / self.bucket_seconds,
+                })
+            return {
+                'cycles': len(self.results),
+                'cycles_ok': len(ok),
+                'errors': len(self.results) - len(ok),
+                'error_rate': (len(self.results) - len(ok)) / len(self.results) if self.results else 0.0,
+                'error_kinds': errors,
+                'bytes_sent': bytes_sent,
+                'elapsed_seconds': elapsed,
+                'mb_per_second': bytes_sent / (1024 * 1024) / elapsed,
+                'cycles_per_second': len(ok) / elapsed,
+                'upload_latency': latency_summary([r['upload_latency'] for r in ok]),
+                'processing_latency': latency_summary([r['processing_latency'] for r in ok]),
+                'cycle_latency': latency_summary([r['latency'] for r in ok]),
+                'timeline': timeline,
+            }
+
+
+class LoadGenerator:
+    """Drive users virtual clients against /api/soundfragments/files/{entity_id}.
+
+    Each virtual user repeats the full client cycle: upload a file, then follow its
+    upload-progress until the server reports a terminal status. Users start evenly spread
+    over ramp_up_seconds and each runs iterations cycles, or keeps going until
+    duration_seconds has passed since the run started. Files are handed out round-robin
+    across all users. run() returns LoadStats.summary().
+    """
+
+    def __init__(self, base_url, file_paths, users=10, ramp_up_seconds=0.0, iterations=1, duration_seconds=None,
+                 entity_id="temp", api_token=None, session=None, progress_mode="auto", think_seconds=0.0,
+                 upload_timeout=(30, 600), progress_timeout_seconds=600, bucket_seconds=1.0, on_result=None):
+        if not file_paths:
+            raise ValueError("LoadGenerator needs at least one file")
+        self.base_url = base_url.rstrip('/')
+        self.entity_id = entity_id
+        self.file_paths = [Path(p) for p in file_paths]
+        self.file_sizes = {path: os.path.getsize(path) for path in self.file_paths}
+        self.users = users
+        self.ramp_up_seconds = ramp_up_seconds
+        self.iterations = iterations
+        self.duration_seconds = duration_seconds
+        self.progress_mode = progress_mode
+        self.think_seconds = think_seconds
+        self.upload_timeout = upload_timeout
+        self.progress_timeout_seconds = progress_timeout_seconds
+        self.bucket_seconds = bucket_seconds
+        self.on_result = on_result
+        # Every virtual user may hold an upload or a progress stream open at the same time.
+        self.client = SoundFragmentClient(self.base_url, api_token, pool_size=users, session=session)
+        self.session = self.client.session
+        self.stats = None
+        self._next_file = itertools.cycle(self.file_paths)
+        self._file_lock = threading.Lock()
+
+    def run(self):
+        self.stats = LoadStats(self.bucket_seconds)
+        deadline = self.stats.started_at + self.duration_seconds if self.duration_seconds else None
+        spacing = self.ramp_up_seconds / self.users if self.users > 1 else 0.0
+        threads = []
+        for user in range(self.users):
+            thread = threading.Thread(target=self._virtual_user,
+                                      args=(user, self.stats.started_at + user * spacing, deadline),
+                                      name=f"vu-{user}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return self.stats.summary()
+
+    def _pick_file(self):
+        with self._file_lock:
+            return next(self._next_file)
+
+    def _virtual_user(self, user, start_at, deadline):
+        time.sleep(max(0.0, start_at - time.monotonic()))
+        self.stats.user_started()
+        try:
+            for iteration in itertools.count():
+                if deadline is None and iteration >= self.iterations:
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                result = self._cycle(user, self._pick_file())
+                self.stats.record(result)
+                if self.on_result:
+                    self.on_result(result)
+                if self.think_seconds:
+                    time.sleep(self.think_seconds)
+        finally:
+            self.stats.user_finished()
+
+    def _cycle(self, user, file_path):
+        result = {'user': user, 'file_path': str(file_path), 'size': self.file_sizes[file_path],
+                  'upload_id': None, 'upload_latency': None, 'processing_latency': None, 'latency': None,
+                  'error': None}
+        started = time.monotonic()
+        try:
+            with open(file_path, 'rb') as f:
+                response = self.client.upload_file(f, file_path.name, entity_id=self.entity_id,
+                                                   size=self.file_sizes[file_path], timeout=self.upload_timeout)
+            if response.status_code != 200:
+                result['error'] = f"upload HTTP {response.status_code}"
+                return result
+            result['upload_id'] = response.json().get('id')
+        except (requests.RequestException, ValueError) as e:
+            result['error'] = f"upload {type(e).__name__}"
+            logger.debug("VU %d: upload of %s failed: %s", user, file_path, e)
+            return result
+        uploaded = time.monotonic()
+        result['upload_latency'] = uploaded - started
+        metrics.histogram("upload_seconds").observe(result['upload_latency'])
+
+        watcher = ProgressWatcher(self.session, self.base_url, mode=self.progress_mode,
+                                  timeout_seconds=self.progress_timeout_seconds)
+        data = watcher.watch(result['upload_id'])
+        status = data.get('status')
+        if status not in TERMINAL_STATUSES:
+            result['error'] = f"progress {status}"
+        elif status == 'error':
+            result['error'] = "processing error"
+        finished = time.monotonic()
+        result['processing_latency'] = finished - uploaded
+        result['latency'] = finished - started
+        return result
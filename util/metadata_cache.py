@@ -0,0 +1,118 @@
+# metadata_cache.py
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class MetadataCache:
+    """SQLite-backed parse cache with an in-memory LRU front.
+
+    Entries are keyed by path and are only valid while (size, mtime_ns, version)
+    still match, so an unchanged file costs one stat() instead of a tag read.
+    """
+
+    def __init__(self, db_path="metadata_cache.sqlite3", max_memory_entries=10000, commit_interval=256):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._uncommitted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "version TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def stat_key(file_path, version):
+        st = os.stat(file_path)
+        return st.st_size, st.st_mtime_ns, version
+
+    def get(self, file_path, version):
+        try:
+            key = self.stat_key(file_path, version)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._memory.get(file_path)
+            if entry is not None and entry[0] == key:
+                self._memory.move_to_end(file_path)
+                self.hits += 1
+                self.memory_hits += 1
+                return dict(entry[1])
+
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, version, data FROM metadata WHERE path = ?", (file_path,)
+            ).fetchone()
+            if row is None or tuple(row[:3]) != key:
+                self.misses += 1
+                return None
+
+            metadata = json.loads(row[3])
+            self._remember(file_path, key, metadata)
+            self.hits += 1
+            return dict(metadata)
+
+    def put(self, file_path, metadata, version):
+        try:
+            key = self.stat_key(file_path, version)
+        except OSError:
+            return
+
+        with self._lock:
+            self._remember(file_path, key, dict(metadata))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime_ns, version, data) VALUES (?, ?, ?, ?, ?)",
+                (file_path, key[0], key[1], key[2], json.dumps(metadata)),
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_interval:
+                self._conn.commit()
+                self._uncommitted = 0
+
+    def _remember(self, file_path, key, metadata):
+        self._memory[file_path] = (key, metadata)
+        self._memory.move_to_end(file_path)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,517 @@
+# metadata_catalog.py
+
+import argparse
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+from array import array
+
+from util.tag_readers import TECHNICAL_FIELDS
+
+CATALOG_VERSION = "1"
+# Fields with few distinct values: stored once in the string pool, one id per row.
+INTERNED_FIELDS = ("artist", "album", "genre", "rawGenre")
+# Fields that are mostly unique per track: UTF-8 bytes in one buffer.
+TEXT_FIELDS = ("title",)
+INDEXED_FIELDS = ("artist", "album", "genre")
+NONE_LENGTH = 0xFFFFFFFF
+IMPORT_BATCH_SIZE = 50000
+
+logger = logging.getLogger(__name__)
+
+
+class StringPool:
+    """Every distinct string once; columns hold its id, 0 standing for None."""
+
+    def __init__(self):
+        self.values = [None]
+        self._ids = {None: 0}
+
+    def intern(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return string_id
+
+    def id_of(self, value):
+        return self._ids.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+class _TextColumn:
+    """Strings as UTF-8 in one bytearray with start/length arrays; a rewrite appends and repoints."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.starts = array('Q')
+        self.lengths = array('I')
+
+    def _store(self, encoded):
+        if encoded is None:
+            return len(self.data), NONE_LENGTH
+        start = len(self.data)
+        self.data += encoded
+        return start, len(encoded)
+
+    def _encode(self, value):
+        return self._store(None if value is None else value.encode('utf-8', 'surrogateescape'))
+
+    def append(self, value):
+        start, length = self._encode(value)
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def append_raw(self, encoded):
+        start, length = self._store(encoded)
+        self.starts.append(start)
+        self.lengths.append(length)
+
+    def set(self, row, value):
+        if self.get(row) != value:
+            self.starts[row], self.lengths[row] = self._encode(value)
+
+    def raw(self, row):
+        length = self.lengths[row]
+        if length == NONE_LENGTH:
+            return None
+        start = self.starts[row]
+        return self.data[start:start + length]
+
+    def iter_raw(self):
+        data = self.data
+        for start, length in zip(self.starts, self.lengths):
+            yield None if length == NONE_LENGTH else data[start:start + length]
+
+    def get(self, row):
+        raw = self.raw(row)
+        return None if raw is None else raw.decode('utf-8', 'surrogateescape')
+
+    def nbytes(self):
+        return len(self.data) + self.starts.itemsize * len(self.starts) + self.lengths.itemsize * len(self.lengths)
+
+
+class _HashIndex:
+    """Open-addressing table of (hash, row) pairs in two arrays, kept at most half full.
+
+    Hashes can collide, so lookup() takes a predicate that confirms the row really matches.
+    """
+
+    def __init__(self, capacity=1024):
+        self._allocate(capacity)
+
+    @classmethod
+    def sized_for(cls, count):
+        """Table that holds count entries without growing."""
+        capacity = 1024
+        while capacity < count * 2:
+            capacity *= 2
+        return cls(capacity)
+
+    def _allocate(self, capacity):
+        # The low 32 bits of the hash are enough to skip almost every non-matching slot.
+        self._hashes = array('I', [0]) * capacity
+        self._rows = array('i', [-1]) * capacity
+        self._mask = capacity - 1
+        self._used = 0
+
+    def lookup(self, key_hash, is_match):
+        hashes, rows, mask = self._hashes, self._rows, self._mask
+        slot = key_hash & mask
+        short_hash = key_hash & 0xFFFFFFFF
+        while True:
+            row = rows[slot]
+            if row < 0:
+                return -1
+            if hashes[slot] == short_hash and is_match(row):
+                return row
+            slot = (slot + 1) & mask
+
+    def add(self, key_hash, row):
+        if (self._used + 1) * 2 > len(self._rows):
+            self._grow()
+        hashes, rows, mask = self._hashes, self._rows, self._mask
+        slot = key_hash & mask
+        while rows[slot] >= 0:
+            slot = (slot + 1) & mask
+        hashes[slot] = key_hash & 0xFFFFFFFF
+        rows[slot] = row
+        self._used += 1
+
+    def _grow(self):
+        entries = [(h, row) for h, row in zip(self._hashes, self._rows) if row >= 0]
+        self._allocate(len(self._rows) * 2)
+        for key_hash, row in entries:
+            self.add(key_hash, row)
+
+    def nbytes(self):
+        return self._hashes.itemsize * len(self._hashes) + self._rows.itemsize * len(self._rows)
+
+
+def _split_path(path):
+    # Exact split at the last separator, so directory + name gives the path back byte for byte.
+    cut = max(path.rfind('/'), path.rfind(os.sep)) + 1
+    return path[:cut], path[cut:]
+
+
+class MetadataCatalog:
+    """Parsed metadata for a whole library, stored by column instead of one dict per file.
+
+    Paths are kept as an interned directory id plus the file name in a shared UTF-8 buffer,
+    titles in another buffer, artist/album/genre/rawGenre as string-pool ids in arrays and,
+    with technical=True, durationSeconds/bitRate/sampleRate/channels as doubles (NaN for
+    None). A track costs on the order of a hundred bytes instead of a dict and five strings.
+    Path lookups go through an array-backed hash table; artist, album and genre get a
+    casefolded value -> rows index, built on the first query and kept up to date after that.
+    Waveform stats are not stored.
+
+    export_sqlite()/import_sqlite() move the whole catalog to and from one SQLite file
+    (strings once, tracks by id, with indexes and a readable "catalog" view).
+    """
+
+    def __init__(self, technical=False):
+        self.technical = technical
+        self.strings = StringPool()
+        self._directories = array('I')
+        self._names = _TextColumn()
+        self._text = {field: _TextColumn() for field in TEXT_FIELDS}
+        self._interned = {field: array('I') for field in INTERNED_FIELDS}
+        self._numbers = {field: array('d') for field in TECHNICAL_FIELDS} if technical else {}
+        self._path_index = _HashIndex()
+        self._field_indexes = {}
+
+    def __len__(self):
+        return len(self._directories)
+
+    @classmethod
+    def from_results(cls, results, technical=False):
+        """Catalog from (file_path, metadata) pairs, as AudioMetadataParser.parse_many yields them."""
+        catalog = cls(technical=technical)
+        for file_path, metadata in results:
+            catalog.put(file_path, metadata)
+        return catalog
+
+    def path(self, row):
+        return self.strings.values[self._directories[row]] + self._names.get(row)
+
+    def _row_of(self, path):
+        return self._path_index.lookup(hash(path), lambda row: self.path(row) == path)
+
+    def put(self, file_path, metadata):
+        """Add or replace the entry for file_path; returns its row."""
+        file_path = os.fspath(file_path)
+        row = self._row_of(file_path)
+        if row < 0:
+            return self._append(file_path, metadata)
+        for field, column in self._text.items():
+            column.set(row, metadata.get(field))
+        for field, column in self._interned.items():
+            string_id = self.strings.intern(metadata.get(field))
+            if column[row] != string_id:
+                column[row] = string_id
+                # Rebuilt on the next query rather than patched in place.
+                self._field_indexes.pop(field, None)
+        for field, column in self._numbers.items():
+            column[row] = _to_double(metadata.get(field))
+        return row
+
+    def _append(self, file_path, metadata):
+        row = len(self._directories)
+        directory, name = _split_path(file_path)
+        self._directories.append(self.strings.intern(directory))
+        self._names.append(name)
+        for field, column in self._text.items():
+            column.append(metadata.get(field))
+        for field, column in self._interned.items():
+            string_id = self.strings.intern(metadata.get(field))
+            column.append(string_id)
+            index = self._field_indexes.get(field)
+            if index is not None:
+                _index_add(index, self.strings.values[string_id], string_id, row)
+        for field, column in self._numbers.items():
+            column.append(_to_double(metadata.get(field)))
+        self._path_index.add(hash(file_path), row)
+        return row
+
+    def metadata(self, row):
+        strings = self.strings.values
+        metadata = {"artist": strings[self._interned["artist"][row]], "title": self._text["title"].get(row),
+                    "album": strings[self._interned["album"][row]], "genre": strings[self._interned["genre"][row]],
+                    "rawGenre": strings[self._interned["rawGenre"][row]]}
+        for field, column in self._numbers.items():
+            metadata[field] = _from_double(field, column[row])
+        return metadata
+
+    def get(self, file_path):
+        """Metadata stored for file_path, or None."""
+        row = self._row_of(os.fspath(file_path))
+        return self.metadata(row) if row >= 0 else None
+
+    def __contains__(self, file_path):
+        return self._row_of(os.fspath(file_path)) >= 0
+
+    def __iter__(self):
+        """(path, metadata) for every track, in insertion order."""
+        for row in range(len(self)):
+            yield self.path(row), self.metadata(row)
+
+    def _field_index(self, field):
+        index = self._field_indexes.get(field)
+        if index is None:
+            index = {}
+            values = self.strings.values
+            rows_by_id = {}
+            for row, string_id in enumerate(self._interned[field]):
+                rows = rows_by_id.get(string_id)
+                if rows is None:
+                    rows = rows_by_id[string_id] = array('I')
+                rows.append(row)
+            for string_id, rows in rows_by_id.items():
+                if string_id:
+                    index.setdefault(values[string_id].casefold(), {})[string_id] = rows
+            self._field_indexes[field] = index
+        return index
+
+    def rows(self, artist=None, album=None, genre=None):
+        """Sorted rows matching every given field, compared case-insensitively."""
+        wanted = {field: value for field, value in (('artist', artist), ('album', album), ('genre', genre))
+                  if value is not None}
+        if not wanted:
+            return list(range(len(self)))
+        matches = {}
+        for field, value in wanted.items():
+            matches[field] = self._field_index(field).get(value.casefold(), {})
+            if not matches[field]:
+                return []
+        # Walk the smallest candidate list and check the other fields by id.
+        first = min(matches, key=lambda field: sum(len(rows) for rows in matches[field].values()))
+        candidates = sorted(row for rows in matches[first].values() for row in rows)
+        for field, by_id in matches.items():
+            if field != first:
+                column = self._interned[field]
+                candidates = [row for row in candidates if column[row] in by_id]
+        return candidates
+
+    def find(self, artist=None, album=None, genre=None):
+        """(path, metadata) for every track matching the given fields."""
+        for row in self.rows(artist=artist, album=album, genre=genre):
+            yield self.path(row), self.metadata(row)
+
+    def values(self, field):
+        """{value: track count} for an indexed field; spellings differing only in case are counted apart."""
+        return {self.strings.values[string_id]: len(rows)
+                for by_id in self._field_index(field).values() for string_id, rows in by_id.items()}
+
+    def diff(self, previous):
+        """Compare with an older catalog; returns sorted added, changed and removed paths, as diff_library does."""
+        old_rows = array('i', [previous._row_of(self.path(row)) for row in range(len(self))])
+        changed = bytearray(len(self))
+        for field, column in self._interned.items():
+            # Map this pool's ids onto the previous pool's once, then compare ids rather than strings.
+            to_old = [previous.strings._ids.get(value, -1) for value in self.strings.values]
+            old_column = previous._interned[field]
+            for row, (string_id, old_row) in enumerate(zip(column, old_rows)):
+                if old_row >= 0 and to_old[string_id] != old_column[old_row]:
+                    changed[row] = 1
+        for field, column in self._text.items():
+            old_column = previous._text[field]
+            for row, old_row in enumerate(old_rows):
+                if old_row >= 0 and not changed[row] and column.raw(row) != old_column.raw(old_row):
+                    changed[row] = 1
+        for field in self._numbers.keys() & previous._numbers.keys():
+            column, old_column = self._numbers[field], previous._numbers[field]
+            for row, old_row in enumerate(old_rows):
+                if old_row >= 0 and not changed[row] and not _same_number(column[row], old_column[old_row]):
+                    changed[row] = 1
+
+        seen = bytearray(len(previous))
+        for old_row in old_rows:
+            if old_row >= 0:
+                seen[old_row] = 1
+        return {
+            'added': sorted(self.path(row) for row, old_row in enumerate(old_rows) if old_row < 0),
+            'changed': sorted(self.path(row) for row in range(len(self)) if changed[row]),
+            'removed': sorted(previous.path(row) for row in range(len(previous)) if not seen[row]),
+        }
+
+    def nbytes(self):
+        """Approximate memory held by the columns, indexes and pooled strings."""
+        total = sum(len(value) + 49 for value in self.strings.values if value) + len(self.strings) * 48
+        total += self._names.nbytes() + self._path_index.nbytes()
+        total += sum(column.nbytes() for column in self._text.values())
+        for column in (self._directories, *self._interned.values(), *self._numbers.values()):
+            total += column.itemsize * len(column)
+        return total
+
+    def export_sqlite(self, db_path):
+        """Write the catalog to db_path (replaced atomically) and return the number of tracks."""
+        directory = os.path.dirname(os.path.abspath(db_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".catalog-", suffix=".sqlite3", dir=directory)
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                self._write_tables(conn)
+            finally:
+                conn.close()
+            os.replace(tmp_path, db_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return len(self)
+
+    def _write_tables(self, conn):
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        numbers = tuple(self._numbers)
+        columns = ("directory", "name", *TEXT_FIELDS, *INTERNED_FIELDS, *numbers)
+        conn.execute("CREATE TABLE catalog_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE strings (id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+        # Names and titles go in as the UTF-8 BLOBs already in memory; the view casts them back.
+        conn.execute(f"CREATE TABLE tracks (id INTEGER PRIMARY KEY, directory INTEGER NOT NULL, name BLOB NOT NULL, "
+                     f"{', '.join(f'{field} BLOB' for field in TEXT_FIELDS)}, "
+                     f"{', '.join(f'{field} INTEGER NOT NULL' for field in INTERNED_FIELDS)}"
+                     f"{''.join(f', {field} REAL' for field in numbers)})")
+        with conn:
+            conn.executemany("INSERT INTO catalog_meta VALUES (?, ?)",
+                             [("version", CATALOG_VERSION), ("technical", "1" if self.technical else "0"),
+                              ("tracks", str(len(self)))])
+            conn.executemany("INSERT INTO strings VALUES (?, ?)",
+                             ((string_id, value) for string_id, value in enumerate(self.strings.values) if string_id))
+            values = [range(len(self)), self._directories, self._names.iter_raw(),
+                      *(column.iter_raw() for column in self._text.values()), *self._interned.values(),
+                      *((None if math.isnan(value) else value for value in column) for column in self._numbers.values())]
+            conn.executemany(f"INSERT INTO tracks VALUES (?, {', '.join('?' * len(columns))})", zip(*values))
+            for field in INDEXED_FIELDS:
+                conn.execute(f"CREATE INDEX tracks_{field} ON tracks ({field})")
+            joins = ''.join(f" LEFT JOIN strings s_{field} ON s_{field}.id = t.{field}" for field in INTERNED_FIELDS)
+            conn.execute(
+                f"CREATE VIEW catalog AS SELECT d.value || CAST(t.name AS TEXT) AS path, "
+                f"{', '.join(f'CAST(t.{field} AS TEXT) AS {field}' for field in TEXT_FIELDS)}, "
+                f"{', '.join(f's_{field}.value AS {field}' for field in INTERNED_FIELDS)}"
+                f"{''.join(f', t.{field}' for field in numbers)} "
+                f"FROM tracks t JOIN strings d ON d.id = t.directory{joins}")
+
+    @classmethod
+    def import_sqlite(cls, db_path):
+        """Load a catalog written by export_sqlite."""
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(db_path)
+        conn = sqlite3.connect(db_path)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM catalog_meta"))
+            if meta.get("version") != CATALOG_VERSION:
+                raise ValueError(f"{db_path}: catalog version {meta.get('version')!r}, expected {CATALOG_VERSION}")
+            catalog = cls(technical=meta.get("technical") == "1")
+            strings = catalog.strings
+            for string_id, value in conn.execute("SELECT id, value FROM strings ORDER BY id"):
+                if string_id != len(strings):
+                    raise ValueError(f"{db_path}: string ids are not contiguous at {string_id}")
+                strings.intern(value)
+            catalog._path_index = _HashIndex.sized_for(int(meta.get("tracks", 0)))
+            columns = ("directory", "name", *TEXT_FIELDS, *INTERNED_FIELDS, *catalog._numbers)
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM tracks ORDER BY id")
+            while True:
+                batch = cursor.fetchmany(IMPORT_BATCH_SIZE)
+                if not batch:
+                    break
+                catalog._import_batch(list(zip(*batch)))
+        finally:
+            conn.close()
+        return catalog
+
+    def _import_batch(self, columns):
+        # Whole columns at a time: the id columns go straight into their arrays.
+        first_row = len(self._directories)
+        directories, names = columns[0], columns[1]
+        self._directories.extend(directories)
+        for name in names:
+            self._names.append_raw(name)
+        position = 2
+        for column in self._text.values():
+            for value in columns[position]:
+                column.append_raw(value)
+            position += 1
+        for column in self._interned.values():
+            column.extend(columns[position])
+            position += 1
+        for column in self._numbers.values():
+            column.extend(map(_to_double, columns[position]))
+            position += 1
+        values, add = self.strings.values, self._path_index.add
+        for row, (directory_id, name) in enumerate(zip(directories, names), first_row):
+            add(hash(values[directory_id] + name.decode('utf-8', 'surrogateescape')), row)
+
+
+def _to_double(value):
+    return math.nan if value is None else float(value)
+
+
+def _from_double(field, value):
+    if math.isnan(value):
+        return None
+    return value if field == "durationSeconds" else int(value)
+
+
+def _same_number(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+
+def _index_add(index, value, string_id, row):
+    if string_id:
+        index.setdefault(value.casefold(), {}).setdefault(string_id, array('I')).append(row)
+
+
+def main():
+    from util.audio_metadata_parser import AudioMetadataParser
+    from util.metadata_cache import MetadataCache
+
+    parser = argparse.ArgumentParser(description="Build, query and diff columnar metadata catalogs.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--directory', help="parse the audio files here into a new catalog")
+    source.add_argument('--catalog', help="load a catalog written earlier")
+    parser.add_argument('--output', help="export the catalog to this SQLite file")
+    parser.add_argument('--previous', help="catalog file to diff against")
+    parser.add_argument('--cache', help="metadata cache database to parse through")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--technical', action='store_true', help="also keep duration/bit rate/sample rate/channels")
+    parser.add_argument('--artist')
+    parser.add_argument('--album')
+    parser.add_argument('--genre')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.directory:
+        cache = MetadataCache(args.cache) if args.cache else None
+        metadata_parser = AudioMetadataParser(logger, cache=cache, technical=args.technical)
+        try:
+            catalog = MetadataCatalog.from_results(metadata_parser.parse_directory(args.directory,
+                                                                                   workers=args.workers),
+                                                   technical=args.technical)
+        finally:
+            if cache:
+                cache.close()
+    else:
+        catalog = MetadataCatalog.import_sqlite(args.catalog)
+    print(f"{len(catalog)} tracks, ~{catalog.nbytes() / (1024 * 1024):.1f} MB in memory")
+
+    if args.artist or args.album or args.genre:
+        for path, metadata in catalog.find(artist=args.artist, album=args.album, genre=args.genre):
+            print(f"{path}\t{metadata['artist']}\t{metadata['album']}\t{metadata['title']}\t{metadata['genre']}")
+    if args.previous:
+        changes = catalog.diff(MetadataCatalog.import_sqlite(args.previous))
+        for kind in ('added', 'changed', 'removed'):
+            for path in changes[kind]:
+                print(f"{kind}\t{path}")
+        print(f"{len(changes['added'])} added, {len(changes['changed'])} changed, {len(changes['removed'])} removed")
+    if args.output:
+        catalog.export_sqlite(args.output)
+        print(f"Catalog written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
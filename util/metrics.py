@@ -0,0 +1,195 @@
+# metrics.py
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds; 0.5 ms to 10 min, roughly x2.5 per step.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   25.0, 60.0, 150.0, 600.0)
+
+
+class Counter:
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {'type': 'counter', 'value': self.value}
+
+
+class Histogram:
+    """Fixed-bucket histogram: observe() is a bisect and three additions under a lock.
+
+    Percentiles in snapshot() are interpolated within the bucket they fall in, which is
+    accurate to the bucket width; min and max are exact.
+    """
+
+    def __init__(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, q):
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                if bucket_count and seen + bucket_count >= rank:
+                    lower = self.buckets[index - 1] if index else min(self.min, self.buckets[0])
+                    upper = self.buckets[index] if index < len(self.buckets) else self.max
+                    estimate = lower + (upper - lower) * (rank - seen) / bucket_count
+                    return min(max(estimate, self.min), self.max)
+                seen += bucket_count
+            return self.max
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {'type': 'histogram', 'count': self.count, 'sum': self.sum,
+                        'mean': self.sum / self.count if self.count else None, 'min': self.min, 'max': self.max,
+                        'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                        'overflow': self.counts[-1]}
+        snapshot.update(p50=self.percentile(0.50), p95=self.percentile(0.95), p99=self.percentile(0.99))
+        return snapshot
+
+
+class MetricsRegistry:
+    """Named counters and latency histograms shared by the upload, parse and genre code paths.
+
+    span(name) times a block into the "<name>_seconds" histogram and, if the block raises,
+    counts it in "<name>_errors". Instruments are created on first use, so callers only name
+    them. Export with snapshot()/write_json() or write_prometheus() (text exposition format,
+    for node_exporter's textfile collector or a Pushgateway).
+    """
+
+    def __init__(self, prefix="lv426"):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, cls(name, help_text))
+        return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text=""):
+        return self._get(Histogram, name, help_text)
+
+    @contextmanager
+    def span(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.counter(f"{name}_errors").inc()
+            raise
+        finally:
+            self.histogram(f"{name}_seconds").observe(time.perf_counter() - started)
+
+    def timed(self, name):
+        """Decorator form of span()."""
+        def decorate(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def snapshot(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+    def write_json(self, path):
+        _atomic_write_text(path, json.dumps({'generatedAt': time.time(), 'metrics': self.snapshot()}, indent=2))
+
+    def prometheus_text(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        lines = []
+        for name, metric in sorted(metrics.items()):
+            full_name = f"{self.prefix}_{name}" if self.prefix else name
+            if isinstance(metric, Counter):
+                full_name += "_total"
+                if metric.help_text:
+                    lines.append(f"# HELP {full_name} {metric.help_text}")
+                lines.append(f"# TYPE {full_name} counter")
+                lines.append(f"{full_name} {metric.value}")
+                continue
+            if metric.help_text:
+                lines.append(f"# HELP {full_name} {metric.help_text}")
+            lines.append(f"# TYPE {full_name} histogram")
+            with metric._lock:
+                counts, total, count = list(metric.counts), metric.sum, metric.count
+            cumulative = 0
+            for bound, bucket_count in zip(metric.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{full_name}_bucket{{le="{bound:g}"}} {cumulative}')
+            lines.append(f'{full_name}_bucket{{le="+Inf"}} {count}')
+            lines.append(f"{full_name}_sum {total}")
+            lines.append(f"{full_name}_count {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _atomic_write_text(path, self.prometheus_text())
+
+
+def _atomic_write_text(path, text):
+    # Scrapers and readers must never see a half-written file.
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+REGISTRY = MetricsRegistry()
+
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+span = REGISTRY.span
+timed = REGISTRY.timed
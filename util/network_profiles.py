@@ -0,0 +1,88 @@
+# network_profiles.py
+
+import time
+
+
+class NetworkProfile:
+    """Adverse-network behaviour applied by SlowProxy to one connection.
+
+    latency_ms (+/- a uniform jitter_ms) is added before the request is forwarded and again
+    before the first response byte. upload_kbps/download_kbps override the proxy rates so
+    links can be asymmetric. stall_after_bytes pauses the upload once at that offset and
+    stall_probability pauses it at random per forwarded piece, each for stall_seconds.
+    reset_after_bytes resets the connection (TCP RST) at that upload offset on a
+    reset_probability fraction of connections.
+    """
+
+    def __init__(self, name, latency_ms=0, jitter_ms=0, upload_kbps=None, download_kbps=None,
+                 stall_after_bytes=None, stall_probability=0.0, stall_seconds=1.0,
+                 reset_after_bytes=None, reset_probability=1.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.upload_kbps = upload_kbps
+        self.download_kbps = download_kbps
+        self.stall_after_bytes = stall_after_bytes
+        self.stall_probability = stall_probability
+        self.stall_seconds = stall_seconds
+        self.reset_after_bytes = reset_after_bytes
+        self.reset_probability = reset_probability
+
+    def __repr__(self):
+        return f"NetworkProfile({self.name!r})"
+
+
+NETWORK_PROFILES = {
+    profile.name: profile for profile in (
+        NetworkProfile("clean"),
+        NetworkProfile("dsl", latency_ms=30, jitter_ms=10, upload_kbps=128, download_kbps=2048),
+        NetworkProfile("mobile", latency_ms=150, jitter_ms=80, upload_kbps=96, download_kbps=512,
+                       stall_probability=0.002, stall_seconds=2.0),
+        NetworkProfile("stalling", latency_ms=50, jitter_ms=20, stall_after_bytes=256 * 1024, stall_seconds=5.0,
+                       stall_probability=0.001),
+        NetworkProfile("flaky", latency_ms=80, jitter_ms=60, reset_after_bytes=512 * 1024, reset_probability=0.3),
+    )
+}
+
+
+class ConnectionFaults:
+    """Per-connection fault state, driven by its own seeded random generator."""
+
+    def __init__(self, profile, rng, record):
+        self.profile = profile
+        self.rng = rng
+        self.record = record
+        self.uploaded = 0
+        self.stalled_at_offset = False
+        self.reset_at = None
+        if profile.reset_after_bytes is not None and rng.random() < profile.reset_probability:
+            self.reset_at = profile.reset_after_bytes
+
+    def delay(self):
+        if not (self.profile.latency_ms or self.profile.jitter_ms):
+            return
+        jitter = self.rng.uniform(-self.profile.jitter_ms, self.profile.jitter_ms)
+        time.sleep(max(0.0, self.profile.latency_ms + jitter) / 1000)
+
+    def before_upload(self, byte_count):
+        """Stall if one is due, then return how many of byte_count may be sent before a
+        scheduled reset, or None when all of them may go out."""
+        if self.reset_at is not None and self.uploaded + byte_count > self.reset_at:
+            self.record('resets')
+            allowed = self.reset_at - self.uploaded
+            self.uploaded = self.reset_at
+            return allowed
+
+        if (self.profile.stall_after_bytes is not None and not self.stalled_at_offset
+                and self.uploaded + byte_count > self.profile.stall_after_bytes):
+            self.stalled_at_offset = True
+            self._stall()
+        elif self.profile.stall_probability and self.rng.random() < self.profile.stall_probability:
+            self._stall()
+
+        self.uploaded += byte_count
+        return None
+
+    def _stall(self):
+        self.record('stalls')
+        time.sleep(self.profile.stall_seconds)
@@ -0,0 +1,158 @@
+# pipeline.py
+
+import logging
+import queue
+import threading
+import time
+
+_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """One pipeline step: func(job) runs on workers threads and returns the job for the next stage."""
+
+    def __init__(self, name, func, workers=1, queue_size=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.first_started = None
+        self.last_finished = None
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self._lock = threading.Lock()
+
+    def record(self, started, finished, ok):
+        with self._lock:
+            if self.first_started is None:
+                self.first_started = started
+            self.last_finished = finished
+            self.busy_seconds += finished - started
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def sample_depth(self, depth):
+        with self._lock:
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.depth_max = max(self.depth_max, depth)
+
+    def metrics(self):
+        with self._lock:
+            active = (self.last_finished - self.first_started) if self.first_started is not None else 0.0
+            return {
+                'workers': self.workers,
+                'processed': self.processed,
+                'failed': self.failed,
+                'items_per_second': self.processed / active if active > 0 else None,
+                # Share of the stage's worker time spent inside func; near 1.0 marks the bottleneck.
+                'utilization': self.busy_seconds / (active * self.workers) if active > 0 else None,
+                'queue_depth_mean': self.depth_total / self.depth_samples if self.depth_samples else 0.0,
+                'queue_depth_max': self.depth_max,
+            }
+
+
+class Pipeline:
+    """Run jobs through stages concurrently, each stage fed by a bounded queue.
+
+    A full queue blocks the stage (or source) in front of it, so a slow stage throttles the
+    whole line instead of letting work pile up in memory. A job whose stage raises is marked
+    with "error" and "failedStage" and skips the remaining stages. run() yields every job,
+    finished or failed, in completion order; metrics() reports per-stage throughput,
+    utilization and sampled input-queue depth.
+    """
+
+    def __init__(self, stages, queue_size=64, sample_interval=0.25):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.sample_interval = sample_interval
+        self.started_at = None
+        self.finished_at = None
+        self._queues = []
+        self._output = None
+
+    def run(self, jobs):
+        self._queues = [queue.Queue(stage.queue_size or self.queue_size) for stage in self.stages]
+        self._output = queue.Queue()
+        self.started_at = time.monotonic()
+        stop_sampling = threading.Event()
+
+        threads = [threading.Thread(target=self._feed, args=(jobs,), name="pipeline-feed", daemon=True),
+                   threading.Thread(target=self._sample, args=(stop_sampling,), name="pipeline-sample", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for worker in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(index, remaining, lock),
+                                                name=f"pipeline-{stage.name}-{worker}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                job = self._output.get()
+                if job is _DONE:
+                    break
+                yield job
+        finally:
+            stop_sampling.set()
+            self.finished_at = time.monotonic()
+
+    def _feed(self, jobs):
+        first = self._queues[0]
+        try:
+            for job in jobs:
+                first.put(job)
+        except Exception as e:
+            logger.error("Pipeline source failed: %s", e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                first.put(_DONE)
+
+    def _work(self, index, remaining, lock):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        last = index == len(self.stages) - 1
+        outbox = self._output if last else self._queues[index + 1]
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                break
+            started = time.monotonic()
+            try:
+                job = stage.func(job)
+                ok = True
+            except Exception as e:
+                job['error'] = str(e) or type(e).__name__
+                job['failedStage'] = stage.name
+                ok = False
+            stage.record(started, time.monotonic(), ok)
+            (outbox if ok else self._output).put(job)
+
+        # The last worker out passes the end marker on, once per worker of the next stage.
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        for _ in range(1 if last else self.stages[index + 1].workers):
+            outbox.put(_DONE)
+
+    def _sample(self, stop):
+        while not stop.wait(self.sample_interval):
+            for stage, inbox in zip(self.stages, self._queues):
+                stage.sample_depth(inbox.qsize())
+
+    def metrics(self):
+        end = self.finished_at or time.monotonic()
+        return {
+            'elapsed_seconds': end - self.started_at if self.started_at else 0.0,
+            'stages': {stage.name: stage.metrics() for stage in self.stages},
+        }
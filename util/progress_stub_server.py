@@ -0,0 +1,170 @@
+# progress_stub_server.py
+
+import argparse
+import http.server
+import json
+import re
+import threading
+import time
+import uuid
+
+PROGRESS_PATH = re.compile(r"^/api/soundfragments/upload-progress/([^/?]+)(/stream)?/?(?:\?.*)?$")
+UPLOAD_PATH = re.compile(r"^/api/soundfragments/files/[^/?]+/?$")
+
+
+class ProgressStubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every keep-alive
+    # response waits ~40 ms on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        if not UPLOAD_PATH.match(self.path):
+            self.send_json(404, {"error": "not found"})
+            return
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(65536, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+        self.send_json(200, {"id": self.server.stub.create_session()})
+
+    def do_GET(self):
+        match = PROGRESS_PATH.match(self.path)
+        if not match:
+            self.send_json(404, {"error": "not found"})
+            return
+
+        upload_id, stream = match.groups()
+        if self.server.stub.progress(upload_id) is None:
+            self.send_json(404, {"error": "upload session not found"})
+        elif stream and not self.server.stub.sse:
+            self.send_json(404, {"error": "streaming disabled"})
+        elif stream:
+            self.stream_progress(upload_id)
+        else:
+            self.server.stub.record_poll()
+            self.send_json(200, self.server.stub.progress(upload_id))
+
+    def stream_progress(self, upload_id):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        last = None
+        while True:
+            data = self.server.stub.progress(upload_id)
+            if data != last:
+                self.write_chunk(f"data: {json.dumps(data)}\n\n".encode())
+                last = data
+            if data['status'] in ('finished', 'error'):
+                self.write_chunk(b"")
+                return
+            time.sleep(self.server.stub.event_interval)
+
+    def write_chunk(self, payload):
+        self.wfile.write(f"{len(payload):X}\r\n".encode() + payload + b"\r\n")
+        self.wfile.flush()
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # A HEAD reply carries the headers only; a body would be read as the next response.
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once; the default backlog of 5 drops them.
+    request_queue_size = 256
+
+
+class ProgressStubServer:
+    """Local stand-in for the upload and upload-progress endpoints.
+
+    Every upload creates a session whose percentage climbs linearly to 100 over
+    upload_seconds. With sse=False the /stream endpoint returns 404 so clients exercise
+    their polling fallback. poll_count counts plain progress GETs.
+    """
+
+    handler_class = ProgressStubHandler
+
+    def __init__(self, port=0, upload_seconds=3.0, sse=True, event_interval=0.1):
+        self.port = port
+        self.upload_seconds = upload_seconds
+        self.sse = sse
+        self.event_interval = event_interval
+        self.poll_count = 0
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self.server = None
+        self.server_thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def record_poll(self):
+        # Handlers run on their own threads; += on a shared attribute is not atomic.
+        with self._lock:
+            self.poll_count += 1
+
+    def create_session(self, upload_id=None):
+        upload_id = upload_id or str(uuid.uuid4())
+        self.sessions[upload_id] = time.monotonic()
+        return upload_id
+
+    def progress(self, upload_id):
+        started = self.sessions.get(upload_id)
+        if started is None:
+            return None
+        if not self.upload_seconds:
+            percentage = 100
+        else:
+            percentage = min(100, int((time.monotonic() - started) / self.upload_seconds * 100))
+        data = {"id": upload_id, "percentage": percentage,
+                "status": "finished" if percentage >= 100 else "processing"}
+        if percentage >= 100:
+            data["metadata"] = {"durationSeconds": 180, "bitRate": 320000}
+        return data
+
+    def start(self):
+        self.server = _StubHTTPServer(("127.0.0.1", self.port), self.handler_class)
+        self.server.stub = self
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake upload progress for offline testing.")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--upload-seconds', type=float, default=10.0)
+    parser.add_argument('--no-sse', action='store_true', help="disable the /stream endpoint")
+    args = parser.parse_args()
+
+    stub = ProgressStubServer(args.port, args.upload_seconds, sse=not args.no_sse).start()
+    print(f"Progress stub listening on {stub.base_url}")
+    try:
+        stub.server_thread.join()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# progress_tracker.py
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import requests
+
+from util.api_client import SoundFragmentClient
+from util.progress_watcher import TERMINAL_STATUSES, AdaptiveBackoff
+from util.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackedUpload:
+    def __init__(self, upload_id, on_update, backoff, deadline):
+        self.upload_id = upload_id
+        self.on_update = on_update
+        self.backoff = backoff
+        self.deadline = deadline
+        self.future = Future()
+        self.last = None
+        self.last_percentage = None
+        self.last_status = None
+        self.last_change = time.monotonic()
+        self.consecutive_errors = 0
+
+
+class ProgressTracker:
+    """Poll many upload IDs from one scheduler thread under a global requests-per-second budget.
+
+    Each tracked upload keeps its own AdaptiveBackoff and sits in a heap ordered by its next
+    due time. The scheduler pops due uploads, takes a token from the shared bucket and hands
+    the GET to a small I/O pool over one shared session. track() returns a Future resolving
+    to the final payload (or a "not_found"/"http_error"/"poll_error"/"timeout" payload, as
+    ProgressWatcher does).
+    """
+
+    def __init__(self, session, base_url, requests_per_second=10.0, io_workers=4, on_update=None,
+                 timeout_seconds=None, request_timeout=(5, 30), max_consecutive_errors=5, backoff_factory=None):
+        self.client = SoundFragmentClient(base_url, timeout=request_timeout, session=session)
+        self.session = self.client.session
+        self.base_url = self.client.api_host
+        self.budget = TokenBucket(requests_per_second, capacity=max(1.0, requests_per_second))
+        self.io_workers = io_workers
+        self.on_update = on_update
+        self.timeout_seconds = timeout_seconds
+        self.request_timeout = request_timeout
+        self.max_consecutive_errors = max_consecutive_errors
+        self.backoff_factory = backoff_factory or AdaptiveBackoff
+        self.requests_made = 0
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = None
+        self._thread = None
+        self._running = False
+        self._stopped = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self):
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="progress-io")
+        self._thread = threading.Thread(target=self._run, name="progress-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._stopped = True
+            pending = [tracked for _, _, tracked in self._heap]
+            self._heap.clear()
+            self._condition.notify()
+        for tracked in pending:
+            self._resolve_stopped(tracked)
+        if self._thread:
+            self._thread.join()
+        # Polls already in flight finish here; _schedule resolves them instead of requeueing.
+        if self._executor:
+            self._executor.shutdown(wait=True)
+
+    def track(self, upload_id, on_update=None):
+        deadline = time.monotonic() + self.timeout_seconds if self.timeout_seconds else None
+        tracked = _TrackedUpload(upload_id, on_update or self.on_update, self.backoff_factory(), deadline)
+        self._schedule(tracked, 0.0)
+        return tracked.future
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._heap)
+
+    def _schedule(self, tracked, delay):
+        with self._condition:
+            if not self._stopped:
+                heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), tracked))
+                self._condition.notify()
+                return
+        self._resolve_stopped(tracked)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, tracked = heapq.heappop(self._heap)
+
+            self.budget.acquire()
+            self._executor.submit(self._poll, tracked)
+
+    def _poll(self, tracked):
+        if tracked.deadline and time.monotonic() > tracked.deadline:
+            self._resolve(tracked, dict(tracked.last or {}, status='timeout'))
+            return
+
+        with self._condition:
+            self.requests_made += 1
+        try:
+            response = self.client.get_progress(tracked.upload_id)
+        except requests.RequestException as e:
+            tracked.consecutive_errors += 1
+            if tracked.consecutive_errors >= self.max_consecutive_errors:
+                self._resolve(tracked, dict(tracked.last or {}, status='poll_error', error=str(e)))
+            else:
+                logger.warning("Progress poll for %s failed: %s", tracked.upload_id, e)
+                self._schedule(tracked, tracked.backoff.update(0, 0))
+            return
+        tracked.consecutive_errors = 0
+
+        if response.status_code == 404:
+            self._resolve(tracked, {'status': 'not_found', 'httpStatus': 404})
+            return
+        if response.status_code != 200:
+            self._resolve(tracked, {'status': 'http_error', 'httpStatus': response.status_code,
+                                    'body': response.text[:200]})
+            return
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            self._resolve(tracked, {'status': 'http_error', 'httpStatus': 200, 'body': str(e)})
+            return
+
+        percentage = data.get('percentage', 0)
+        status = data.get('status')
+        now = time.monotonic()
+        if percentage != tracked.last_percentage:
+            delta = percentage - tracked.last_percentage if tracked.last_percentage is not None else 0
+            tracked.backoff.update(delta, now - tracked.last_change)
+            tracked.last_change = now
+        else:
+            tracked.backoff.update(0, now - tracked.last_change)
+        changed = percentage != tracked.last_percentage or status != tracked.last_status
+        tracked.last_percentage = percentage
+        tracked.last_status = status
+        tracked.last = data
+
+        if changed and tracked.on_update:
+            try:
+                tracked.on_update(tracked.upload_id, data)
+            except Exception as e:
+                logger.error("Progress callback for %s raised: %s", tracked.upload_id, e)
+
+        if status in TERMINAL_STATUSES:
+            self._resolve(tracked, data)
+        else:
+            self._schedule(tracked, tracked.backoff.interval)
+
+    @staticmethod
+    def _resolve(tracked, data):
+        if not tracked.future.done():
+            tracked.future.set_result(data)
+
+    def _resolve_stopped(self, tracked):
+        self._resolve(tracked, dict(tracked.last or {}, status='stopped'))
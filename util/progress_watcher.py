@@ -0,0 +1,179 @@
+# progress_watcher.py
+
+import logging
+import time
+
+import requests
+
+from util import metrics
+from util.api_client import SoundFragmentClient
+
+TERMINAL_STATUSES = ('finished', 'error')
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveBackoff:
+    """Poll interval driven by how fast the percentage moves.
+
+    While progress advances the next poll is timed to land roughly target_step percent later;
+    when nothing changes the interval grows geometrically up to max_interval.
+    """
+
+    def __init__(self, min_interval=0.1, max_interval=5.0, initial_interval=0.25, target_step=5.0,
+                 growth=1.6):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.target_step = target_step
+        self.growth = growth
+        self.interval = initial_interval
+
+    def reset(self):
+        self.interval = self.initial_interval
+
+    def update(self, percentage_delta, elapsed):
+        if percentage_delta > 0 and elapsed > 0:
+            rate = percentage_delta / elapsed
+            self.interval = self.target_step / rate
+        else:
+            self.interval *= self.growth
+        self.interval = min(self.max_interval, max(self.min_interval, self.interval))
+        return self.interval
+
+
+class ProgressWatcher:
+    """Follow /api/soundfragments/upload-progress/{id} until the upload finishes or errors.
+
+    mode="auto" first tries the server-sent-events stream at .../{id}/stream and falls back
+    to adaptive polling when the server does not offer it or the stream drops; mode="poll"
+    polls only. watch() returns the last progress payload, or a payload with status
+    "not_found"/"http_error"/"poll_error"/"timeout" when it had to stop early.
+    Payloads that are not JSON objects are skipped and counted in bad_events.
+    """
+
+    def __init__(self, session, base_url, mode="auto", on_update=None, timeout_seconds=None, backoff=None,
+                 request_timeout=(5, 30), max_consecutive_errors=5):
+        self.client = SoundFragmentClient(base_url, timeout=request_timeout, session=session)
+        self.session = self.client.session
+        self.base_url = self.client.api_host
+        self.mode = mode
+        self.on_update = on_update
+        self.timeout_seconds = timeout_seconds
+        self.backoff = backoff or AdaptiveBackoff()
+        self.request_timeout = request_timeout
+        self.max_consecutive_errors = max_consecutive_errors
+        self.requests_made = 0
+        self.bad_events = 0
+
+    def progress_url(self, upload_id):
+        return self.client.progress_url(upload_id)
+
+    def watch(self, upload_id):
+        with metrics.span("progress_watch"):
+            return self._watch(upload_id)
+
+    def _watch(self, upload_id):
+        deadline = time.monotonic() + self.timeout_seconds if self.timeout_seconds else None
+        last = None
+        if self.mode == "auto":
+            last = self._watch_stream(upload_id, deadline)
+            if last is not None and last.get('status') in TERMINAL_STATUSES:
+                return last
+            logger.info("Progress stream unavailable for %s, falling back to polling", upload_id)
+        return self._watch_poll(upload_id, deadline, last)
+
+    def _bad_event(self, data):
+        self.bad_events += 1
+        metrics.counter("progress_bad_events").inc()
+        logger.warning("Ignoring progress payload that is not an object: %.100r", data)
+
+    def _stream_timeout(self, deadline):
+        """request_timeout with the read timeout cut to the time left, so a silent stream cannot outlive deadline."""
+        if not deadline:
+            return self.request_timeout
+        if isinstance(self.request_timeout, tuple):
+            connect, read = self.request_timeout
+        else:
+            connect = read = self.request_timeout
+        return connect, max(0.01, min(read, deadline - time.monotonic()))
+
+    def _emit(self, data):
+        if self.on_update:
+            self.on_update(data)
+
+    def _watch_stream(self, upload_id, deadline):
+        last = None
+        try:
+            self.requests_made += 1
+            with self.client.progress_stream(upload_id, timeout=self._stream_timeout(deadline)) as response:
+                content_type = response.headers.get('Content-Type', '')
+                if response.status_code != 200 or not content_type.startswith('text/event-stream'):
+                    return None
+
+                for event in self.client.iter_events(response):
+                    if deadline and time.monotonic() > deadline:
+                        return last
+                    if not isinstance(event, dict):
+                        self._bad_event(event)
+                        continue
+                    last = event
+                    self._emit(last)
+                    if last.get('status') in TERMINAL_STATUSES:
+                        return last
+        except (requests.RequestException, ValueError) as e:
+            logger.info("Progress stream for %s ended: %s", upload_id, e)
+        return last
+
+    def _watch_poll(self, upload_id, deadline, last=None):
+        self.backoff.reset()
+        last_percentage = last.get('percentage', 0) if last else None
+        last_status = last.get('status') if last else None
+        last_change = time.monotonic()
+        consecutive_errors = 0
+
+        while True:
+            if deadline and time.monotonic() > deadline:
+                return dict(last or {}, status='timeout')
+
+            self.requests_made += 1
+            try:
+                with metrics.span("progress_poll"):
+                    response = self.client.get_progress(upload_id)
+                # A 200 that is not JSON (a proxy or gateway error page) counts as a failed poll.
+                data = response.json() if response.status_code == 200 else None
+                if response.status_code == 200 and not isinstance(data, dict):
+                    self._bad_event(data)
+                    raise ValueError("progress payload is not a JSON object")
+            except (requests.RequestException, ValueError) as e:
+                consecutive_errors += 1
+                if consecutive_errors >= self.max_consecutive_errors:
+                    return dict(last or {}, status='poll_error', error=str(e))
+                logger.warning("Progress poll for %s failed: %s", upload_id, e)
+                time.sleep(self.backoff.update(0, 0))
+                continue
+            consecutive_errors = 0
+
+            if response.status_code == 404:
+                return {'status': 'not_found', 'httpStatus': 404}
+            if response.status_code != 200:
+                return {'status': 'http_error', 'httpStatus': response.status_code, 'body': response.text[:200]}
+
+            percentage = data.get('percentage', 0)
+            status = data.get('status')
+            now = time.monotonic()
+            if percentage != last_percentage:
+                delta = percentage - last_percentage if last_percentage is not None else 0
+                self.backoff.update(delta, now - last_change)
+                last_change = now
+            else:
+                self.backoff.update(0, now - last_change)
+            if percentage != last_percentage or status != last_status:
+                self._emit(data)
+            last_percentage = percentage
+            last_status = status
+            last = data
+
+            if status in TERMINAL_STATUSES:
+                return data
+            time.sleep(self.backoff.interval)
@@ -0,0 +1,303 @@
+# remote_verify.py
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from util.api_client import AsyncSoundFragmentClient, SoundFragmentClient, _import_aiohttp
+from util.bulk_upload import latency_summary
+from util.dedupe_index import HASH_ALGORITHM
+
+VERIFY_MODES = ("head", "range", "hash")
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+
+def targets_from_fragment(data, local_dir=None):
+    """Targets for every uploadedFiles entry of one upsert response (soundfragment_data.json)."""
+    for file_info in data.get('uploadedFiles', []):
+        local_path = os.path.join(local_dir, file_info['name']) if local_dir else None
+        yield {'fragment_id': data['id'], 'file_id': file_info['id'], 'name': file_info.get('name'),
+               'local_path': local_path if local_path and os.path.exists(local_path) else None}
+
+
+def targets_from_results(path):
+    """Targets from a SoundFragmentFlow JSON-lines results file; failed lines are skipped."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if job.get('error') or not job.get('fileId'):
+                continue
+            yield {'fragment_id': job['fragmentId'], 'file_id': job['fileId'],
+                   'name': os.path.basename(job['file_path']), 'local_path': job['file_path'],
+                   'size': job.get('size'), 'sha256': job.get('contentHash')}
+
+
+def targets_from_snapshot(snapshot, root=None):
+    """Targets for every synced file of a LibrarySnapshot, optionally limited to root."""
+    for path in sorted(snapshot.stat_map(root)):
+        entry = snapshot.get(path)
+        if entry and entry['fragment_id'] and entry['file_id']:
+            yield {'fragment_id': entry['fragment_id'], 'file_id': entry['file_id'],
+                   'name': os.path.basename(path), 'local_path': path, 'size': entry['size'],
+                   'sha256': entry['hash']}
+
+
+def file_digest(path, buffer_size=DEFAULT_BUFFER_SIZE):
+    digest = hashlib.new(HASH_ALGORITHM)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(buffer_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VerifyStats:
+    def __init__(self):
+        self.outcomes = {}
+        self.bytes_downloaded = 0
+        self.bytes_verified = 0
+        self.latencies = []
+        self.failures = []
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            self.outcomes[result['outcome']] = self.outcomes.get(result['outcome'], 0) + 1
+            self.bytes_downloaded += result['bytes_downloaded']
+            if result['outcome'] == 'ok':
+                self.bytes_verified += result['remote_size'] or 0
+                self.latencies.append(result['latency'])
+            else:
+                self.failures.append({key: result[key] for key in
+                                      ('fragment_id', 'file_id', 'name', 'outcome', 'status', 'error')})
+
+    def summary(self):
+        with self._lock:
+            checked = sum(self.outcomes.values())
+            elapsed = max(time.monotonic() - self.started_at, 1e-9)
+            return {
+                'checked': checked,
+                'ok': self.outcomes.get('ok', 0),
+                'outcomes': dict(self.outcomes),
+                'files_per_second': checked / elapsed,
+                'elapsed_seconds': elapsed,
+                'bytes_verified': self.bytes_verified,
+                'bytes_downloaded': self.bytes_downloaded,
+                'latency': latency_summary(self.latencies),
+                'failures': list(self.failures),
+            }
+
+
+class RemoteVerifier:
+    """Check uploaded files in parallel without downloading them.
+
+    mode="head" sends HEAD; mode="range" asks for one byte and reads the size from
+    Content-Range; both compare the size with the local file (or the target's size), and
+    X-Content-SHA256, when the server sends it, with the target's sha256. mode="hash"
+    streams the whole file through a buffer_size window and compares its SHA-256 with the
+    local one. Each result has an outcome of ok, missing, http_error, size_mismatch,
+    hash_mismatch or error, or, in hash mode when there is no local sha256 or file to compare
+    with, unverified.
+
+    verify_all runs the checks on a thread pool; averify_all runs the same checks as asyncio
+    tasks over AsyncSoundFragmentClient (aiohttp), so workers can be in the hundreds.
+    """
+
+    def __init__(self, api_host, api_token, workers=16, mode="range", session=None, timeout=(10, 60),
+                 buffer_size=DEFAULT_BUFFER_SIZE):
+        if mode not in VERIFY_MODES:
+            raise ValueError(f"mode must be one of {VERIFY_MODES}")
+        self.workers = workers
+        self.mode = mode
+        self.timeout = timeout
+        self.buffer_size = buffer_size
+        self.api_token = api_token
+        self.client = SoundFragmentClient(api_host, api_token, pool_size=workers, timeout=timeout, session=session)
+        self.session = self.client.session
+        self.stats = VerifyStats()
+
+    def file_url(self, target):
+        return self.client.file_url(target['fragment_id'], target['file_id'])
+
+    def verify_all(self, targets):
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for target in targets:
+                pending.add(executor.submit(self.verify_one, target))
+                if len(pending) >= self.workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from self._finish(done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._finish(done)
+
+    def _finish(self, done):
+        for future in done:
+            result = future.result()
+            self.stats.record(result)
+            yield result
+
+    async def averify_all(self, targets):
+        """Async generator twin of verify_all: up to workers checks in flight on the running loop."""
+        async with AsyncSoundFragmentClient(self.client.api_host, self.api_token, limit=self.workers,
+                                            timeout=self.timeout) as client:
+            pending = set()
+            try:
+                for target in targets:
+                    pending.add(asyncio.ensure_future(self._averify_one(client, target)))
+                    if len(pending) >= self.workers:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for result in self._finish(done):
+                            yield result
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for result in self._finish(done):
+                        yield result
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    def _new_result(self, target):
+        result = {'fragment_id': target['fragment_id'], 'file_id': target['file_id'], 'name': target.get('name'),
+                  'mode': self.mode, 'outcome': None, 'status': None, 'remote_size': None,
+                  'local_size': target.get('size'), 'remote_hash': None, 'bytes_downloaded': 0,
+                  'latency': None, 'error': None}
+        local_path = target.get('local_path')
+        if result['local_size'] is None and local_path:
+            try:
+                result['local_size'] = os.path.getsize(local_path)
+            except OSError:
+                pass
+        return result
+
+    def _settle(self, target, result, started):
+        result['latency'] = time.monotonic() - started
+        if result['outcome'] is None:
+            result['outcome'] = self._compare(target, result)
+        return result
+
+    def verify_one(self, target):
+        result = self._new_result(target)
+        started = time.monotonic()
+        try:
+            if self.mode == "hash":
+                self._stream_hash(target, result)
+            else:
+                self._probe(target, result)
+        except requests.RequestException as e:
+            result.update(outcome='error', error=str(e))
+        return self._settle(target, result, started)
+
+    async def _averify_one(self, client, target):
+        aiohttp = _import_aiohttp()
+        result = self._new_result(target)
+        started = time.monotonic()
+        try:
+            if self.mode == "hash":
+                await self._astream_hash(client, target, result)
+            elif self.mode == "head":
+                response = await client.head_file(target['fragment_id'], target['file_id'], timeout=self.timeout)
+                self._read_probe(response.status, response.headers, result)
+            else:
+                async with client.get_file(target['fragment_id'], target['file_id'], byte_range=(0, 0),
+                                           timeout=self.timeout) as response:
+                    self._read_probe(response.status, response.headers, result)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result.update(outcome='error', error=str(e) or type(e).__name__)
+        if self.mode == "hash":
+            # Hashing the local file is blocking disk I/O; keep it off the event loop.
+            return await asyncio.to_thread(self._settle, target, result, started)
+        return self._settle(target, result, started)
+
+    def _probe(self, target, result):
+        if self.mode == "head":
+            response = self.client.head_file(target['fragment_id'], target['file_id'], timeout=self.timeout)
+        else:
+            response = self.client.get_file(target['fragment_id'], target['file_id'], byte_range=(0, 0),
+                                            timeout=self.timeout)
+        with response:
+            # A server that ignores Range sends the whole body; closing here drops it unread.
+            self._read_probe(response.status_code, response.headers, result)
+
+    def _read_probe(self, status, headers, result):
+        result['status'] = status
+        if not self._check_status(status, result):
+            return
+        total = headers.get('Content-Range', '').rpartition('/')[2]
+        if status != 206:
+            total = headers.get('Content-Length')
+        result['remote_size'] = int(total) if total and total.isdigit() else None
+        result['remote_hash'] = headers.get('X-Content-SHA256')
+
+    def _stream_hash(self, target, result):
+        digest = hashlib.new(HASH_ALGORITHM)
+        received = 0
+        with self.client.get_file(target['fragment_id'], target['file_id'], timeout=self.timeout) as response:
+            result['status'] = response.status_code
+            if not self._check_status(response.status_code, result):
+                return
+            for block in response.iter_content(self.buffer_size):
+                digest.update(block)
+                received += len(block)
+        self._set_remote_digest(result, received, digest)
+
+    async def _astream_hash(self, client, target, result):
+        digest = hashlib.new(HASH_ALGORITHM)
+        received = 0
+        async with client.get_file(target['fragment_id'], target['file_id'], timeout=self.timeout) as response:
+            result['status'] = response.status
+            if not self._check_status(response.status, result):
+                return
+            async for block in response.content.iter_chunked(self.buffer_size):
+                digest.update(block)
+                received += len(block)
+        self._set_remote_digest(result, received, digest)
+
+    @staticmethod
+    def _set_remote_digest(result, received, digest):
+        result['bytes_downloaded'] = received
+        result['remote_size'] = received
+        result['remote_hash'] = digest.hexdigest()
+
+    @staticmethod
+    def _check_status(status, result):
+        if status == 404:
+            result['outcome'] = 'missing'
+        elif status not in (200, 206):
+            result.update(outcome='http_error', error=f"HTTP {status}")
+        return result['outcome'] is None
+
+    def _compare(self, target, result):
+        if (result['local_size'] is not None and result['remote_size'] is not None
+                and result['local_size'] != result['remote_size']):
+            return 'size_mismatch'
+        local_hash = target.get('sha256')
+        if self.mode == "hash":
+            # Only hash mode reads the local file, and it only passes once the digests were compared.
+            if local_hash is None and target.get('local_path'):
+                try:
+                    local_hash = file_digest(target['local_path'], self.buffer_size)
+                except OSError as e:
+                    result['error'] = f"local file unreadable: {e}"
+                    return 'error'
+            if local_hash is None:
+                result['error'] = "no local sha256 or file to compare with"
+                return 'unverified'
+        # head/range rely on a hash the target already carries and the server sends.
+        if result['remote_hash'] and local_hash and local_hash != result['remote_hash']:
+            return 'hash_mismatch'
+        return 'ok'
+
+    def write_report(self, path, extra=None):
+        report = dict(self.stats.summary(), mode=self.mode, **(extra or {}))
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
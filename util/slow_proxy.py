@@ -0,0 +1,352 @@
+# slow_proxy.py
+
+import argparse
+import http.server
+import itertools
+import random
+import socket
+import socketserver
+import struct
+import threading
+from urllib.parse import urlparse
+
+from util.network_profiles import NETWORK_PROFILES, ConnectionFaults, NetworkProfile
+from util.token_bucket import TokenBucket
+
+HOP_BY_HOP_HEADERS = {'host', 'connection', 'keep-alive', 'proxy-connection', 'upgrade'}
+MAX_SHAPED_CHUNK = 16 * 1024
+
+
+PROFILE_HEADER = 'X-Network-Profile'
+
+
+class SimulatedDisconnect(Exception):
+    def __init__(self, message, reset=False):
+        super().__init__(message)
+        self.reset = reset
+
+
+class ShapedChannel:
+    """Pair of token buckets, one for this connection and one shared by all, gating one direction."""
+
+    def __init__(self, rate, shared_bucket):
+        self.bucket = TokenBucket(rate, capacity=max(1, rate // 20)) if rate else None
+        self.shared_bucket = shared_bucket
+        rates = [bucket.rate for bucket in (self.bucket, shared_bucket) if bucket]
+        # Small pieces keep the shaping smooth; a 20th of a second of the tightest rate.
+        self.piece_size = max(512, min([MAX_SHAPED_CHUNK] + [int(r) // 20 for r in rates]))
+
+    def pieces(self, data):
+        for start in range(0, len(data), self.piece_size):
+            piece = data[start:start + self.piece_size]
+            if self.bucket:
+                self.bucket.acquire(len(piece))
+            if self.shared_bucket:
+                self.shared_bucket.acquire(len(piece))
+            yield piece
+
+
+class SlowProxyHandler(http.server.BaseHTTPRequestHandler):
+    """Forward one request upstream, shaping the body both ways and streaming the response back."""
+
+    def do_POST(self):
+        self.proxy_request()
+
+    def do_PUT(self):
+        self.proxy_request()
+
+    def do_GET(self):
+        self.proxy_request()
+
+    def do_HEAD(self):
+        self.proxy_request()
+
+    def do_DELETE(self):
+        self.proxy_request()
+
+    @property
+    def proxy(self):
+        return self.server.proxy
+
+    def proxy_request(self):
+        upstream = None
+        self.faults = self.proxy.connection_faults(self.headers.get(PROFILE_HEADER))
+        profile = self.faults.profile
+        try:
+            self.faults.delay()
+            upstream = socket.create_connection((self.proxy.target_host, self.proxy.target_port), timeout=30)
+            self.send_request_head(upstream)
+
+            upload_rate = profile.upload_kbps * 1024 if profile.upload_kbps else self.proxy.upload_rate
+            up = ShapedChannel(upload_rate, self.proxy.global_upload_bucket)
+            if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+                self.forward_chunked_body(upstream, up)
+            elif int(self.headers.get('Content-Length', 0)) > 0:
+                self.forward_fixed_body(upstream, up, int(self.headers['Content-Length']))
+
+            self.stream_response(upstream)
+        except SimulatedDisconnect as e:
+            self.proxy.log(f"Proxy: {e}")
+            self.close_connection = True
+            try:
+                if e.reset:
+                    # Linger 0 turns the close into a TCP RST, as a dropped NAT mapping would.
+                    self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        except Exception as e:
+            self.proxy.log(f"Proxy error: {e}")
+            try:
+                self.send_error(502, f"Proxy error: {e}")
+            except OSError:
+                pass
+        finally:
+            if upstream is not None:
+                upstream.close()
+
+    def send_request_head(self, upstream):
+        lines = [f"{self.command} {self.path} HTTP/1.1"]
+        for header, value in self.headers.items():
+            if header.lower() not in HOP_BY_HOP_HEADERS and header.lower() != PROFILE_HEADER.lower():
+                lines.append(f"{header}: {value}")
+        lines.append(f"Host: {self.proxy.target_host}:{self.proxy.target_port}")
+        # Upstream closes after the response, so the response can be relayed until EOF.
+        lines.append("Connection: close")
+        upstream.sendall(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+
+    def send_upload(self, upstream, channel, data):
+        for piece in channel.pieces(data):
+            allowed = self.faults.before_upload(len(piece))
+            if allowed is not None:
+                upstream.sendall(piece[:allowed])
+                raise SimulatedDisconnect(
+                    f"Simulated reset ({self.faults.profile.name}) at byte {self.faults.uploaded}", reset=True)
+            upstream.sendall(piece)
+            self.proxy.count_forwarded(len(piece))
+
+    def forward_fixed_body(self, upstream, channel, total_bytes):
+        self.proxy.log(f"Proxy: Forwarding {total_bytes} bytes...")
+        bytes_sent = 0
+        next_report = 10
+        while bytes_sent < total_bytes:
+            chunk = self.rfile.read1(min(65536, total_bytes - bytes_sent))
+            if not chunk:
+                break
+            self.send_upload(upstream, channel, chunk)
+            bytes_sent += len(chunk)
+
+            progress = bytes_sent * 100 // total_bytes
+            if progress >= next_report:
+                self.proxy.log(f"Proxy: {progress}% uploaded ({bytes_sent}/{total_bytes} bytes)")
+                next_report = (progress // 10 + 1) * 10
+        self.proxy.log(f"Proxy: Upload completed - {bytes_sent} bytes forwarded")
+
+    def forward_chunked_body(self, upstream, channel):
+        # Relay the chunk framing unchanged so the upstream sees exactly what the client sent.
+        bytes_sent = 0
+        while True:
+            size_line = self.rfile.readline(65537)
+            if not size_line:
+                raise ConnectionError("client closed mid-body")
+            upstream.sendall(size_line)
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                while True:
+                    trailer = self.rfile.readline(65537)
+                    upstream.sendall(trailer)
+                    if trailer in (b'\r\n', b'\n', b''):
+                        break
+                break
+
+            remaining = size
+            while remaining:
+                chunk = self.rfile.read1(min(65536, remaining))
+                if not chunk:
+                    raise ConnectionError("client closed mid-chunk")
+                self.send_upload(upstream, channel, chunk)
+                remaining -= len(chunk)
+            bytes_sent += size
+            upstream.sendall(self.rfile.readline(3))
+        self.proxy.log(f"Proxy: Chunked upload completed - {bytes_sent} bytes forwarded")
+
+    def stream_response(self, upstream):
+        profile = self.faults.profile
+        download_rate = profile.download_kbps * 1024 if profile.download_kbps else self.proxy.download_rate
+        down = ShapedChannel(download_rate, self.proxy.global_download_bucket)
+        upstream.settimeout(self.proxy.response_timeout)
+        received = False
+        head = b''
+        while True:
+            chunk = upstream.recv(65536)
+            if not chunk:
+                break
+            if head is not None:
+                head += chunk
+                if b'\r\n\r\n' not in head:
+                    continue
+                chunk, head = self.rewrite_response_head(head), None
+            if not received:
+                self.faults.delay()
+            received = True
+            for piece in down.pieces(chunk):
+                self.wfile.write(piece)
+            self.wfile.flush()
+        if head:
+            self.wfile.write(head)
+            received = True
+        self.close_connection = True
+        if not received:
+            self.send_error(502, "No response from server")
+
+    @staticmethod
+    def rewrite_response_head(data):
+        # The proxy closes every client connection after one response, so say so; otherwise a
+        # keep-alive client reuses the socket while it is being closed and the request fails.
+        head, _, body = data.partition(b'\r\n\r\n')
+        lines = [line for line in head.split(b'\r\n')
+                 if line.split(b':', 1)[0].strip().lower() not in (b'connection', b'keep-alive')]
+        lines.append(b'Connection: close')
+        return b'\r\n'.join(lines) + b'\r\n\r\n' + body
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingProxyServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+
+class SlowProxy:
+    """Bandwidth-limited HTTP forwarding proxy for upload tests.
+
+    Each connection runs on its own thread. Uploads are shaped by a per-connection token
+    bucket at bandwidth_kbps and, when global_bandwidth_kbps is set, by one bucket shared by
+    all connections; download_kbps / global_download_kbps do the same for responses.
+    Request bodies may use Content-Length or chunked encoding, and responses are relayed as
+    they arrive. interrupt_after_bytes drops the client connection once, after that many
+    upload bytes have been forwarded, to exercise resumable uploads. proxy_port=0 picks a
+    free port, available as proxy_port after start().
+
+    profiles applies fault injection (see NetworkProfile): a single profile, a list sampled
+    uniformly per connection, or a list of (profile, weight) pairs. A client may pick one by
+    name with the X-Network-Profile request header. With seed set, each connection draws
+    from random.Random(f"{seed}:{n}") for the n-th connection, so runs are reproducible.
+    fault_counts tallies connections per profile, resets and stalls.
+    """
+
+    def __init__(self, target_host, target_port, proxy_port=8888, bandwidth_kbps=50, interrupt_after_bytes=None,
+                 global_bandwidth_kbps=None, download_kbps=None, global_download_kbps=None, response_timeout=600,
+                 verbose=True, profiles=None, seed=None):
+        self.target_host = target_host
+        self.target_port = target_port
+        self.proxy_port = proxy_port
+        self.bandwidth_limit = bandwidth_kbps * 1024 if bandwidth_kbps else None
+        self.upload_rate = self.bandwidth_limit
+        self.download_rate = download_kbps * 1024 if download_kbps else None
+        self.global_upload_bucket = self._bucket(global_bandwidth_kbps)
+        self.global_download_bucket = self._bucket(global_download_kbps)
+        self.response_timeout = response_timeout
+        self.interrupt_after_bytes = interrupt_after_bytes
+        self.verbose = verbose
+        self.bytes_forwarded = 0
+        self.seed = seed
+        self.profiles, self.profile_weights = self._normalize_profiles(profiles)
+        self.fault_counts = {'connections': 0, 'resets': 0, 'stalls': 0}
+        self.server = None
+        self.server_thread = None
+        self._lock = threading.Lock()
+        self._connection_numbers = itertools.count()
+        self._sampler = random.Random(seed)
+
+    @staticmethod
+    def _normalize_profiles(profiles):
+        if profiles is None:
+            return [NETWORK_PROFILES['clean']], [1.0]
+        if isinstance(profiles, NetworkProfile):
+            return [profiles], [1.0]
+        pairs = [item if isinstance(item, tuple) else (item, 1.0) for item in profiles]
+        return [profile for profile, _ in pairs], [weight for _, weight in pairs]
+
+    def connection_faults(self, requested_name=None):
+        with self._lock:
+            number = next(self._connection_numbers)
+            by_name = {profile.name: profile for profile in self.profiles}
+            profile = by_name.get(requested_name) or NETWORK_PROFILES.get(requested_name)
+            if profile is None:
+                profile = self._sampler.choices(self.profiles, self.profile_weights)[0]
+            self.fault_counts['connections'] += 1
+            self.fault_counts[f"profile:{profile.name}"] = self.fault_counts.get(f"profile:{profile.name}", 0) + 1
+        rng = random.Random(f"{self.seed}:{number}") if self.seed is not None else random.Random()
+        return ConnectionFaults(profile, rng, self.record_fault)
+
+    def record_fault(self, kind):
+        with self._lock:
+            self.fault_counts[kind] += 1
+
+    @staticmethod
+    def _bucket(kbps):
+        if not kbps:
+            return None
+        rate = kbps * 1024
+        return TokenBucket(rate, capacity=max(1, rate // 20))
+
+    def log(self, message):
+        if self.verbose:
+            print(message)
+
+    def count_forwarded(self, byte_count):
+        with self._lock:
+            self.bytes_forwarded += byte_count
+            if self.interrupt_after_bytes is not None and self.bytes_forwarded >= self.interrupt_after_bytes:
+                self.interrupt_after_bytes = None
+                raise SimulatedDisconnect(f"Simulated disconnect after {self.bytes_forwarded} bytes")
+
+    def start(self):
+        self.server = _ThreadingProxyServer(("127.0.0.1", self.proxy_port), SlowProxyHandler)
+        self.server.proxy = self
+        self.proxy_port = self.server.server_address[1]
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+        rate = f"{self.bandwidth_limit // 1024}KB/s" if self.bandwidth_limit else "unlimited"
+        self.log(f"Proxy started: localhost:{self.proxy_port} -> {self.target_host}:{self.target_port} @ {rate}")
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a bandwidth-limited, fault-injecting HTTP proxy.")
+    parser.add_argument('target', help="upstream base URL, e.g. http://localhost:8080")
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--bandwidth-kbps', type=int, default=0, help="upload cap per connection (0 = none)")
+    parser.add_argument('--link-kbps', type=int, default=0, help="upload cap shared by all connections")
+    parser.add_argument('--download-kbps', type=int, default=0, help="download cap per connection")
+    parser.add_argument('--profile', action='append', choices=sorted(NETWORK_PROFILES),
+                        help="network profile sampled per connection; repeat to mix")
+    parser.add_argument('--seed', type=int, help="make profile sampling and faults reproducible")
+    parser.add_argument('--interrupt-after-bytes', type=int, help="drop the first connection past this many bytes")
+    args = parser.parse_args()
+
+    target = urlparse(args.target)
+    if not target.hostname:
+        parser.error(f"not a URL: {args.target}")
+    profiles = [NETWORK_PROFILES[name] for name in args.profile] if args.profile else None
+    proxy = SlowProxy(target.hostname, target.port or (443 if target.scheme == 'https' else 80),
+                      proxy_port=args.port, bandwidth_kbps=args.bandwidth_kbps,
+                      global_bandwidth_kbps=args.link_kbps or None, download_kbps=args.download_kbps or None,
+                      interrupt_after_bytes=args.interrupt_after_bytes, profiles=profiles, seed=args.seed).start()
+    try:
+        proxy.server_thread.join()
+    except KeyboardInterrupt:
+        proxy.stop()
+        print(f"Forwarded {proxy.bytes_forwarded} bytes; faults: {proxy.fault_counts}")
+
+
+if __name__ == "__main__":
+    main()
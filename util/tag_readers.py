@@ -0,0 +1,243 @@
+# tag_readers.py
+
+import io
+import os
+import struct
+
+import mutagen
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3, ID3NoHeaderError
+from mutagen.mp3 import MPEGInfo
+from mutagen.mp4 import MP4
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+
+HEADER_PROBE_SIZE = 64
+
+ID3_FRAME_FIELDS = {"TPE1": "artist", "TIT2": "title", "TALB": "album", "TCON": "genre"}
+RIFF_INFO_FIELDS = {b"IART": "artist", b"INAM": "title", b"IPRD": "album", b"IGNR": "genre"}
+VORBIS_COMMENT_FIELDS = {"artist": "artist", "title": "title", "album": "album", "genre": "genre"}
+MP4_ATOM_FIELDS = {"\xa9ART": "artist", "\xa9nam": "title", "\xa9alb": "album", "\xa9gen": "genre"}
+STREAM_INFO_FIELDS = {"length": "durationSeconds", "bitrate": "bitRate", "sample_rate": "sampleRate",
+                      "channels": "channels"}
+TECHNICAL_FIELDS = tuple(STREAM_INFO_FIELDS.values())
+
+
+def _first_text(values):
+    if isinstance(values, (list, tuple)):
+        values = values[0] if values else None
+    return str(values) if values is not None else None
+
+
+def _id3_fields(tags):
+    fields = {}
+    for frame_id, field in ID3_FRAME_FIELDS.items():
+        frame = tags.get(frame_id)
+        if frame is not None and frame.text:
+            fields[field] = str(frame.text[0])
+    tcon = tags.get("TCON")
+    if tcon is not None and tcon.genres:
+        # ID3v1 code forms ("(7)", "7", "(17)Rock") resolved to names, as EasyID3 reported them.
+        fields["genre"] = tcon.genres[0]
+    return fields
+
+
+def _mapped_fields(tags, table):
+    fields = {}
+    if tags is None:
+        return fields
+    for key, field in table.items():
+        if key in tags:
+            value = _first_text(tags[key])
+            if value:
+                fields[field] = value
+    return fields
+
+
+def _stream_info_fields(info):
+    fields = {}
+    for attribute, field in STREAM_INFO_FIELDS.items():
+        value = getattr(info, attribute, None)
+        if value:
+            fields[field] = value
+    return fields
+
+
+def _decode_info_value(raw):
+    raw = raw.split(b"\x00", 1)[0]
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def read_mp3_tags(fileobj, technical=False):
+    try:
+        tags = ID3(fileobj)
+        fields = _id3_fields(tags)
+        audio_offset = tags.size
+    except ID3NoHeaderError:
+        fields = {}
+        audio_offset = None
+    if technical:
+        fields.update(_stream_info_fields(MPEGInfo(fileobj, audio_offset)))
+    return fields
+
+
+def iter_riff_chunks(fileobj):
+    """Yield (chunk_id, data_offset, size) for each top-level chunk of a RIFF/WAVE file.
+
+    Only the 8-byte chunk headers are read; the caller may read the chunk body before
+    advancing the iterator, which always seeks to the next chunk itself.
+    """
+    fileobj.seek(0)
+    header = fileobj.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise mutagen.MutagenError("not a RIFF/WAVE file")
+
+    while True:
+        chunk_header = fileobj.read(8)
+        if len(chunk_header) < 8:
+            return
+        chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+        data_offset = fileobj.tell()
+        yield chunk_id, data_offset, chunk_size
+        fileobj.seek(data_offset + chunk_size + (chunk_size & 1))
+
+
+def parse_wav_format(fmt_chunk):
+    audio_format, channels, sample_rate, byte_rate, block_align, bits_per_sample = struct.unpack_from(
+        "<HHIIHH", fmt_chunk)
+    if audio_format == 0xFFFE and len(fmt_chunk) >= 26:
+        # WAVE_FORMAT_EXTENSIBLE keeps the real format code at the start of the sub-format GUID.
+        audio_format = struct.unpack_from("<H", fmt_chunk, 24)[0]
+    return {
+        "audio_format": audio_format,
+        "channels": channels,
+        "sample_rate": sample_rate,
+        "byte_rate": byte_rate,
+        "block_align": block_align,
+        "bits_per_sample": bits_per_sample,
+    }
+
+
+def read_wav_tags(fileobj, technical=False):
+    """Walk the RIFF chunk headers, reading only fmt, LIST/INFO and id3 chunks and seeking past audio data."""
+    info_fields = {}
+    id3_fields = {}
+    wav_format = None
+    data_size = None
+    for chunk_id, chunk_offset, chunk_size in iter_riff_chunks(fileobj):
+        if chunk_id == b"LIST" and fileobj.read(4) == b"INFO":
+            info = fileobj.read(chunk_size - 4)
+            offset = 0
+            while offset + 8 <= len(info):
+                sub_id, sub_size = struct.unpack_from("<4sI", info, offset)
+                field = RIFF_INFO_FIELDS.get(sub_id)
+                if field:
+                    value = _decode_info_value(info[offset + 8:offset + 8 + sub_size]).strip()
+                    if value:
+                        info_fields[field] = value
+                offset += 8 + sub_size + (sub_size & 1)
+        elif chunk_id in (b"id3 ", b"ID3 "):
+            try:
+                id3_fields = _id3_fields(ID3(io.BytesIO(fileobj.read(chunk_size))))
+            except ID3NoHeaderError:
+                pass
+        elif chunk_id == b"fmt " and technical:
+            wav_format = parse_wav_format(fileobj.read(chunk_size))
+        elif chunk_id == b"data":
+            data_offset, data_size = chunk_offset, chunk_size
+
+    # ID3 frames are more specific than RIFF INFO, so they win when both are present.
+    info_fields.update(id3_fields)
+    if technical and wav_format and wav_format["byte_rate"]:
+        info_fields["bitRate"] = wav_format["byte_rate"] * 8
+        info_fields["sampleRate"] = wav_format["sample_rate"]
+        info_fields["channels"] = wav_format["channels"]
+        if data_size is not None:
+            # Streamed writers leave 0xFFFFFFFF or a stale size; trust the file length instead.
+            file_size = fileobj.seek(0, os.SEEK_END)
+            data_size = min(data_size, file_size - data_offset)
+            info_fields["durationSeconds"] = data_size / wav_format["byte_rate"]
+    return info_fields
+
+
+def read_flac_tags(fileobj, technical=False):
+    return _audio_fields(FLAC(fileobj), VORBIS_COMMENT_FIELDS, technical)
+
+
+def read_ogg_tags(fileobj, technical=False):
+    header = fileobj.read(HEADER_PROBE_SIZE)
+    fileobj.seek(0)
+    audio = OggOpus(fileobj) if b"OpusHead" in header else OggVorbis(fileobj)
+    return _audio_fields(audio, VORBIS_COMMENT_FIELDS, technical)
+
+
+def read_mp4_tags(fileobj, technical=False):
+    return _audio_fields(MP4(fileobj), MP4_ATOM_FIELDS, technical)
+
+
+def _audio_fields(audio, table, technical):
+    fields = _mapped_fields(audio.tags, table)
+    if technical:
+        fields.update(_stream_info_fields(audio.info))
+    return fields
+
+
+TAG_READERS = {
+    "mp3": read_mp3_tags,
+    "wav": read_wav_tags,
+    "flac": read_flac_tags,
+    "ogg": read_ogg_tags,
+    "m4a": read_mp4_tags,
+}
+
+EXTENSION_FORMATS = {
+    ".mp3": "mp3",
+    ".wav": "wav",
+    ".wave": "wav",
+    ".flac": "flac",
+    ".ogg": "ogg",
+    ".oga": "ogg",
+    ".opus": "ogg",
+    ".m4a": "m4a",
+    ".mp4": "m4a",
+    ".aac": "m4a",
+}
+
+
+def detect_format(header, filename):
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:4] == b"fLaC":
+        return "flac"
+    if header[:4] == b"OggS":
+        return "ogg"
+    if header[4:8] == b"ftyp":
+        return "m4a"
+    # MPEG frame sync with a non-zero layer; layer 0 is ADTS AAC, which shares the 0xFFF sync.
+    if header[:3] == b"ID3" or (len(header) > 1 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0
+                                and header[1] & 0x06):
+        return "mp3"
+    return EXTENSION_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def read_tags(file_path, technical=False):
+    """Open file_path once, dispatch on magic bytes (then extension) and return raw tag fields.
+
+    With technical=True the stream headers are read as well, adding durationSeconds,
+    bitRate, sampleRate and channels where the format provides them.
+    Returns None when the format is not recognised by any handler or by mutagen.
+    """
+    with open(file_path, "rb") as fileobj:
+        header = fileobj.read(HEADER_PROBE_SIZE)
+        fileobj.seek(0)
+        reader = TAG_READERS.get(detect_format(header, file_path))
+        if reader is not None:
+            return reader(fileobj, technical)
+
+        audio = mutagen.File(fileobj, easy=True)
+        if audio is None:
+            return None
+        return _audio_fields(audio, VORBIS_COMMENT_FIELDS, technical)
@@ -0,0 +1,49 @@
+# token_bucket.py
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at rate tokens per second up to capacity.
+
+    acquire() may take more than the current balance (or even the capacity): the bucket goes
+    into debt and the caller sleeps until it is repaid, which keeps the long-run rate exact
+    for large byte counts as well as single requests.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def acquire(self, amount=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def set_rate(self, rate, capacity=None):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            if capacity is not None:
+                self.capacity = float(capacity)
+                self.tokens = min(self.tokens, self.capacity)
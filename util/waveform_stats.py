@@ -0,0 +1,128 @@
+# waveform_stats.py
+
+import math
+import mmap
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("waveform analysis needs numpy (pip install numpy)") from e
+
+from util.tag_readers import iter_riff_chunks, parse_wav_format
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+DEFAULT_WINDOW_FRAMES = 1 << 16
+
+PCM_BITS = (8, 16, 24, 32)
+PCM_DTYPES = {8: np.uint8, 16: np.dtype("<i2"), 32: np.dtype("<i4")}
+FLOAT_DTYPES = {32: np.dtype("<f4"), 64: np.dtype("<f8")}
+
+
+def _to_dbfs(value):
+    return 20 * math.log10(value) if value > 0 else None
+
+
+def _check_format(wav_format):
+    """Raise ValueError unless _decode_window can read this format."""
+    bits = wav_format["bits_per_sample"]
+    channels = wav_format["channels"]
+    if wav_format["audio_format"] == WAVE_FORMAT_IEEE_FLOAT:
+        supported = FLOAT_DTYPES
+    elif wav_format["audio_format"] == WAVE_FORMAT_PCM:
+        supported = PCM_BITS
+    else:
+        raise ValueError(f"unsupported WAVE format code {wav_format['audio_format']}")
+    if not channels or bits not in supported:
+        raise ValueError(f"unsupported sample format: {bits} bits x {channels} channel(s)")
+    # 20 bits in a 24-bit container, 24 in 32 and the like: samples are not packed at bits / 8.
+    if wav_format["block_align"] != channels * bits // 8:
+        raise ValueError(f"unsupported container: {bits}-bit samples in {wav_format['block_align']}-byte frames "
+                         f"of {channels} channel(s)")
+
+
+def _locate_pcm(fileobj, file_size):
+    wav_format = None
+    for chunk_id, data_offset, chunk_size in iter_riff_chunks(fileobj):
+        if chunk_id == b"fmt ":
+            if chunk_size < 16:
+                raise ValueError("fmt chunk too short")
+            wav_format = parse_wav_format(fileobj.read(chunk_size))
+            _check_format(wav_format)
+        elif chunk_id == b"data":
+            if wav_format is None:
+                raise ValueError("data chunk precedes fmt chunk")
+            # Streamed writers leave 0xFFFFFFFF or a stale size; trust the file length instead.
+            return wav_format, data_offset, min(chunk_size, file_size - data_offset)
+    raise ValueError("no data chunk found")
+
+
+def _decode_window(buffer, offset, sample_count, wav_format):
+    """Return one window of samples as float64 normalised to [-1, 1), plus the positive clip level."""
+    bits = wav_format["bits_per_sample"]
+    if wav_format["audio_format"] == WAVE_FORMAT_IEEE_FLOAT:
+        samples = np.frombuffer(buffer, FLOAT_DTYPES[bits], sample_count, offset).astype(np.float64)
+        return samples, 1.0
+
+    scale = float(1 << (bits - 1))
+    if bits == 24:
+        raw = np.frombuffer(buffer, np.uint8, sample_count * 3, offset).reshape(-1, 3).astype(np.int32)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = ((samples ^ 0x800000) - 0x800000).astype(np.float64)
+    elif bits == 8:
+        samples = np.frombuffer(buffer, np.uint8, sample_count, offset).astype(np.float64) - 128.0
+    else:
+        samples = np.frombuffer(buffer, PCM_DTYPES[bits], sample_count, offset).astype(np.float64)
+    samples /= scale
+    return samples, (scale - 1) / scale
+
+
+def analyze_wav(file_path, window_frames=DEFAULT_WINDOW_FRAMES):
+    """Compute peak, RMS and clipped-sample counts of a PCM/float WAV over fixed-size windows.
+
+    The file is memory-mapped and decoded one window at a time, so resident memory is
+    bounded by window_frames regardless of file size. Formats other than 8/16/24/32-bit PCM
+    and 32/64-bit float raise ValueError.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        wav_format, data_offset, data_size = _locate_pcm(f, file_size)
+
+        channels = wav_format["channels"]
+        sample_width = wav_format["bits_per_sample"] // 8
+        frame_size = channels * sample_width
+        total_frames = data_size // frame_size
+        window_peaks = []
+        window_rms = []
+        peak = 0.0
+        sum_squares = 0.0
+        clipped = 0
+
+        if total_frames:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                for first_frame in range(0, total_frames, window_frames):
+                    frames = min(window_frames, total_frames - first_frame)
+                    samples, clip_level = _decode_window(
+                        buffer, data_offset + first_frame * frame_size, frames * channels, wav_format)
+                    magnitudes = np.abs(samples)
+                    window_peak = float(magnitudes.max())
+                    window_squares = float(np.dot(samples, samples))
+                    clipped += int(np.count_nonzero((samples >= clip_level) | (samples <= -1.0)))
+
+                    window_peaks.append(window_peak)
+                    window_rms.append(math.sqrt(window_squares / (frames * channels)))
+                    peak = max(peak, window_peak)
+                    sum_squares += window_squares
+
+    rms = math.sqrt(sum_squares / (total_frames * channels)) if total_frames else 0.0
+    return {
+        "peak": peak,
+        "peakDbfs": _to_dbfs(peak),
+        "rms": rms,
+        "rmsDbfs": _to_dbfs(rms),
+        "clippedSamples": clipped,
+        "windowFrames": window_frames,
+        "windowPeaks": window_peaks,
+        "windowRms": window_rms,
+    }